@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Category
+from . import search as post_search
 
 
 @admin.register(Category)
@@ -38,3 +39,9 @@ class PostAdmin(admin.ModelAdmin):
         if not change:
             obj.author = request.user
         super().save_model(request, obj, form, change)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of ILIKE scans over the HTML
+        if search_term and post_search.is_supported():
+            return post_search.filter_posts(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
@@ -0,0 +1,157 @@
+"""
+Buffered view counters for blog posts.
+
+Incrementing ``Post.views_count`` with a save() on every page hit turns the
+hottest read path into a row-level write. In buffered mode increments are
+collected in Redis (or in-process when the default cache is not Redis) and
+written back periodically by ``blog.tasks.flush_post_views`` as a single
+``F()`` update per batch. Buffered increments are only dropped once the
+update has committed; a flush that fails leaves them for the next one.
+
+Set ``VIEW_COUNTER_MODE = 'sync'`` to write straight through instead.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from redis.exceptions import ResponseError
+
+from core.cache import get_redis_client, make_key
+
+from . import popular
+
+PENDING_KEY = 'blog:views:pending'
+LOCK_KEY = 'blog:views:flush-lock'
+
+# Upper bound on one flush; the lock expires after it if a worker dies
+# mid-flush, and the next flush picks up the batch it left behind
+LOCK_TIMEOUT = 60 * 5
+
+_local_lock = threading.Lock()
+_local_pending = Counter()
+_local_last_flush = time.monotonic()
+
+
+def get_mode():
+    return getattr(settings, 'VIEW_COUNTER_MODE', 'buffered')
+
+
+def clear_local():
+    """Discard unflushed in-process views (cold benchmarks)."""
+    with _local_lock:
+        _local_pending.clear()
+
+
+def record_view(post_id, count=1):
+    """Record ``count`` views of a post according to VIEW_COUNTER_MODE."""
+    if get_mode() == 'sync':
+        apply_increments({post_id: count})
+        return
+
+    client = get_redis_client()
+    if client is not None:
+        client.hincrby(make_key(PENDING_KEY), post_id, count)
+        return
+
+    _record_local(post_id, count)
+
+
+def _record_local(post_id, count):
+    global _local_last_flush
+
+    interval = getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 30)
+    with _local_lock:
+        _local_pending[post_id] += count
+        if time.monotonic() - _local_last_flush < interval:
+            return
+        pending = dict(_local_pending)
+        _local_pending.clear()
+        _local_last_flush = time.monotonic()
+    _apply_local(pending)
+
+
+def _apply_local(pending):
+    try:
+        return apply_increments(pending)
+    except Exception:
+        # Put the views back for the next flush.
+        with _local_lock:
+            _local_pending.update(pending)
+        raise
+
+
+def flush():
+    """Write all buffered increments to the database.
+
+    Returns the number of posts updated, or 0 if another flush is running.
+    """
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            pending = dict(_local_pending)
+            _local_pending.clear()
+        return _apply_local(pending)
+
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return 0
+    try:
+        return _flush_redis(client)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _flush_redis(client):
+    # Batches moved aside by a flush that failed or died: they are deleted
+    # only after the update commits, so they were not applied (unless the
+    # worker died in between, which counts them twice rather than never).
+    key = make_key(PENDING_KEY)
+    batches = list(client.scan_iter(match=f'{key}:flushing:*'))
+
+    # Move the hash aside atomically so concurrent hits start a fresh one
+    # and nothing recorded during the flush is lost.
+    flushing = f'{key}:flushing:{uuid.uuid4().hex}'
+    try:
+        client.rename(key, flushing)
+        batches.append(flushing)
+    except ResponseError:
+        # Nothing buffered since the last flush.
+        pass
+    if not batches:
+        return 0
+
+    pending = Counter()
+    for batch in batches:
+        pending.update({int(pk): int(count) for pk, count in client.hgetall(batch).items()})
+    updated = apply_increments(pending)
+    client.delete(*batches)
+    return updated
+
+
+def apply_increments(pending):
+    """Apply ``{post_id: count}`` increments in one UPDATE per batch.
+
+    All batches commit together, so a failure leaves nothing half applied.
+    The popular boards only get the views once they have committed.
+    """
+    from .models import Post
+
+    batch_size = getattr(settings, 'VIEW_COUNTER_BATCH_SIZE', 500)
+    items = [(pk, count) for pk, count in pending.items() if count]
+    with transaction.atomic():
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            increment = Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in batch],
+                default=Value(0),
+            )
+            Post.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                views_count=F('views_count') + increment
+            )
+        transaction.on_commit(partial(popular.add_views, dict(items)), robust=True)
+    return len(items)
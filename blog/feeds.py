@@ -1,52 +1,114 @@
 """
 RSS and Atom feeds with ISSN metadata.
+
+Rendered feeds are cached as bytes under a key derived from the posts
+version (bumped on every post save or delete), the latest published
+``Post.updated_date`` and the site settings version, and served
+with ``ETag``/``Last-Modified`` so polling aggregators mostly get 304s.
 """
+import hashlib
+from types import SimpleNamespace
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
 from django.urls import reverse
-from .models import Post
-from core.models import SiteSettings
+from .models import POSTS_CACHE_NAME, Post, get_posts_last_modified
+from core.cache import get_version
+from core.context_processors import SITE_CACHE_NAME
+from core.models import SITE_SETTINGS_CACHE_NAME, SiteSettings
+
+
+# Used when the database is not ready yet
+DEFAULT_SETTINGS = SimpleNamespace(
+    site_name='ISC Clone',
+    site_description='Security Intelligence Platform',
+    issn='',
+    publisher_name='',
+)
 
 
 class LatestPostsFeed(Feed):
     """RSS feed for latest posts with ISSN metadata."""
     
-    def __call__(self, request, *args, **kwargs):
-        # Lazy load settings when feed is accessed, not during URL import
+    def __init__(self):
+        super().__init__()
+        # Served as an async view: the cache round trips run on the event
+        # loop under ASGI and only a cache miss renders in a thread.
+        markcoroutinefunction(self)
+    
+    async def __call__(self, request, *args, **kwargs):
+        render = sync_to_async(super().__call__)
         try:
-            self.settings = SiteSettings.get_settings()
+            key, last_modified = await sync_to_async(self.cache_key)(request)
         except Exception:
-            # If database not ready, use defaults
-            self.settings = type('obj', (object,), {
-                'site_name': 'ISC Clone',
-                'site_description': 'Security Intelligence Platform',
-                'issn': '',
-                'publisher_name': ''
-            })
-        return super().__call__(request, *args, **kwargs)
+            # Database not ready; render without caching.
+            return await render(request, *args, **kwargs)
+        
+        etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+        
+        cached_feed = await cache.aget(key)
+        if cached_feed is not None:
+            content, content_type = cached_feed
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = await render(request, *args, **kwargs)
+            await cache.aset(key, (response.content, response['Content-Type']),
+                             getattr(settings, 'FEED_CACHE_TIMEOUT', 86400))
+        
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+    
+    def cache_key(self, request):
+        """Return ``(cache key, last modified)`` for the current content."""
+        last_modified = get_posts_last_modified()
+        key = ':'.join([
+            'blog:feed', type(self).__name__, request.scheme,
+            # The newest updated_date alone misses older posts being
+            # unpublished or deleted.
+            str(get_version(POSTS_CACHE_NAME)),
+            str(get_version(SITE_SETTINGS_CACHE_NAME)), str(get_version(SITE_CACHE_NAME)),
+            str(last_modified.timestamp() if last_modified else 0),
+        ])
+        return key, last_modified
     
-    def title(self):
+    def get_object(self, request, *args, **kwargs):
+        # Resolve site settings once per request; Django passes the result
+        # to every method below that accepts an ``obj`` argument.
         try:
-            settings = SiteSettings.get_settings()
-            return settings.site_name
+            return SiteSettings.get_settings()
         except Exception:
-            return 'ISC Clone'
+            return DEFAULT_SETTINGS
+    
+    def title(self, obj):
+        return obj.site_name
     
     def link(self):
         return reverse('core:home')
     
-    def description(self):
-        try:
-            settings = SiteSettings.get_settings()
-            desc = settings.site_description
-            if settings.issn:
-                desc += f' | ISSN: {settings.issn}'
-            return desc
-        except Exception:
-            return 'Security Intelligence Platform'
+    def description(self, obj):
+        desc = obj.site_description
+        if obj.issn:
+            desc += f' | ISSN: {obj.issn}'
+        return desc
     
     def items(self):
-        return Post.objects.filter(status='published').order_by('-published_date')[:20]
+        return (
+            Post.objects.filter(status='published')
+            .select_related('author', 'category')
+            .order_by('-published_date')[:20]
+        )
     
     def item_title(self, item):
         return item.title
@@ -65,14 +127,10 @@ class LatestPostsFeed(Feed):
     
     def feed_extra_kwargs(self, obj):
         extra = {}
-        try:
-            settings = SiteSettings.get_settings()
-            if settings.issn:
-                extra['issn'] = settings.issn
-            if settings.publisher_name:
-                extra['publisher'] = settings.publisher_name
-        except Exception:
-            pass
+        if obj.issn:
+            extra['issn'] = obj.issn
+        if obj.publisher_name:
+            extra['publisher'] = obj.publisher_name
         return extra
     
     def item_extra_kwargs(self, item):
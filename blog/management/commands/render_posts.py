@@ -0,0 +1,25 @@
+"""
+Render post bodies again (see blog.rendering).
+"""
+from django.core.management.base import BaseCommand
+
+from blog import rendering
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-render the stored HTML, table of contents, reading time and summary of posts, '
+        'e.g. after changing the rendering rules or POST_IMAGE_WIDTHS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Posts to render (default: all)')
+        parser.add_argument('--images', action='store_true', help='Also generate missing image variants')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk')
+        if options['slugs']:
+            posts = posts.filter(slug__in=options['slugs'])
+        changed = rendering.rerender(posts, images=options['images'])
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {changed} changed post(s)'))
@@ -0,0 +1,46 @@
+# Generated migration for full-text search on posts
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F, Func, TextField, Value
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.search import SearchVector
+
+    Post = apps.get_model('blog', 'Post')
+    # The same text search configuration as blog.search.get_config()
+    config = getattr(settings, 'SEARCH_CONFIG', 'english')
+    content = Func(
+        F('content'), Value(r'<[^>]+>|&[#\w]+;'), Value(' '), Value('g'),
+        function='regexp_replace', output_field=TextField(),
+    )
+    Post.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('excerpt', weight='B', config=config)
+        + SearchVector(content, weight='C', config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_relatedpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated migration for the denormalised post/tag index
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_post_tags(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostTag = apps.get_model('blog', 'PostTag')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type = ContentType.objects.filter(app_label='blog', model='post').first()
+    if content_type is None:
+        return
+    posts = dict(
+        (pk, (status, published_date))
+        for pk, status, published_date in Post.objects.values_list('pk', 'status', 'published_date')
+    )
+    rows = []
+    items = TaggedItem.objects.filter(content_type=content_type).select_related('tag')
+    for item in items.iterator():
+        if item.object_id not in posts:
+            continue
+        status, published_date = posts[item.object_id]
+        rows.append(PostTag(
+            post_id=item.object_id, tag_id=item.tag_id,
+            tag_slug=item.tag.slug, tag_name=item.tag.name,
+            is_published=status == 'published', published_date=published_date,
+        ))
+    PostTag.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_search_vector'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag_slug', models.SlugField(max_length=100)),
+                ('tag_name', models.CharField(max_length=100)),
+                ('is_published', models.BooleanField(default=False)),
+                ('published_date', models.DateTimeField(blank=True, null=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_index', to='blog.post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='taggit.tag')),
+            ],
+            options={
+                'ordering': ['tag_name'],
+                'unique_together': {('post', 'tag')},
+                'indexes': [models.Index(fields=['tag_slug', 'is_published', '-published_date'], name='blog_posttag_slug_pub_idx')],
+            },
+        ),
+        migrations.RunPython(populate_post_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated migration for the handler profile post listing index
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_posttag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'status', '-published_date', '-id'], name='blog_post_author_pub_idx'),
+        ),
+    ]
@@ -0,0 +1,239 @@
+# Generated migration for pre-rendered post bodies
+
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator, slugify
+
+# Frozen copy of blog.rendering as of this migration, without the image
+# handling: later changes to the renderer must not change what a fresh
+# migrate produces. `manage.py render_posts` renders with the current one.
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'col',
+    'colgroup', 'dd', 'del', 'div', 'dl', 'dt', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'kbd', 'li',
+    'mark', 'ol', 'p', 'pre', 'q', 's', 'samp', 'small', 'span', 'strike',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead',
+    'tr', 'u', 'ul', 'var',
+}
+VOID_TAGS = {'br', 'col', 'hr', 'img'}
+SKIPPED_TAGS = {'script', 'style', 'template', 'noscript', 'iframe', 'object', 'textarea', 'select'}
+BLOCK_TAGS = {
+    'blockquote', 'br', 'caption', 'dd', 'div', 'dt', 'figcaption', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'p', 'pre', 'td', 'th', 'tr',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'id', 'style', 'title', 'lang', 'dir'},
+    'a': {'href', 'name', 'target', 'rel'},
+    'blockquote': {'cite'},
+    'col': {'span'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'ol': {'start', 'type', 'reversed'},
+    'q': {'cite'},
+    'table': {'border', 'cellpadding', 'cellspacing', 'summary'},
+    'td': {'colspan', 'rowspan', 'headers'},
+    'th': {'colspan', 'rowspan', 'headers', 'scope'},
+}
+URL_ATTRIBUTES = {'href', 'src', 'cite'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+ALLOWED_STYLES = {
+    'border', 'border-collapse', 'color', 'background-color', 'float', 'font-style',
+    'font-weight', 'height', 'margin', 'margin-left', 'margin-right', 'padding',
+    'text-align', 'text-decoration', 'vertical-align', 'width',
+}
+UNSAFE_STYLE = re.compile(r'url\s*\(|expression\s*\(|\\|/\*|[<>]', re.IGNORECASE)
+URL_JUNK = re.compile(r'[\x00-\x20\x7f]+')
+TOC_TAGS = {'h2': 2, 'h3': 3, 'h4': 4}
+SUMMARY_WORDS = 50
+
+
+def clean_url(value):
+    value = URL_JUNK.sub('', value)
+    try:
+        scheme = urlsplit(value).scheme.lower()
+    except ValueError:
+        return None
+    return value if scheme in ALLOWED_SCHEMES else None
+
+
+def clean_style(value):
+    declarations = []
+    for declaration in value.split(';'):
+        name, _, val = declaration.partition(':')
+        name, val = name.strip().lower(), val.strip()
+        if name in ALLOWED_STYLES and val and not UNSAFE_STYLE.search(val):
+            declarations.append(f'{name}: {val}')
+    return '; '.join(declarations)
+
+
+def clean_attributes(tag, attrs):
+    allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+    cleaned = {}
+    for name, value in attrs:
+        if name not in allowed or name in cleaned:
+            continue
+        value = value or ''
+        if name in URL_ATTRIBUTES:
+            value = clean_url(value)
+        elif name == 'style':
+            value = clean_style(value)
+        if value:
+            cleaned[name] = value
+    if tag == 'a' and cleaned.get('target') == '_blank':
+        cleaned['rel'] = 'noopener noreferrer'
+    return cleaned
+
+
+def format_tag(tag, attrs):
+    return '<' + tag + ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items()) + '>'
+
+
+class BodyRenderer(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.text = []
+        self.toc = []
+        self.open_tags = []
+        self.skipping = 0
+        self.ids = set()
+        self.heading = None
+
+    def render(self, content):
+        self.feed(content or '')
+        self.close()
+        while self.open_tags:
+            self.end(self.open_tags[-1])
+        text = ' '.join(''.join(self.text).split())
+        words = len(text.split())
+        return {
+            'content_html': ''.join(self.out).strip(),
+            'toc': self.toc,
+            'word_count': words,
+            'reading_time': math.ceil(words / getattr(settings, 'POST_READING_WPM', 230)),
+            'summary': Truncator(text).words(SUMMARY_WORDS),
+        }
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+            return
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        attrs = clean_attributes(tag, attrs)
+        if 'id' in attrs:
+            self.ids.add(attrs['id'])
+        if tag in VOID_TAGS:
+            self.out.append(format_tag(tag, attrs))
+            return
+        if tag in TOC_TAGS and self.heading is None:
+            self.heading = (tag, attrs, len(self.out), [])
+        elif tag in TOC_TAGS:
+            return
+        else:
+            self.out.append(format_tag(tag, attrs))
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+            return
+        if self.skipping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags[-1]
+            self.end(open_tag)
+            if open_tag == tag:
+                break
+
+    def end(self, tag):
+        self.open_tags.pop()
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if self.heading is not None and tag == self.heading[0]:
+            self.close_heading()
+        else:
+            self.out.append(f'</{tag}>')
+
+    def close_heading(self):
+        tag, attrs, start, text = self.heading
+        self.heading = None
+        title = ' '.join(''.join(text).split())
+        anchor = attrs.get('id') or self.unique_id(slugify(title) or 'section')
+        attrs['id'] = anchor
+        inner = ''.join(self.out[start:])
+        del self.out[start:]
+        self.out.append(
+            f'{format_tag(tag, attrs)}{inner}'
+            f'<a class="heading-anchor" href="#{escape(anchor)}" aria-hidden="true">#</a></{tag}>'
+        )
+        if title:
+            self.toc.append({'level': TOC_TAGS[tag], 'id': anchor, 'title': title})
+
+    def unique_id(self, anchor):
+        candidate, n = anchor, 1
+        while candidate in self.ids:
+            n += 1
+            candidate = f'{anchor}-{n}'
+        self.ids.add(candidate)
+        return candidate
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        self.out.append(escape(data, quote=False))
+        self.text.append(data)
+        if self.heading is not None:
+            self.heading[3].append(data)
+
+
+def render_posts(apps, schema_editor):
+    # Variants of uploaded images are left to `manage.py render_posts --images`
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=500):
+        Post.objects.filter(pk=post.pk).update(**BodyRenderer().render(post.content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_author_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='toc',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='summary',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
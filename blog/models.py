@@ -1,13 +1,22 @@
 """
 Blog models for ISC Clone.
 """
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Max
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from ckeditor_uploader.fields import RichTextUploadingField
 from taggit.managers import TaggableManager
 
+from core.cache import cached
+
+# Version bumped whenever a post is saved or deleted (see blog.signals)
+POSTS_CACHE_NAME = 'blog:posts'
+
 
 class Category(models.Model):
     """Blog post categories."""
@@ -85,11 +94,24 @@ class Post(models.Model):
     # Statistics
     views_count = models.PositiveIntegerField(default=0)
     
+    # Full-text search (maintained by blog.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    # Rendered body (maintained by blog.rendering on save)
+    content_html = models.TextField(blank=True, editable=False)
+    toc = models.JSONField(default=list, blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)
+    summary = models.TextField(blank=True, editable=False)
+    
     class Meta:
         ordering = ['-published_date', '-created_date']
         indexes = [
             models.Index(fields=['-published_date']),
             models.Index(fields=['status']),
+            GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+            # Handler profiles page through an author's posts by (published_date, id)
+            models.Index(fields=['author', 'status', '-published_date', '-id'], name='blog_post_author_pub_idx'),
         ]
     
     def __str__(self):
@@ -100,15 +122,126 @@ class Post(models.Model):
             self.slug = slugify(self.title)
         if not self.meta_description:
             self.meta_description = self.excerpt[:160]
+        # Listings paginate on (published_date, id), which must not be null
+        if self.status == 'published' and not self.published_date:
+            self.published_date = timezone.now()
+        # Render only when content is saved, and save the result with it
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                from .rendering import RENDERED_FIELDS
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        else:
+            self.pending_images = []
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
+    def render_content(self):
+        """Fill the rendered-body fields from ``content``.
+        
+        Uploaded images whose responsive variants do not exist yet are left
+        in ``pending_images``; ``blog.signals`` has them generated after
+        commit.
+        """
+        from .rendering import render
+        rendered = render(self.content)
+        for name, value in rendered.fields().items():
+            setattr(self, name, value)
+        self.pending_images = rendered.pending_images
+    
     def increment_views(self):
-        """Increment view counter."""
+        """Increment view counter.
+
+        The database write goes through ``blog.counters`` and is buffered
+        unless VIEW_COUNTER_MODE is 'sync'; the in-memory value is bumped
+        so the current response shows the new count.
+        """
+        from .counters import record_view
+        record_view(self.pk)
         self.views_count += 1
-        self.save(update_fields=['views_count'])
+
+
+class PostTag(models.Model):
+    """Denormalised post/tag mapping kept in sync with ``Post.tags``.
+    
+    Carries the tag slug and the post's publication state so tag pages and
+    tag counts are answered from one indexed table, without taggit's
+    generic content_type/object_id join.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_index'
+    )
+    tag = models.ForeignKey(
+        'taggit.Tag',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    tag_slug = models.SlugField(max_length=100)
+    tag_name = models.CharField(max_length=100)
+    is_published = models.BooleanField(default=False)
+    published_date = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['tag_name']
+        unique_together = ['post', 'tag']
+        indexes = [
+            models.Index(fields=['tag_slug', 'is_published', '-published_date'], name='blog_posttag_slug_pub_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post_id} #{self.tag_slug}'
+    
+    @classmethod
+    def sync_post(cls, post):
+        """Rebuild the rows of one post from its taggit tags."""
+        tags = list(post.tags.all())
+        cls.objects.filter(post=post).exclude(tag__in=tags).delete()
+        cls.objects.bulk_create(
+            [
+                cls(
+                    post=post, tag=tag, tag_slug=tag.slug, tag_name=tag.name,
+                    is_published=post.status == 'published',
+                    published_date=post.published_date,
+                )
+                for tag in tags
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class RelatedPost(models.Model):
+    """Precomputed related-post neighbours (see blog.related)."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_entries'
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['post', '-score']
+        unique_together = ['post', 'related']
+    
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.2f})'
+
+
+def get_posts_last_modified():
+    """Return the latest ``updated_date`` of any published post, cached."""
+    return cached(
+        POSTS_CACHE_NAME,
+        lambda: Post.objects.filter(status='published').aggregate(latest=Max('updated_date'))['latest'],
+    )
 
 
 class Comment(models.Model):
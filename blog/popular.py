@@ -0,0 +1,323 @@
+"""
+Popular posts leaderboards.
+
+Post views written back by ``blog.counters`` are also added to one Redis
+sorted set per board (in-process dicts when the default cache is not
+Redis):
+
+* ``trending`` decays exponentially with ``POPULAR_TRENDING_HALF_LIFE``;
+* ``most_read`` does not decay, so it ranks lifetime views. It is seeded
+  from ``Post.views_count`` when the set does not exist yet.
+
+Decay uses forward decay: a view at time ``t`` adds
+``2 ** ((t - epoch) / half_life)``. Old and new views then compare
+directly, and no member needs updating when time passes. Every
+``POPULAR_POSTS_INTERVAL`` seconds Celery moves the epoch to the present,
+scaling the whole set down in one ``ZUNIONSTORE``, and drops members that
+have decayed to nothing. The same task stores the top
+``POPULAR_POSTS_LIMIT`` published posts of each board in the cache.
+Widgets read that list with one cache get, instead of sorting posts by
+``views_count`` on every render, and pages embedding it are versioned on
+``POPULAR_CACHE_NAME``, bumped only when a list actually changes. Pages
+never compute a list themselves: before the first refresh they show none.
+"""
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import WatchError
+
+from core.cache import bump_version, get_redis_client, make_key
+
+# Version bumped whenever a stored top list changes
+POPULAR_CACHE_NAME = 'blog:popular'
+
+# Members of a decaying board below this score (in epoch units) are dropped
+MIN_SCORE = 0.01
+
+# A view this many half-lives past the epoch rebases first, keeping scores
+# far from float limits even if the periodic task stops running
+MAX_EXPONENT = 32
+
+
+@dataclass
+class Board:
+    name: str
+    title: str
+    half_life_setting: str = None
+
+    @property
+    def half_life(self):
+        if not self.half_life_setting:
+            return None
+        return getattr(settings, self.half_life_setting, 60 * 60 * 24 * 2)
+
+    @property
+    def key(self):
+        """Cache key of the stored top list."""
+        return f'blog:popular:{self.name}'
+
+    @property
+    def scores_key(self):
+        """Redis key of the sorted set (its epoch is under ``:epoch``)."""
+        return f'blog:popular:{self.name}:scores'
+
+
+BOARDS = {
+    board.name: board
+    for board in (
+        Board('trending', 'Trending this week', 'POPULAR_TRENDING_HALF_LIFE'),
+        Board('most_read', 'Most read'),
+    )
+}
+
+_local_lock = threading.Lock()
+_local_scores = defaultdict(dict)
+_local_epochs = {}
+
+
+def get_limit():
+    return getattr(settings, 'POPULAR_POSTS_LIMIT', 5)
+
+
+def clear_local():
+    """Drop the in-process scores, as clearing Redis does (cold benchmarks)."""
+    with _local_lock:
+        _local_scores.clear()
+        _local_epochs.clear()
+
+
+def _weight(board, epoch, now):
+    if board.half_life is None:
+        return 1.0
+    return 2.0 ** ((now - epoch) / board.half_life)
+
+
+# Scores ----------------------------------------------------------------
+
+def add_views(pending, now=None):
+    """Add ``{post_id: count}`` views to every board."""
+    if not pending:
+        return
+    now = now or time.time()
+    client = get_redis_client()
+    for board in BOARDS.values():
+        if client is None:
+            _add_local(board, pending, now)
+        else:
+            _add_redis(client, board, pending, now)
+
+
+def _add_local(board, pending, now):
+    with _local_lock:
+        if board.half_life is None and board.name not in _local_epochs:
+            return
+        epoch = _local_epochs.setdefault(board.name, now)
+        if board.half_life and (now - epoch) / board.half_life > MAX_EXPONENT:
+            _rebase_local(board, now)
+            epoch = now
+        scores = _local_scores[board.name]
+        weight = _weight(board, epoch, now)
+        for post_id, count in pending.items():
+            scores[post_id] = scores.get(post_id, 0.0) + count * weight
+
+
+def _add_redis(client, board, pending, now):
+    key = make_key(board.scores_key)
+    epoch_key = f'{key}:epoch'
+    with client.pipeline() as pipe:
+        while True:
+            try:
+                # Scores must be weighted with the epoch the set is at:
+                # retry if a rebase moves it in the meantime.
+                pipe.watch(epoch_key)
+                epoch = pipe.get(epoch_key)
+                if epoch is None and board.half_life is None:
+                    # Not seeded yet; the seed reads these views from the
+                    # database, where they were written first.
+                    pipe.unwatch()
+                    return
+                if epoch is None:
+                    pipe.multi()
+                    pipe.set(epoch_key, now)
+                    epoch = now
+                else:
+                    epoch = float(epoch)
+                    if board.half_life and (now - epoch) / board.half_life > MAX_EXPONENT:
+                        pipe.unwatch()
+                        rebase(board, now)
+                        continue
+                    pipe.multi()
+                weight = _weight(board, epoch, now)
+                for post_id, count in pending.items():
+                    pipe.zincrby(key, count * weight, post_id)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+def rebase(board, now=None):
+    """Move a decaying board's epoch to ``now``, scaling every score down."""
+    if board.half_life is None:
+        return
+    now = now or time.time()
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            _rebase_local(board, now)
+        return
+
+    key = make_key(board.scores_key)
+    epoch_key = f'{key}:epoch'
+    with client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(epoch_key)
+                epoch = pipe.get(epoch_key)
+                pipe.multi()
+                if epoch is not None:
+                    factor = 1.0 / _weight(board, float(epoch), now)
+                    pipe.zunionstore(key, {key: factor})
+                    pipe.zremrangebyscore(key, '-inf', f'({MIN_SCORE}')
+                pipe.set(epoch_key, now)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+def _rebase_local(board, now):
+    epoch = _local_epochs.get(board.name, now)
+    factor = 1.0 / _weight(board, epoch, now)
+    _local_scores[board.name] = {
+        post_id: score * factor
+        for post_id, score in _local_scores[board.name].items()
+        if score * factor >= MIN_SCORE
+    }
+    _local_epochs[board.name] = now
+
+
+def seed_from_views(board):
+    """Fill a non-decaying board from the stored lifetime view counts."""
+    from .models import Post
+
+    counts = dict(
+        Post.objects.filter(status='published', views_count__gt=0).values_list('id', 'views_count')
+    )
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            _local_scores[board.name] = {post_id: float(count) for post_id, count in counts.items()}
+            _local_epochs[board.name] = time.time()
+        return len(counts)
+    key = make_key(board.scores_key)
+    items = list(counts.items())
+    pipe = client.pipeline()
+    pipe.delete(key)
+    for start in range(0, len(items), 1000):
+        pipe.zadd(key, dict(items[start:start + 1000]))
+    pipe.set(f'{key}:epoch', time.time())
+    pipe.execute()
+    return len(counts)
+
+
+def _top_ids(board, count):
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            scores = _local_scores[board.name]
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [post_id for post_id, _ in ranked]
+    return [int(member) for member in client.zrevrange(make_key(board.scores_key), 0, count - 1)]
+
+
+def _forget(board, post_ids):
+    """Drop members that are no longer published posts."""
+    if not post_ids:
+        return
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            for post_id in post_ids:
+                _local_scores[board.name].pop(post_id, None)
+        return
+    client.zrem(make_key(board.scores_key), *post_ids)
+
+
+def _is_seeded(board):
+    client = get_redis_client()
+    if client is None:
+        with _local_lock:
+            return board.name in _local_epochs
+    return bool(client.exists(make_key(f'{board.scores_key}:epoch')))
+
+
+# Top lists -------------------------------------------------------------
+
+def compute(board, limit=None):
+    """Top published posts of a board, as plain dicts for the cache."""
+    from .models import Post
+
+    limit = limit or get_limit()
+    # Over-fetch: some members may have been unpublished or deleted.
+    ids = _top_ids(board, limit * 3)
+    posts = Post.objects.filter(pk__in=ids, status='published').only(
+        'id', 'title', 'slug', 'published_date', 'views_count'
+    ).in_bulk()
+    _forget(board, [post_id for post_id in ids if post_id not in posts])
+    return [
+        {
+            'id': post.pk,
+            'title': post.title,
+            'url': post.get_absolute_url(),
+            'published_date': post.published_date,
+            'views_count': post.views_count,
+        }
+        for post in (posts[post_id] for post_id in ids if post_id in posts)
+    ][:limit]
+
+
+def _identity(entries):
+    # View counts change all the time; only a new order or title matters.
+    return [(entry['id'], entry['title']) for entry in entries]
+
+
+def refresh(now=None):
+    """Rebase the decaying boards and store every board's top list.
+
+    Bumps ``POPULAR_CACHE_NAME`` if any list changed. Returns the names of
+    the boards whose list changed.
+    """
+    changed = []
+    for board in BOARDS.values():
+        if board.half_life is None and not _is_seeded(board):
+            seed_from_views(board)
+        rebase(board, now)
+        entries = compute(board)
+        previous = cache.get(board.key)
+        cache.set(board.key, entries, None)
+        if previous is None or _identity(previous) != _identity(entries):
+            changed.append(board.name)
+    if changed:
+        bump_version(POPULAR_CACHE_NAME)
+    return changed
+
+
+def get_popular(name):
+    """Last stored top list of the board ``name`` (empty before the first refresh)."""
+    board = BOARDS[name]
+    entries = cache.get(board.key)
+    if entries is None:
+        # Queue a refresh rather than waiting for the next periodic one
+        if cache.add(f'{board.key}:queued', True, getattr(settings, 'POPULAR_POSTS_INTERVAL', 300)):
+            from core.tasks import enqueue_on_commit
+
+            from .tasks import refresh_popular_posts
+
+            enqueue_on_commit(refresh_popular_posts)
+        return []
+    return entries
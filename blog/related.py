@@ -0,0 +1,218 @@
+"""
+Related-posts engine.
+
+Posts are scored against each other by shared tags, shared threat
+indicators (same type and value linked to both posts) and category. The
+top neighbours of every published post are precomputed into
+``RelatedPost`` by Celery, so ``post_detail`` reads them with a single
+indexed query.
+
+Scoring walks inverted indexes (tag -> posts, indicator -> posts), so only
+posts that share something are ever compared. Tags attached to more than
+``MAX_TAG_FANOUT`` posts are ignored: they say little about relatedness and
+would make the computation quadratic.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Post, RelatedPost
+
+TAG_WEIGHT = 2.0
+INDICATOR_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.0
+MAX_TAG_FANOUT = 1000
+
+_EPOCH = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+def get_limit():
+    return getattr(settings, 'RELATED_POSTS_LIMIT', 3)
+
+
+@dataclass
+class Features:
+    category: dict = field(default_factory=dict)
+    published: dict = field(default_factory=dict)
+    tags: dict = field(default_factory=lambda: defaultdict(set))
+    indicators: dict = field(default_factory=lambda: defaultdict(set))
+    by_tag: dict = field(default_factory=lambda: defaultdict(set))
+    by_indicator: dict = field(default_factory=lambda: defaultdict(set))
+    by_category: dict = field(default_factory=lambda: defaultdict(list))
+
+    def add_posts(self, rows):
+        for pk, category_id, published in rows:
+            self.category[pk] = category_id
+            self.published[pk] = published or _EPOCH
+            if category_id is not None:
+                self.by_category[category_id].append(pk)
+
+    def add_tags(self, rows):
+        for pk, tag_id in rows:
+            if pk in self.category:
+                self.tags[pk].add(tag_id)
+                self.by_tag[tag_id].add(pk)
+
+    def add_indicators(self, rows):
+        for pk, indicator_type, value in rows:
+            if pk in self.category:
+                key = (indicator_type, value)
+                self.indicators[pk].add(key)
+                self.by_indicator[key].add(pk)
+
+    def finish(self):
+        for pks in self.by_category.values():
+            pks.sort(key=self.published.__getitem__, reverse=True)
+
+
+def _published():
+    return Post.objects.filter(status='published')
+
+
+def _tagged_items():
+    through = Post.tags.through
+    return through.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+
+
+def _indicators():
+    from threats.models import ThreatIndicator
+    return ThreatIndicator.objects.filter(related_post__status='published')
+
+
+def load_all():
+    """Load the features of every published post."""
+    features = Features()
+    features.add_posts(_published().values_list('pk', 'category_id', 'published_date').iterator())
+    features.add_tags(_tagged_items().values_list('object_id', 'tag_id').iterator())
+    features.add_indicators(
+        _indicators().values_list('related_post_id', 'indicator_type', 'value').iterator()
+    )
+    features.finish()
+    return features
+
+
+def load_neighbourhood(post_id, limit):
+    """Load the features of one post and every post that could relate to it."""
+    tag_ids = list(_tagged_items().filter(object_id=post_id).values_list('tag_id', flat=True))
+    tag_ids = list(
+        _tagged_items().filter(tag_id__in=tag_ids).values('tag_id')
+        .annotate(uses=Count('id')).filter(uses__lte=MAX_TAG_FANOUT)
+        .values_list('tag_id', flat=True)
+    )
+    indicator_keys = set(_indicators().filter(related_post_id=post_id).values_list('indicator_type', 'value'))
+    category_id = _published().filter(pk=post_id).values_list('category_id', flat=True).first()
+
+    tag_rows = list(_tagged_items().filter(tag_id__in=tag_ids).values_list('object_id', 'tag_id'))
+    indicator_rows = []
+    if indicator_keys:
+        match = Q()
+        for indicator_type, value in indicator_keys:
+            match |= Q(indicator_type=indicator_type, value=value)
+        indicator_rows = list(_indicators().filter(match).values_list('related_post_id', 'indicator_type', 'value'))
+
+    candidates = {post_id}
+    candidates.update(pk for pk, _ in tag_rows)
+    candidates.update(pk for pk, _, _ in indicator_rows)
+    posts = _published().filter(pk__in=candidates)
+    if category_id is not None:
+        posts = posts | _published().filter(pk__in=(
+            _published().filter(category_id=category_id)
+            .order_by('-published_date').values('pk')[:limit + 1]
+        ))
+
+    features = Features()
+    features.add_posts(posts.values_list('pk', 'category_id', 'published_date'))
+    features.add_tags(tag_rows)
+    features.add_indicators(indicator_rows)
+    features.finish()
+    return features
+
+
+def score(features, post_id, limit):
+    """Return ``[(related_id, score), ...]`` best first."""
+    scores = defaultdict(float)
+    for tag_id in features.tags.get(post_id, ()):
+        posts = features.by_tag[tag_id]
+        if len(posts) > MAX_TAG_FANOUT:
+            continue
+        for pk in posts:
+            scores[pk] += TAG_WEIGHT
+    for key in features.indicators.get(post_id, ()):
+        for pk in features.by_indicator[key]:
+            scores[pk] += INDICATOR_WEIGHT
+
+    category_id = features.category.get(post_id)
+    if category_id is not None:
+        for pk in scores:
+            if features.category.get(pk) == category_id:
+                scores[pk] += CATEGORY_WEIGHT
+        # Fall back to the newest posts in the same category.
+        for pk in features.by_category.get(category_id, ()):
+            if len(scores) > limit:
+                break
+            scores.setdefault(pk, CATEGORY_WEIGHT)
+
+    scores.pop(post_id, None)
+    ranked = sorted(scores.items(), key=lambda item: (item[1], features.published[item[0]]), reverse=True)
+    return ranked[:limit]
+
+
+def _store(results):
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(results)).delete()
+        RelatedPost.objects.bulk_create(
+            [
+                RelatedPost(post_id=post_id, related_id=related_id, score=value)
+                for post_id, ranked in results.items()
+                for related_id, value in ranked
+            ],
+            batch_size=1000,
+        )
+
+
+def recompute_all(limit=None, batch_size=1000):
+    """Recompute neighbours for every published post."""
+    limit = limit or get_limit()
+    features = load_all()
+    post_ids = list(features.category)
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        _store({post_id: score(features, post_id, limit) for post_id in batch})
+    # Drop rows of posts that are no longer published.
+    RelatedPost.objects.exclude(post__status='published').delete()
+    return len(post_ids)
+
+
+def refresh_post(post_id, limit=None, cascade=True):
+    """Recompute neighbours of one post, and of the posts it now relates to.
+
+    Used when a post is published or edited so the rest of the table does
+    not have to be rebuilt.
+    """
+    limit = limit or get_limit()
+    features = load_neighbourhood(post_id, limit)
+    if post_id not in features.category:
+        RelatedPost.objects.filter(post_id=post_id).delete()
+        return []
+    ranked = score(features, post_id, limit)
+    _store({post_id: ranked})
+    if cascade:
+        for related_id, _ in ranked:
+            refresh_post(related_id, limit, cascade=False)
+    return ranked
+
+
+def get_related_posts(post, limit=None):
+    """Return the precomputed related posts of ``post``."""
+    limit = limit or get_limit()
+    entries = (
+        RelatedPost.objects.filter(post=post, related__status='published')
+        .select_related('related')
+        .order_by('-score')[:limit]
+    )
+    return [entry.related for entry in entries]
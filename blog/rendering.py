@@ -0,0 +1,388 @@
+"""
+Pre-rendered post bodies.
+
+``Post.content`` is raw CKEditor HTML. ``render`` turns it, once per save,
+into everything the post page needs:
+
+* sanitised HTML: tags, attributes and CSS properties outside an allow-list
+  are dropped (``<script>``/``<style>`` with their contents), and links and
+  images only keep http(s), mailto and relative URLs;
+* ``id`` anchors on h2-h4 headings, and a table of contents built from them;
+* word count and reading time (``POST_READING_WPM`` words per minute);
+* a plaintext summary, used by listings when a post has no excerpt;
+* ``srcset``/``sizes``, intrinsic dimensions and lazy loading for images
+  uploaded under ``MEDIA_URL``, pointing at pre-sized variants
+  (``POST_IMAGE_WIDTHS``).
+
+``Post.save`` stores the result in ``content_html``, ``toc``, ``word_count``,
+``reading_time`` and ``summary``, so views only emit stored bytes. Resizing
+images is too slow for a save: variants that do not exist yet are left out
+of ``srcset``, and the ``render_post`` Celery task creates them after
+commit, then renders the post again.
+"""
+import math
+import posixpath
+import re
+from dataclasses import dataclass, field
+from html import escape
+from html.parser import HTMLParser
+from io import BytesIO
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.text import Truncator, slugify
+from PIL import Image
+
+from core.cache import bump_version
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'col',
+    'colgroup', 'dd', 'del', 'div', 'dl', 'dt', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'kbd', 'li',
+    'mark', 'ol', 'p', 'pre', 'q', 's', 'samp', 'small', 'span', 'strike',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead',
+    'tr', 'u', 'ul', 'var',
+}
+VOID_TAGS = {'br', 'col', 'hr', 'img'}
+# Dropped together with everything inside them
+SKIPPED_TAGS = {'script', 'style', 'template', 'noscript', 'iframe', 'object', 'textarea', 'select'}
+BLOCK_TAGS = {
+    'blockquote', 'br', 'caption', 'dd', 'div', 'dt', 'figcaption', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'p', 'pre', 'td', 'th', 'tr',
+}
+
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'id', 'style', 'title', 'lang', 'dir'},
+    'a': {'href', 'name', 'target', 'rel'},
+    'blockquote': {'cite'},
+    'col': {'span'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'ol': {'start', 'type', 'reversed'},
+    'q': {'cite'},
+    'table': {'border', 'cellpadding', 'cellspacing', 'summary'},
+    'td': {'colspan', 'rowspan', 'headers'},
+    'th': {'colspan', 'rowspan', 'headers', 'scope'},
+}
+URL_ATTRIBUTES = {'href', 'src', 'cite'}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+ALLOWED_STYLES = {
+    'border', 'border-collapse', 'color', 'background-color', 'float', 'font-style',
+    'font-weight', 'height', 'margin', 'margin-left', 'margin-right', 'padding',
+    'text-align', 'text-decoration', 'vertical-align', 'width',
+}
+UNSAFE_STYLE = re.compile(r'url\s*\(|expression\s*\(|\\|/\*|[<>]', re.IGNORECASE)
+# Browsers ignore these inside URLs, so 'java\tscript:' is 'javascript:'
+URL_JUNK = re.compile(r'[\x00-\x20\x7f]+')
+
+TOC_TAGS = {'h2': 2, 'h3': 3, 'h4': 4}
+SUMMARY_WORDS = 50
+
+# Variants are only made for formats that resize without losing anything
+# (e.g. GIF animation)
+RESIZABLE_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+# Post columns holding the rendering
+RENDERED_FIELDS = ['content_html', 'toc', 'word_count', 'reading_time', 'summary']
+
+
+def get_wpm():
+    return getattr(settings, 'POST_READING_WPM', 230)
+
+
+def get_image_widths():
+    return sorted(getattr(settings, 'POST_IMAGE_WIDTHS', [480, 960, 1440]))
+
+
+def get_image_sizes():
+    return getattr(settings, 'POST_IMAGE_SIZES', '(max-width: 1200px) 100vw, 1150px')
+
+
+@dataclass
+class Rendered:
+    html: str
+    toc: list
+    text: str
+    pending_images: list = field(default_factory=list)
+
+    @property
+    def content_html(self):
+        return self.html
+
+    @property
+    def word_count(self):
+        return len(self.text.split())
+
+    @property
+    def reading_time(self):
+        """Minutes, rounded up; 0 for an empty post."""
+        return math.ceil(self.word_count / get_wpm())
+
+    @property
+    def summary(self):
+        return Truncator(self.text).words(SUMMARY_WORDS)
+
+    def fields(self):
+        """Values of the ``RENDERED_FIELDS`` columns."""
+        return {name: getattr(self, name) for name in RENDERED_FIELDS}
+
+
+# Sanitising ------------------------------------------------------------
+
+def clean_url(value):
+    value = URL_JUNK.sub('', value)
+    try:
+        scheme = urlsplit(value).scheme.lower()
+    except ValueError:
+        return None
+    return value if scheme in ALLOWED_SCHEMES else None
+
+
+def clean_style(value):
+    declarations = []
+    for declaration in value.split(';'):
+        name, _, val = declaration.partition(':')
+        name, val = name.strip().lower(), val.strip()
+        if name in ALLOWED_STYLES and val and not UNSAFE_STYLE.search(val):
+            declarations.append(f'{name}: {val}')
+    return '; '.join(declarations)
+
+
+def clean_attributes(tag, attrs):
+    allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+    cleaned = {}
+    for name, value in attrs:
+        if name not in allowed or name in cleaned:
+            continue
+        value = value or ''
+        if name in URL_ATTRIBUTES:
+            value = clean_url(value)
+        elif name == 'style':
+            value = clean_style(value)
+        if value:
+            cleaned[name] = value
+    if tag == 'a' and cleaned.get('target') == '_blank':
+        cleaned['rel'] = 'noopener noreferrer'
+    return cleaned
+
+
+def format_tag(tag, attrs):
+    return '<' + tag + ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items()) + '>'
+
+
+class BodyRenderer(HTMLParser):
+    """One pass over the HTML: sanitise, anchor headings, collect text."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.text = []
+        self.toc = []
+        self.pending_images = []
+        self.open_tags = []
+        self.skipping = 0
+        self.ids = set()
+        # (tag, attrs, index in out, text) of the heading being read
+        self.heading = None
+
+    def render(self, content):
+        self.feed(content or '')
+        self.close()
+        while self.open_tags:
+            self.end(self.open_tags[-1])
+        html = ''.join(self.out).strip()
+        text = ' '.join(''.join(self.text).split())
+        return Rendered(html, self.toc, text, self.pending_images)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+            return
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        attrs = clean_attributes(tag, attrs)
+        if 'id' in attrs:
+            self.ids.add(attrs['id'])
+        if tag == 'img':
+            attrs = self.responsive_image(attrs)
+        if tag in VOID_TAGS:
+            self.out.append(format_tag(tag, attrs))
+            return
+        if tag in TOC_TAGS and self.heading is None:
+            self.heading = (tag, attrs, len(self.out), [])
+        elif tag in TOC_TAGS:
+            # Nested heading (invalid HTML): keep the text, drop the tag
+            return
+        else:
+            self.out.append(format_tag(tag, attrs))
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+            return
+        if self.skipping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags[-1]
+            self.end(open_tag)
+            if open_tag == tag:
+                break
+
+    def end(self, tag):
+        self.open_tags.pop()
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if self.heading is not None and tag == self.heading[0]:
+            self.close_heading()
+        else:
+            self.out.append(f'</{tag}>')
+
+    def close_heading(self):
+        tag, attrs, start, text = self.heading
+        self.heading = None
+        title = ' '.join(''.join(text).split())
+        anchor = attrs.get('id') or self.unique_id(slugify(title) or 'section')
+        attrs['id'] = anchor
+        inner = ''.join(self.out[start:])
+        del self.out[start:]
+        self.out.append(
+            f'{format_tag(tag, attrs)}{inner}'
+            f'<a class="heading-anchor" href="#{escape(anchor)}" aria-hidden="true">#</a></{tag}>'
+        )
+        if title:
+            self.toc.append({'level': TOC_TAGS[tag], 'id': anchor, 'title': title})
+
+    def unique_id(self, anchor):
+        candidate, n = anchor, 1
+        while candidate in self.ids:
+            n += 1
+            candidate = f'{anchor}-{n}'
+        self.ids.add(candidate)
+        return candidate
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        self.out.append(escape(data, quote=False))
+        self.text.append(data)
+        if self.heading is not None:
+            self.heading[3].append(data)
+
+    def responsive_image(self, attrs):
+        name = media_name(attrs.get('src', ''))
+        if name is None:
+            return attrs
+        try:
+            width, height, image_format = image_info(name)
+        except (OSError, ValueError):
+            return attrs
+        attrs.setdefault('width', str(width))
+        attrs.setdefault('height', str(height))
+        attrs['loading'] = 'lazy'
+        attrs['decoding'] = 'async'
+        if image_format not in RESIZABLE_FORMATS:
+            return attrs
+        candidates = []
+        for variant_width in get_image_widths():
+            if variant_width >= width:
+                break
+            variant = variant_name(name, variant_width)
+            if default_storage.exists(variant):
+                candidates.append(f'{default_storage.url(variant)} {variant_width}w')
+            elif name not in self.pending_images:
+                self.pending_images.append(name)
+        if candidates:
+            candidates.append(f'{attrs["src"]} {width}w')
+            attrs['srcset'] = ', '.join(candidates)
+            attrs['sizes'] = get_image_sizes()
+        return attrs
+
+
+def render(content):
+    """Render CKEditor HTML (see the module docstring)."""
+    return BodyRenderer().render(content)
+
+
+# Images ----------------------------------------------------------------
+
+def media_name(src):
+    """Storage name of an image uploaded under ``MEDIA_URL``, else None."""
+    path = urlsplit(src).path if src else ''
+    if not path.startswith(settings.MEDIA_URL):
+        return None
+    name = posixpath.normpath(unquote(path[len(settings.MEDIA_URL):]))
+    if name.startswith(('.', '/')):
+        return None
+    return name
+
+
+def variant_name(name, width):
+    root, ext = posixpath.splitext(name)
+    return f'{root}_{width}w{ext}'
+
+
+def image_info(name):
+    """``(width, height, format)`` of an uploaded image; reads the header only."""
+    with default_storage.open(name) as fp, Image.open(fp) as image:
+        return image.width, image.height, image.format
+
+
+def generate_variants(name):
+    """Write the missing resized copies of an uploaded image.
+
+    Returns the number of files written.
+    """
+    written = 0
+    with default_storage.open(name) as fp, Image.open(fp) as image:
+        width, height = image.size
+        if image.format not in RESIZABLE_FORMATS:
+            return 0
+        for variant_width in get_image_widths():
+            if variant_width >= width:
+                break
+            variant = variant_name(name, variant_width)
+            if default_storage.exists(variant):
+                continue
+            resized = image.resize(
+                (variant_width, max(round(height * variant_width / width), 1)),
+                Image.Resampling.LANCZOS,
+            )
+            buffer = BytesIO()
+            resized.save(buffer, format=image.format)
+            default_storage.save(variant, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+# Storage ---------------------------------------------------------------
+
+def rerender(queryset, images=False):
+    """Render the given posts again and store the result.
+
+    With ``images``, missing image variants are generated first. Writes
+    with ``update()`` (no signals) and bumps the posts version once.
+    Returns the number of posts whose rendering changed.
+    """
+    from .models import POSTS_CACHE_NAME, Post
+
+    changed = 0
+    for post in queryset.only('id', 'content', *RENDERED_FIELDS).iterator():
+        rendered = render(post.content)
+        if images and rendered.pending_images:
+            for name in rendered.pending_images:
+                try:
+                    generate_variants(name)
+                except OSError:
+                    continue
+            rendered = render(post.content)
+        fields = rendered.fields()
+        if any(getattr(post, name) != value for name, value in fields.items()):
+            Post.objects.filter(pk=post.pk).update(**fields)
+            changed += 1
+    if changed:
+        bump_version(POSTS_CACHE_NAME)
+    return changed
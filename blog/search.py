@@ -0,0 +1,104 @@
+"""
+Full-text search over published posts.
+
+Each post stores a weighted ``tsvector`` (title > excerpt > content, with
+the CKEditor HTML stripped) in ``Post.search_vector``, backed by a GIN
+index. The column is refreshed by a ``post_save`` handler; on databases
+other than PostgreSQL search falls back to ``icontains`` matching.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector,
+)
+from django.db import connection
+from django.db.models import F, Func, Q, TextField, Value
+from django.utils.html import escape
+
+from .models import Post
+
+# Tags and character entities are replaced with spaces before indexing.
+HTML_PATTERN = r'<[^>]+>|&[#\w]+;'
+
+# Headline match delimiters: the headline is escaped first (stripping tags
+# leaves e.g. a '<' with no closing '>'), then these become <mark> tags.
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def get_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+
+def strip_html(expression):
+    return Func(
+        expression, Value(HTML_PATTERN), Value(' '), Value('g'),
+        function='regexp_replace', output_field=TextField(),
+    )
+
+
+def document():
+    """Expression building a post's weighted search vector in the database."""
+    config = get_config()
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('excerpt', weight='B', config=config)
+        + SearchVector(strip_html(F('content')), weight='C', config=config)
+    )
+
+
+def update_search_vectors(queryset=None):
+    """Recompute ``search_vector`` for the given posts in one UPDATE."""
+    if not is_supported():
+        return 0
+    queryset = queryset if queryset is not None else Post.objects.all()
+    return queryset.update(search_vector=document())
+
+
+def parse_query(text):
+    return SearchQuery(text, search_type='websearch', config=get_config())
+
+
+def filter_posts(queryset, text):
+    """Restrict ``queryset`` to posts matching ``text``, best matches first."""
+    if not is_supported():
+        return queryset.filter(
+            Q(title__icontains=text) | Q(excerpt__icontains=text) | Q(content__icontains=text)
+        )
+    query = parse_query(text)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-published_date')
+    )
+
+
+def search(text):
+    return filter_posts(Post.objects.filter(status='published'), text)
+
+
+def headlines(posts, text):
+    """Return ``{pk: snippet}`` with search terms wrapped in ``<mark>``.
+
+    Run separately for the page being shown so ``ts_headline`` (which is
+    expensive) is never evaluated for the whole result set.
+    """
+    if not posts or not is_supported():
+        return {}
+    query = parse_query(text)
+    rows = Post.objects.filter(pk__in=[post.pk for post in posts]).annotate(
+        snippet=SearchHeadline(
+            strip_html(F('content')), query, config=get_config(),
+            start_sel=START_SEL, stop_sel=STOP_SEL,
+            max_words=35, min_words=15, max_fragments=2,
+        )
+    ).values_list('pk', 'snippet')
+    return {pk: mark_matches(snippet) for pk, snippet in rows}
+
+
+def mark_matches(snippet):
+    """Escape a headline and turn its match delimiters into ``<mark>``."""
+    return escape(snippet).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
@@ -0,0 +1,112 @@
+"""
+Signal handlers for the blog app.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from core.cache import bump_version
+from core.tasks import enqueue_on_commit
+
+from .models import POSTS_CACHE_NAME, Post, PostTag
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, **kwargs):
+    bump_version(POSTS_CACHE_NAME)
+
+
+# Post fields read by the related-posts scoring; tags are followed by
+# post_tags_changed
+RELATED_FIELDS = ('status', 'category_id', 'published_date')
+
+
+def queue_related_posts(post):
+    if post.status != 'published' or getattr(post, 'related_queued', False):
+        return
+    from .tasks import update_related_posts
+    # Tags are saved after the post itself (e.g. by the admin), so wait
+    # for the transaction to commit before scoring. Once per transaction.
+    post.related_queued = True
+    enqueue_on_commit(update_related_posts, post.pk)
+    transaction.on_commit(lambda: setattr(post, 'related_queued', False))
+
+
+@receiver(pre_save, sender=Post)
+def post_related_inputs(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Post.objects.filter(pk=instance.pk).values(*RELATED_FIELDS).first()
+    instance.related_inputs_changed = previous is None or any(
+        previous[name] != getattr(instance, name) for name in RELATED_FIELDS
+    )
+    instance.related_queued = False
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, **kwargs):
+    if instance.related_inputs_changed:
+        queue_related_posts(instance)
+
+
+# Post fields the search vector is built from
+SEARCH_FIELDS = {'title', 'excerpt', 'content'}
+
+
+@receiver(post_save, sender=Post)
+def post_search_vector(sender, instance, update_fields=None, **kwargs):
+    # Status changes, view flushes and rerenders leave the text alone
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    from .search import update_search_vectors
+    update_search_vectors(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def post_images(sender, instance, **kwargs):
+    if not getattr(instance, 'pending_images', None):
+        return
+    from .tasks import render_post
+    # Resizing is slow: leave it to Celery, once the post is committed.
+    enqueue_on_commit(render_post, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def post_tag_state(sender, instance, created, **kwargs):
+    if created:
+        return
+    PostTag.objects.filter(post=instance).update(
+        is_published=instance.status == 'published',
+        published_date=instance.published_date,
+    )
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not isinstance(instance, Post):
+        return
+    PostTag.sync_post(instance)
+    bump_version(POSTS_CACHE_NAME)
+    # taggit sends add/remove even when set() changes nothing
+    if action == 'post_clear' or kwargs.get('pk_set'):
+        queue_related_posts(instance)
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, **kwargs):
+    if created:
+        return
+    updated = PostTag.objects.filter(tag=instance).exclude(
+        tag_slug=instance.slug, tag_name=instance.name
+    ).update(tag_slug=instance.slug, tag_name=instance.name)
+    if updated:
+        bump_version(POSTS_CACHE_NAME)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, **kwargs):
+    bump_version(POSTS_CACHE_NAME)
@@ -0,0 +1,37 @@
+"""
+Celery tasks for the blog app.
+"""
+from celery import shared_task
+
+from . import counters, popular, related, rendering
+from .models import Post
+
+
+@shared_task(ignore_result=True)
+def flush_post_views():
+    """Write buffered post view increments to the database."""
+    return counters.flush()
+
+
+@shared_task(ignore_result=True)
+def update_related_posts(post_id):
+    """Recompute related posts around a newly published or edited post."""
+    related.refresh_post(post_id)
+
+
+@shared_task(ignore_result=True)
+def render_post(post_id):
+    """Generate a post's missing image variants and render it again."""
+    return rendering.rerender(Post.objects.filter(pk=post_id), images=True)
+
+
+@shared_task(ignore_result=True)
+def recompute_related_posts():
+    """Rebuild the related-posts table for every published post."""
+    return related.recompute_all()
+
+
+@shared_task(ignore_result=True)
+def refresh_popular_posts():
+    """Decay the popular-post leaderboards and store their top lists."""
+    return popular.refresh()
@@ -0,0 +1,16 @@
+from django import template
+
+from blog.popular import BOARDS, get_popular
+
+register = template.Library()
+
+
+@register.inclusion_tag('blog/popular_posts.html')
+def popular_posts(*names):
+    """Render the precomputed top lists of the named boards (default: all)."""
+    return {
+        'boards': [
+            {'name': name, 'title': BOARDS[name].title, 'entries': get_popular(name)}
+            for name in names or BOARDS
+        ],
+    }
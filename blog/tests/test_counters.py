@@ -0,0 +1,120 @@
+"""
+Buffered view counters: views reach ``Post.views_count`` once per flush,
+and a flush that fails leaves them buffered for the next one.
+"""
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+
+from core.cache import get_redis_client, make_key
+
+from .. import counters, popular
+from ..models import Post
+
+
+class CounterTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='x')
+        cls.post = Post.objects.create(
+            title='Counted', slug='counted', author=author, content='<p>Body</p>', status='published'
+        )
+
+    def views(self):
+        self.post.refresh_from_db(fields=['views_count'])
+        return self.post.views_count
+
+
+@override_settings(VIEW_COUNTER_MODE='buffered', VIEW_COUNTER_FLUSH_INTERVAL=3600)
+@mock.patch('blog.counters.get_redis_client', return_value=None)
+class LocalCounterTests(CounterTestCase):
+    """In-process buffer, used when the default cache is not Redis."""
+
+    def setUp(self):
+        counters.clear_local()
+
+    def test_flush_applies_views_once(self, _):
+        for _ in range(3):
+            counters.record_view(self.post.pk)
+        self.assertEqual(self.views(), 0)
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(self.views(), 3)
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.views(), 3)
+
+    def test_failed_flush_keeps_views(self, _):
+        counters.record_view(self.post.pk, 2)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                counters.flush()
+        self.assertEqual(self.views(), 0)
+        counters.flush()
+        self.assertEqual(self.views(), 2)
+
+    @override_settings(VIEW_COUNTER_MODE='sync')
+    def test_sync_mode_writes_through(self, _):
+        counters.record_view(self.post.pk)
+        self.assertEqual(self.views(), 1)
+
+    @mock.patch('blog.popular.get_redis_client', return_value=None)
+    def test_popular_boards_see_views_on_commit(self, *_):
+        popular.clear_local()
+        trending = popular.BOARDS['trending']
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.apply_increments({self.post.pk: 4})
+            self.assertEqual(popular.compute(trending), [])
+        self.assertEqual([entry['id'] for entry in popular.compute(trending)], [self.post.pk])
+
+
+@skipUnless(get_redis_client(), 'needs Redis as the default cache')
+@override_settings(VIEW_COUNTER_MODE='buffered')
+class RedisCounterTests(CounterTestCase):
+    """Redis hash buffer, moved aside under a new key while it is flushed."""
+
+    def setUp(self):
+        self.client = get_redis_client()
+        self.key = make_key(counters.PENDING_KEY)
+        self.addCleanup(self.delete_buffers)
+        self.delete_buffers()
+
+    def delete_buffers(self):
+        keys = [self.key, *self.client.scan_iter(match=f'{self.key}:flushing:*')]
+        self.client.delete(*keys)
+        cache.delete(counters.LOCK_KEY)
+
+    def batches(self):
+        return list(self.client.scan_iter(match=f'{self.key}:flushing:*'))
+
+    def test_flush_applies_views_once(self):
+        counters.record_view(self.post.pk)
+        counters.record_view(self.post.pk)
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(self.views(), 2)
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.views(), 2)
+        self.assertEqual(self.batches(), [])
+
+    def test_batch_kept_until_update_commits(self):
+        counters.record_view(self.post.pk, 5)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                counters.flush()
+        self.assertEqual(len(self.batches()), 1)
+        self.assertEqual(self.views(), 0)
+
+        # Views recorded meanwhile go to a fresh hash; both are applied.
+        counters.record_view(self.post.pk)
+        counters.flush()
+        self.assertEqual(self.views(), 6)
+        self.assertEqual(self.batches(), [])
+
+    def test_concurrent_flush_skipped(self):
+        counters.record_view(self.post.pk)
+        cache.add(counters.LOCK_KEY, 1, counters.LOCK_TIMEOUT)
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.views(), 0)
@@ -0,0 +1,115 @@
+"""
+The post body sanitiser: whatever ends up in ``content_html`` is emitted
+unescaped, so script in any form must not survive ``render``.
+"""
+from django.test import SimpleTestCase
+
+from ..rendering import render
+
+
+class SanitiserTests(SimpleTestCase):
+
+    def html(self, content):
+        return render(content).content_html
+
+    def assertStripped(self, content, expected):
+        html = self.html(content)
+        self.assertEqual(html, expected)
+        self.assertNotIn('javascript', html.lower())
+        self.assertNotIn('alert', html)
+
+    def test_script_and_style_dropped_with_contents(self):
+        self.assertStripped('<p>a<script>alert(1)</script>b</p>', '<p>ab</p>')
+        self.assertStripped('<p>a<SCRIPT SRC=//evil.example/x.js></SCRIPT>b</p>', '<p>ab</p>')
+        self.assertStripped('<style>body{background:url(javascript:alert(1))}</style><p>x</p>', '<p>x</p>')
+        # An unclosed script swallows the rest of the body
+        self.assertStripped('<p>a</p><script>alert(1)', '<p>a</p>')
+
+    def test_embedding_tags_dropped_with_contents(self):
+        for tag in ('iframe', 'object', 'template', 'noscript', 'textarea', 'select'):
+            with self.subTest(tag=tag):
+                self.assertStripped(f'<p>a<{tag}><img src=x onerror=alert(1)></{tag}>b</p>', '<p>ab</p>')
+
+    def test_unknown_tags_dropped_but_text_kept(self):
+        self.assertStripped('<svg onload=alert(1)><p>text</p></svg>', '<p>text</p>')
+        self.assertStripped('<math><mi>x</mi></math><form action="javascript:alert(1)">y</form>', 'xy')
+
+    def test_event_handlers_dropped(self):
+        self.assertStripped('<img src="/a.png" onerror="alert(1)">', '<img src="/a.png">')
+        self.assertStripped('<p onclick="alert(1)" ONMOUSEOVER=alert(2)>x</p>', '<p>x</p>')
+
+    def test_script_urls_dropped(self):
+        vectors = [
+            'javascript:alert(1)',
+            'JaVaScRiPt:alert(1)',
+            ' javascript:alert(1)',
+            'java\tscript:alert(1)',
+            'java&#x09;script:alert(1)',
+            '&#106;avascript:alert(1)',
+            '&#x6A;&#x61;&#x76;&#x61;&#x73;&#x63;&#x72;&#x69;&#x70;&#x74;&#x3A;alert(1)',
+            'vbscript:alert(1)',
+            'data:text/html;base64,PHNjcmlwdD5hbGVydCgxKTwvc2NyaXB0Pg==',
+        ]
+        for url in vectors:
+            with self.subTest(url=url):
+                self.assertStripped(f'<a href="{url}">x</a>', '<a>x</a>')
+                self.assertStripped(f'<img src="{url}">', '<img>')
+                self.assertStripped(f'<blockquote cite="{url}">q</blockquote>', '<blockquote>q</blockquote>')
+
+    def test_safe_urls_kept(self):
+        for url in ('https://example.com/a?b=1', 'http://example.com', 'mailto:a@example.com', '/post/a/', '#top'):
+            with self.subTest(url=url):
+                self.assertEqual(self.html(f'<a href="{url}">x</a>'), f'<a href="{url.replace("&", "&amp;")}">x</a>')
+
+    def test_unsafe_styles_dropped(self):
+        vectors = [
+            'background-color: url(javascript:alert(1))',
+            'width: expression(alert(1))',
+            'color: red\\3b background: url(x)',
+            'color: /**/expression(alert(1))',
+            'color: </style><script>alert(1)</script>',
+            'behavior: url(x.htc)',
+            'position: fixed',
+        ]
+        for style in vectors:
+            with self.subTest(style=style):
+                self.assertStripped(f'<p style="{style}">x</p>', '<p>x</p>')
+        self.assertEqual(
+            self.html('<p style="COLOR: red; position: absolute; width: expression(1)">x</p>'),
+            '<p style="color: red">x</p>',
+        )
+
+    def test_attribute_values_escaped(self):
+        html = self.html('<p title=\'" onmouseover="alert(1)\'>x</p>')
+        self.assertEqual(html, '<p title="&quot; onmouseover=&quot;alert(1)">x</p>')
+        html = self.html('<p title="&quot;&gt;&lt;script&gt;alert(1)&lt;/script&gt;">x</p>')
+        self.assertNotIn('<script', html)
+
+    def test_text_escaped(self):
+        self.assertEqual(self.html('<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>'), '<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>')
+        self.assertEqual(render('<p>&lt;b&gt;</p>').summary, '<b>')
+
+    def test_heading_ids_escaped(self):
+        rendered = render('<h2 id="&quot;><script>alert(1)</script>">Title</h2>')
+        self.assertNotIn('<script', rendered.content_html)
+        self.assertEqual(rendered.toc, [{'level': 2, 'id': '"><script>alert(1)</script>', 'title': 'Title'}])
+
+    def test_blank_target_gets_rel(self):
+        self.assertEqual(
+            self.html('<a href="/x" target="_blank" rel="opener">x</a>'),
+            '<a href="/x" target="_blank" rel="noopener noreferrer">x</a>',
+        )
+
+    def test_allowed_markup_kept(self):
+        content = (
+            '<h2>Intro</h2><p class="lead"><strong>Bold</strong> and <em>em</em></p>'
+            '<table border="1"><tr><td colspan="2">cell</td></tr></table>'
+        )
+        rendered = render(content)
+        self.assertEqual(
+            rendered.content_html,
+            '<h2 id="intro">Intro<a class="heading-anchor" href="#intro" aria-hidden="true">#</a></h2>'
+            '<p class="lead"><strong>Bold</strong> and <em>em</em></p>'
+            '<table border="1"><tr><td colspan="2">cell</td></tr></table>',
+        )
+        self.assertEqual(rendered.toc, [{'level': 2, 'id': 'intro', 'title': 'Intro'}])
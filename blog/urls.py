@@ -6,9 +6,13 @@ app_name = 'blog'
 
 urlpatterns = [
     path('', views.post_list, name='post_list'),
+    path('search/', views.search, name='search'),
+    path('archive/', views.archive, name='archive'),
+    path('archive/<int:year>/<int:month>/', views.archive_month, name='archive_month'),
     path('post/<slug:slug>/', views.post_detail, name='post_detail'),
     path('category/<slug:slug>/', views.category_posts, name='category_posts'),
     path('tag/<slug:slug>/', views.tag_posts, name='tag_posts'),
+    path('tags/', views.tag_counts, name='tag_counts'),
     path('feed/rss/', LatestPostsFeed(), name='rss_feed'),
     path('feed/atom/', LatestPostsAtomFeed(), name='atom_feed'),
 ]
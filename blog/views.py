@@ -1,39 +1,104 @@
-from django.shortcuts import render, get_object_or_404
+import calendar
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Post, Category
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from core.cache import cached_for_version
+from core.pagecache import cache_page_versions
+from core.pagination import CachedCountPaginator, KeysetPaginator
+from .models import POSTS_CACHE_NAME, Post, PostTag, Category
+from .popular import POPULAR_CACHE_NAME
+from .related import get_related_posts
+from . import search as post_search
 from taggit.models import Tag
 
 
-def post_list(request):
+POSTS_PER_PAGE = 10
+TAG_COUNTS_LIMIT = 100
+
+
+def published_posts():
+    """Published posts with everything a post card renders, in constant queries."""
+    return Post.objects.filter(status='published').select_related(
+        'author', 'category'
+    ).prefetch_related('tag_index').defer('content', 'content_html', 'toc', 'search_vector')
+
+
+def paginate_posts(request, posts, count_key, keyset=None):
+    """Paginate a post listing.
+    
+    Uses keyset pagination on (published_date, id) when BLOG_PAGINATION is
+    'keyset' (or ``keyset`` is forced), otherwise numbered pages. Either
+    way the total comes from a count cached until the next post change.
+    """
+    if keyset is None:
+        keyset = getattr(settings, 'BLOG_PAGINATION', 'offset') == 'keyset'
+    if keyset:
+        posts = posts.filter(published_date__isnull=False)
+    
+    def count():
+        return cached_for_version(POSTS_CACHE_NAME, f'blog:count:{count_key}', posts.count)
+    
+    if keyset:
+        return KeysetPaginator(posts, POSTS_PER_PAGE, count_func=count).get_page(request)
+    paginator = CachedCountPaginator(posts, POSTS_PER_PAGE, count)
+    return paginator.get_page(request.GET.get('page'))
+
+
+async def apaginate_posts(request, posts, count_key, keyset=None):
+    """Async variant of ``paginate_posts`` that fetches the page's rows."""
+    page_obj = await sync_to_async(paginate_posts)(request, posts, count_key, keyset)
+    if not isinstance(page_obj.object_list, list):
+        page_obj.object_list = [post async for post in page_obj.object_list]
+    return page_obj
+
+
+async def arender(request, template_name, context):
+    # Template rendering may still touch the database (lazy context
+    # processors), so it runs in the request's sync thread.
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@cache_page_versions(POSTS_CACHE_NAME, POPULAR_CACHE_NAME)
+async def post_list(request):
     """Display list of published blog posts."""
-    posts = Post.objects.filter(status='published').select_related('author', 'category')
+    posts = published_posts()
     
     # Pagination
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = await apaginate_posts(request, posts, 'all')
     
     context = {
         'page_obj': page_obj,
         'posts': page_obj.object_list,
     }
-    return render(request, 'blog/post_list.html', context)
+    return await arender(request, 'blog/post_list.html', context)
 
 
 def post_detail(request, slug):
     """Display single blog post."""
-    post = get_object_or_404(Post, slug=slug, status='published')
+    post = get_object_or_404(
+        # The template emits content_html; the source is not needed
+        Post.objects.select_related('author', 'category').prefetch_related('tags')
+        .defer('content', 'search_vector'),
+        slug=slug,
+        status='published'
+    )
     
     # Increment view count
-    post.views_count += 1
-    post.save(update_fields=['views_count'])
+    post.increment_views()
     
-    # Get related posts
-    related_posts = Post.objects.filter(
+    # Precomputed by blog.related; fall back to the same category until
+    # the first computation has run.
+    related_posts = get_related_posts(post) or Post.objects.filter(
         status='published',
         category=post.category
-    ).exclude(id=post.id)[:3]
+    ).exclude(id=post.id).only('title', 'slug', 'published_date')[:3]
     
     context = {
         'post': post,
@@ -42,43 +107,126 @@ def post_detail(request, slug):
     return render(request, 'blog/post_detail.html', context)
 
 
-def category_posts(request, slug):
+async def category_posts(request, slug):
     """Display posts from a specific category."""
-    category = get_object_or_404(Category, slug=slug)
-    posts = Post.objects.filter(
-        status='published',
-        category=category
-    ).select_related('author')
+    category = await aget_object_or_404(Category, slug=slug)
+    posts = published_posts().filter(category=category)
     
     # Pagination
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = await apaginate_posts(request, posts, f'category:{category.pk}')
     
     context = {
         'category': category,
         'page_obj': page_obj,
         'posts': page_obj.object_list,
     }
-    return render(request, 'blog/category_posts.html', context)
+    return await arender(request, 'blog/category_posts.html', context)
 
 
-def tag_posts(request, slug):
+async def tag_posts(request, slug):
     """Display posts with a specific tag."""
-    tag = get_object_or_404(Tag, slug=slug)
-    posts = Post.objects.filter(
-        status='published',
-        tags__slug=slug
-    ).select_related('author', 'category')
+    tag = await aget_object_or_404(Tag, slug=slug)
+    # Resolve the tag through the denormalised PostTag index rather than
+    # taggit's generic relation (content_type/object_id join plus a join
+    # to the tag table).
+    posts = published_posts().filter(
+        pk__in=PostTag.objects.filter(tag_slug=slug, is_published=True).values('post_id')
+    )
     
     # Pagination
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = await apaginate_posts(request, posts, f'tag:{tag.pk}')
     
     context = {
         'tag': tag,
         'page_obj': page_obj,
         'posts': page_obj.object_list,
     }
-    return render(request, 'blog/tag_posts.html', context)
+    return await arender(request, 'blog/tag_posts.html', context)
+
+
+def tag_counts(request):
+    """JSON tag cloud: published post count per tag, most used first."""
+    try:
+        limit = min(max(int(request.GET.get('limit', TAG_COUNTS_LIMIT)), 1), 1000)
+    except ValueError:
+        limit = TAG_COUNTS_LIMIT
+    
+    def counts():
+        return list(
+            PostTag.objects.filter(is_published=True)
+            .values('tag_slug', 'tag_name')
+            .annotate(count=Count('id'))
+            .order_by('-count', 'tag_name')[:limit]
+        )
+    
+    tags = cached_for_version(POSTS_CACHE_NAME, f'blog:tag_counts:{limit}', counts)
+    return JsonResponse({
+        'tags': [
+            {'name': row['tag_name'], 'slug': row['tag_slug'], 'count': row['count']}
+            for row in tags
+        ]
+    })
+
+
+def archive(request):
+    """List the months that have published posts."""
+    def months():
+        return list(
+            Post.objects.filter(status='published', published_date__isnull=False)
+            .annotate(month=TruncMonth('published_date'))
+            .values('month')
+            .annotate(count=Count('id'))
+            .order_by('-month')
+        )
+    
+    context = {
+        'months': cached_for_version(POSTS_CACHE_NAME, 'blog:archive_months', months),
+    }
+    return render(request, 'blog/archive.html', context)
+
+
+async def archive_month(request, year, month):
+    """Display the posts published in one month.
+    
+    The month bounds become a range condition on published_date, so the
+    query seeks straight into the index instead of paging through offsets.
+    """
+    if not 1 <= month <= 12 or not 1 <= year <= 9998:
+        raise Http404('Invalid month')
+    tz = timezone.get_current_timezone()
+    start = datetime(year, month, 1, tzinfo=tz)
+    days = calendar.monthrange(year, month)[1]
+    end = start + timedelta(days=days)
+    posts = published_posts().filter(
+        published_date__gte=start,
+        published_date__lt=end,
+    )
+    
+    page_obj = await apaginate_posts(request, posts, f'month:{year}-{month:02d}', keyset=True)
+    
+    context = {
+        'month_start': start,
+        'page_obj': page_obj,
+        'posts': page_obj.object_list,
+    }
+    return await arender(request, 'blog/archive_month.html', context)
+
+
+def search(request):
+    """Full-text search over published posts."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    snippets = {}
+    if query:
+        paginator = Paginator(post_search.search(query).select_related('author', 'category'), 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        snippets = post_search.headlines(page_obj.object_list, query)
+        for post in page_obj.object_list:
+            post.snippet = snippets.get(post.pk, '')
+    
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'posts': page_obj.object_list if page_obj else [],
+    }
+    return render(request, 'blog/search.html', context)
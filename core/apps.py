@@ -5,3 +5,9 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core'
+
+    def ready(self):
+        from . import metrics, signals  # noqa: F401
+        
+        if metrics.is_enabled():
+            metrics.install()
@@ -0,0 +1,314 @@
+"""
+Benchmark scenarios for the public read paths.
+
+``manage.py seed_benchmark`` fills the database with a reproducible data
+set; ``manage.py benchmark`` replays the scenarios below against it and
+reports throughput, latency percentiles and queries per request.
+
+Requests go through the Django test client in this process by default, or
+over HTTP to a running server (``--url``) to measure the serving stack as
+well. Either way the query count is read from the ``Server-Timing`` header
+added by ``core.middleware.RequestMetricsMiddleware``, so it is the count
+the view itself ran.
+
+Results are saved as JSON and can be compared between commits with
+``benchmark --compare old.json``.
+"""
+import http.client
+import json
+import platform
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+# Slugs, usernames and values of seeded rows start with this.
+SEED_PREFIX = 'bench'
+
+# Published posts the post_detail scenario cycles through
+DETAIL_POSTS = 50
+
+QUERIES_RE = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+@dataclass
+class Scenario:
+    name: str
+    paths: list
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    paths: int
+    seconds: float = 0.0
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    statuses: dict = field(default_factory=dict)
+    errors: int = 0
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        queries = [count for count in self.queries if count is not None]
+        return {
+            'paths': self.paths,
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'seconds': round(self.seconds, 3),
+            'rps': round(len(latencies) / self.seconds, 1) if self.seconds else None,
+            'mean_ms': _ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50_ms': _ms(percentile(latencies, 0.50)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+            'max_ms': _ms(latencies[-1]) if latencies else None,
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of sorted ``values``."""
+    if not values:
+        return None
+    position = fraction * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def build_scenarios():
+    """Return ``{name: Scenario}`` for the seeded database."""
+    from blog.models import Post
+
+    slugs = list(
+        Post.objects.filter(status='published')
+        .order_by('-published_date')
+        .values_list('slug', flat=True)[:DETAIL_POSTS]
+    )
+    scenarios = [
+        Scenario('home', [reverse('core:home')]),
+        Scenario('post_list', [reverse('blog:post_list')]),
+        Scenario('post_detail', [reverse('blog:post_detail', kwargs={'slug': slug}) for slug in slugs]),
+        Scenario('rss_feed', [reverse('blog:rss_feed')]),
+        Scenario('atom_feed', [reverse('blog:atom_feed')]),
+        Scenario('infocon_status', [reverse('threats:infocon_api')]),
+        Scenario('dashboard', [reverse('threats:dashboard')]),
+    ]
+    return {scenario.name: scenario for scenario in scenarios if scenario.paths}
+
+
+def parse_queries(header):
+    """Query count from a Server-Timing header, or None."""
+    match = QUERIES_RE.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+# Transports -------------------------------------------------------------
+
+def clear_caches():
+    """Clear the shared cache and every in-process copy of cached state."""
+    from django.core.cache import cache
+    from blog import counters, popular
+    from threats import ipindex
+    from . import cache as versioned
+
+    cache.clear()
+    versioned.clear_local()
+    popular.clear_local()
+    counters.clear_local()
+    ipindex.clear_local()
+
+
+class ClientTransport:
+    """Requests through the Django test client, in this process."""
+
+    label = 'in-process'
+
+    def __init__(self, cold=False):
+        self.cold = cold
+        hosts = [host for host in settings.ALLOWED_HOSTS if host and '*' not in host]
+        self.host = (hosts[0] if hosts else 'localhost').lstrip('.')
+
+    def connect(self):
+        from django.test import Client
+        return Client(SERVER_NAME=self.host)
+
+    def prepare(self):
+        """Called before every request, outside the timed window."""
+        if self.cold:
+            clear_caches()
+
+    def request(self, client, path):
+        response = client.get(path)
+        # Drain streaming responses so their queries and time are counted
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, parse_queries(response.get('Server-Timing'))
+
+    def close(self, client):
+        connection.close()
+
+
+class HTTPTransport:
+    """Requests over keep-alive HTTP connections to a running server."""
+
+    def __init__(self, url):
+        self.url = urlsplit(url)
+        self.label = url
+
+    def prepare(self):
+        pass
+
+    def connect(self):
+        connection_class = (
+            http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        )
+        return connection_class(self.url.hostname, self.url.port, timeout=30)
+
+    def request(self, conn, path):
+        try:
+            conn.request('GET', self.url.path.rstrip('/') + path, headers={'Host': self.url.netloc})
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return None, None
+        return response.status, parse_queries(response.getheader('Server-Timing'))
+
+    def close(self, conn):
+        conn.close()
+
+
+# Runner -----------------------------------------------------------------
+
+def _worker(transport, scenario, offset, count, warmup, result, lock, start_gate):
+    client = transport.connect()
+    latencies, queries, statuses, errors = [], [], {}, 0
+    try:
+        for i in range(warmup):
+            transport.prepare()
+            transport.request(client, scenario.paths[(offset + i) % len(scenario.paths)])
+        start_gate.wait()
+        for i in range(count):
+            path = scenario.paths[(offset + i) % len(scenario.paths)]
+            transport.prepare()
+            started = time.perf_counter()
+            status, query_count = transport.request(client, path)
+            elapsed = time.perf_counter() - started
+            if status is None or status >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+                queries.append(query_count)
+            statuses[status or 0] = statuses.get(status or 0, 0) + 1
+    finally:
+        transport.close(client)
+    with lock:
+        result.latencies.extend(latencies)
+        result.queries.extend(queries)
+        result.errors += errors
+        for status, hits in statuses.items():
+            result.statuses[status] = result.statuses.get(status, 0) + hits
+
+
+def run_scenario(transport, scenario, requests=200, warmup=20, concurrency=1):
+    """Replay ``scenario`` with ``concurrency`` closed-loop clients."""
+    result = ScenarioResult(scenario.name, len(scenario.paths))
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency + 1)
+    per_client = [requests // concurrency + (n < requests % concurrency) for n in range(concurrency)]
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(transport, scenario, n * len(scenario.paths) // concurrency, per_client[n],
+                  warmup, result, lock, start_gate),
+        )
+        for n in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    start_gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment(transport, options):
+    """What a result was measured against, saved alongside it."""
+    from blog.models import Post
+    from threats.models import IPReputation, PortActivity, ThreatIndicator
+
+    return {
+        'created': timezone.now().isoformat(),
+        'revision': git_revision(),
+        'target': transport.label,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cache': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+        'debug': settings.DEBUG,
+        'rows': {
+            'posts': Post.objects.count(),
+            'indicators': ThreatIndicator.objects.count(),
+            'ips': IPReputation.objects.count(),
+            'ports': PortActivity.objects.count(),
+        },
+        'options': options,
+    }
+
+
+def run(transport, scenarios, requests=200, warmup=20, concurrency=1, progress=None):
+    """Run ``scenarios`` in order; returns the report as a dict."""
+    options = {'requests': requests, 'warmup': warmup, 'concurrency': concurrency,
+               'cold': getattr(transport, 'cold', False)}
+    report = {'environment': environment(transport, options), 'scenarios': {}}
+    for scenario in scenarios:
+        result = run_scenario(transport, scenario, requests, warmup, concurrency)
+        report['scenarios'][scenario.name] = result.as_dict()
+        if progress:
+            progress(scenario.name, report['scenarios'][scenario.name])
+    return report
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def compare(baseline, report):
+    """Rows of ``(scenario, metric, before, after, change %)`` for shared scenarios."""
+    rows = []
+    for name, after in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+            old, new = before.get(metric), after.get(metric)
+            change = round((new - old) / old * 100, 1) if old and new is not None else None
+            rows.append((name, metric, old, new, change))
+    return rows
@@ -0,0 +1,147 @@
+"""
+Cache helpers shared across apps.
+
+``cached`` implements a two-level cache for small, hot values (site name,
+current InfoCon level, ...): each process keeps the value in memory and the
+default cache (Redis) holds it under a versioned key. Model signals call
+``bump_version`` to invalidate, which changes the key every process reads;
+processes re-check the shared version at most once per
+``CACHE_VERSION_CHECK_INTERVAL`` seconds, so the common path costs no
+network round trip at all.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from .metrics import record_cache
+
+_MISSING = object()
+
+# Versioned keys are never overwritten, only retired; let Redis drop
+# retired ones eventually.
+VERSIONED_TIMEOUT = 60 * 60 * 24
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def get_redis_client():
+    """Return the raw redis client behind the default cache, or None.
+
+    Some features need Redis primitives (hashes, sorted sets) that the
+    Django cache API does not expose. Callers fall back to an in-process
+    implementation when the default cache is not Redis.
+    """
+    from django.core.cache.backends.redis import RedisCache
+
+    backend = caches['default']
+    if not isinstance(backend, RedisCache):
+        return None
+    return backend._cache.get_client(write=True)
+
+
+def make_key(key):
+    """Apply the default cache's key prefix/version to a raw redis key."""
+    return caches['default'].make_key(key)
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Return the current shared version number of ``name``."""
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def get_versions(names):
+    """Return the current versions of ``names`` as a tuple, in one round trip."""
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    return tuple(
+        found[key] if found.get(key) is not None else get_version(name)
+        for key, name in zip(keys, names)
+    )
+
+
+def bump_version(name):
+    """Invalidate every cached copy of ``name`` in all processes."""
+    key = _version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+    with _local_lock:
+        _local.pop(name, None)
+
+
+def clear_local():
+    """Drop this process's copies of versioned values (cold benchmarks)."""
+    with _local_lock:
+        _local.clear()
+
+
+def peek(name, default=None):
+    """Return this process's copy of ``name`` while it is still trusted.
+    
+    Never touches the network; async code uses it to skip a thread switch
+    on the hot path and only falls back to ``cached`` when it gets
+    ``default``.
+    """
+    interval = getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 2)
+    entry = _local.get(name)
+    if entry is not None and time.monotonic() - entry[2] < interval:
+        return entry[1]
+    return default
+
+
+def cached(name, builder, timeout=VERSIONED_TIMEOUT):
+    """Return the value of ``name``, calling ``builder()`` on a miss.
+
+    ``timeout`` applies to the shared copy; versioning, not expiry, is what
+    keeps it fresh.
+    """
+    interval = getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 2)
+    now = time.monotonic()
+    entry = _local.get(name)
+    if entry is not None and now - entry[2] < interval:
+        record_cache(hit=True)
+        return entry[1]
+
+    version = get_version(name)
+    hit = True
+    if entry is not None and entry[0] == version:
+        value = entry[1]
+    else:
+        key = f'{name}:v{version}'
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            hit = False
+            value = builder()
+            cache.set(key, value, timeout)
+    record_cache(hit)
+    with _local_lock:
+        _local[name] = (version, value, now)
+    return value
+
+
+def cached_for_version(version_name, key, builder, timeout=VERSIONED_TIMEOUT):
+    """Cache ``builder()`` under ``key`` for the current version of ``version_name``.
+
+    For values derived from content tracked by a version (e.g. post counts
+    per category): bumping the version retires every such key at once.
+    """
+    full_key = f'{key}:{version_name}:v{get_version(version_name)}'
+    value = cache.get(full_key, _MISSING)
+    record_cache(hit=value is not _MISSING)
+    if value is _MISSING:
+        value = builder()
+        cache.set(full_key, value, timeout)
+    return value
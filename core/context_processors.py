@@ -1,32 +1,47 @@
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.utils.functional import SimpleLazyObject
+
+from threats import infocon
+
+from .cache import cached
+
+SITE_CACHE_NAME = 'core:site_name'
+# Pages showing the level depend on the status threats.infocon publishes
+INFOCON_CACHE_NAME = infocon.STATUS_CACHE_NAME
 
 
 def site_settings(request):
-    """Add site settings to all templates."""
-    try:
-        current_site = Site.objects.get_current()
-    except:
-        current_site = None
-    
+    """Add site settings to all templates.
+
+    Database-backed values are lazy and cached (see ``core.cache``), so
+    templates that never use them cost nothing and the rest read memory.
+    """
     return {
-        'site_settings': {
-            'site_name': current_site.name if current_site else 'ISC Clone',
+        'site_settings': SimpleLazyObject(lambda: {
+            'site_name': get_site_name(),
             'site_description': 'Cybersecurity Threat Intelligence and Handler Diaries',
-        },
+        }),
         'ISSN_NUMBER': getattr(settings, 'ISSN_NUMBER', ''),
         'ISSN_L': getattr(settings, 'ISSN_L', ''),
         'PUBLISHER_NAME': getattr(settings, 'PUBLISHER_NAME', 'ISC Clone'),
         'PUBLISHER_COUNTRY': getattr(settings, 'PUBLISHER_COUNTRY', 'US'),
-        'INFOCON_STATUS': get_infocon_status(),
+        'INFOCON_STATUS': SimpleLazyObject(get_infocon_status),
     }
 
 
+def get_site_name():
+    """Get the current site's name."""
+    # Failures (e.g. database not migrated yet) fall back without caching.
+    try:
+        return cached(SITE_CACHE_NAME, lambda: Site.objects.get_current().name)
+    except Exception:
+        return 'ISC Clone'
+
+
 def get_infocon_status():
     """Get current InfoCon threat level."""
     try:
-        from threats.models import ThreatLevel
-        current = ThreatLevel.objects.first()
-        return current.level if current else 'low'
-    except:
+        return infocon.get_status().level
+    except Exception:
         return 'low'
@@ -0,0 +1,84 @@
+"""
+Handler directory and per-handler statistics.
+
+Post count, latest publication date and total views of every author come
+from one aggregate over published posts, grouped by author, and are stored
+in ``HandlerStats``. The directory then reads users, their ``Handler``
+profile and their stats in a single joined query instead of one ``COUNT``
+per handler.
+
+An author's row is refreshed when one of their posts is created, deleted,
+or changes author, status or publication date (see ``core.signals``).
+All rows are rebuilt every ``HANDLER_STATS_INTERVAL`` seconds, which picks
+up buffered view counts and bulk updates that bypass the signals.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version
+from .models import HandlerStats
+
+# Version bumped whenever handler stats, profiles or staff users change
+HANDLERS_CACHE_NAME = 'core:handlers'
+
+STATS_FIELDS = ['post_count', 'latest_post_date', 'total_views']
+
+
+def aggregate(user_ids=None):
+    """Stats rows computed from published posts, one per author."""
+    from blog.models import Post
+
+    posts = Post.objects.filter(status='published')
+    if user_ids is not None:
+        posts = posts.filter(author_id__in=user_ids)
+    return (
+        posts.order_by()
+        .values('author_id')
+        .annotate(
+            post_count=Count('id'),
+            latest_post_date=Max('published_date'),
+            total_views=Coalesce(Sum('views_count'), Value(0)),
+        )
+    )
+
+
+def refresh(user_ids=None):
+    """Recompute the stats of ``user_ids`` (default: every author).
+
+    Returns the number of rows written.
+    """
+    rows = [
+        HandlerStats(user_id=row['author_id'], **{name: row[name] for name in STATS_FIELDS})
+        for row in aggregate(user_ids)
+    ]
+    stale = HandlerStats.objects.exclude(user_id__in=[row.user_id for row in rows])
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        stale.delete()
+        HandlerStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=STATS_FIELDS + ['updated'],
+        )
+    bump_version(HANDLERS_CACHE_NAME)
+    return len(rows)
+
+
+def directory():
+    """Active staff users with their profile and stats, in one query."""
+    User = get_user_model()
+    return (
+        User.objects.filter(is_staff=True, is_active=True)
+        .exclude(handler__is_active_handler=False)
+        .select_related('handler')
+        .annotate(
+            post_count=Coalesce('handler_stats__post_count', Value(0)),
+            latest_post_date=F('handler_stats__latest_post_date'),
+            total_views=Coalesce('handler_stats__total_views', Value(0)),
+        )
+        .order_by('last_name', 'first_name', 'username')
+    )
@@ -0,0 +1,85 @@
+"""
+Benchmark the public read paths (see core.benchmark).
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+COLUMNS = ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean', 'errors')
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the benchmark scenarios in process (or against --url) and report throughput, '
+        'p50/p95/p99 latency and queries per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per client first')
+        parser.add_argument('--concurrency', type=int, default=1, help='Closed-loop clients')
+        parser.add_argument('--url', help='Base URL of a running server instead of the test client')
+        parser.add_argument('--cold', action='store_true', help='Clear all caches before every request (in process only)')
+        parser.add_argument('-o', '--output', help='Save the results as JSON')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+
+    def handle(self, *args, **options):
+        scenarios = benchmark.build_scenarios()
+        if options['list']:
+            for scenario in scenarios.values():
+                self.stdout.write(f'{scenario.name}: {len(scenario.paths)} path(s), e.g. {scenario.paths[0]}')
+            return
+        unknown = set(options['scenarios']) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Unknown or empty scenario(s): {", ".join(sorted(unknown))}. '
+                f'Available: {", ".join(scenarios)} (run seed_benchmark first?)'
+            )
+        if options['concurrency'] < 1 or options['requests'] < options['concurrency']:
+            raise CommandError('--requests must be at least --concurrency, which must be at least 1')
+        if options['url'] and options['cold']:
+            raise CommandError('--cold only applies in process')
+        if options['cold'] and options['concurrency'] > 1:
+            # One client's clear would empty the caches under another's request
+            raise CommandError('--cold needs --concurrency 1')
+        baseline = benchmark.load(options['compare']) if options['compare'] else None
+
+        if options['url']:
+            transport = benchmark.HTTPTransport(options['url'])
+        else:
+            transport = benchmark.ClientTransport(cold=options['cold'])
+        selected = [scenarios[name] for name in options['scenarios'] or scenarios]
+
+        self.stdout.write(f'{"scenario":<16}' + ''.join(f'{column:>14}' for column in COLUMNS))
+        report = benchmark.run(
+            transport,
+            selected,
+            requests=options['requests'],
+            warmup=options['warmup'],
+            concurrency=options['concurrency'],
+            progress=self.report_row,
+        )
+        if any(result['queries_mean'] is None for result in report['scenarios'].values()):
+            self.stderr.write(self.style.WARNING(
+                'No query counts in some responses: is METRICS_ENABLED / SERVER_TIMING_HEADER on?'
+            ))
+
+        if baseline:
+            revision = baseline['environment'].get('revision') or options['compare']
+            self.stdout.write(f'\nCompared with {revision}:')
+            for name, metric, before, after, change in benchmark.compare(baseline, report):
+                change = '' if change is None else f'{change:+.1f}%'
+                self.stdout.write(f'{name:<16}{metric:<14}{before!s:>12}{after!s:>12}{change:>10}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump(report, fp, indent=2)
+                fp.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+    def report_row(self, name, result):
+        self.stdout.write(f'{name:<16}' + ''.join(f'{result[column]!s:>14}' for column in COLUMNS))
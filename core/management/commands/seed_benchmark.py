@@ -0,0 +1,309 @@
+"""
+Seed a reproducible data set for the benchmark scenarios (see core.benchmark).
+"""
+import hashlib
+import ipaddress
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import Tag, TaggedItem
+
+from blog import related
+from blog.models import POSTS_CACHE_NAME, Category, Comment, Post, PostTag
+from blog.search import update_search_vectors
+from core import handlers as handler_stats
+from core.benchmark import SEED_PREFIX
+from core.cache import bump_version
+from threats import infocon, ipindex, porttrends, rollups
+from threats.models import IPReputation, PortActivity, PortActivityBucket, ThreatIndicator, ThreatLevel
+from threats.normalize import value_digest
+from threats.portlogs import get_bucket_seconds, upsert_counts
+
+SEED_SOURCE = 'benchmark seed'
+
+WORDS = (
+    'attack botnet campaign credential dns exploit firewall honeypot incident '
+    'indicator malware network patch payload phishing port ransomware scan '
+    'sensor server signature traffic vulnerability worm analysis handler '
+    'report diary packet capture protocol domain certificate update advisory'
+).split()
+
+TOPICS = (
+    'Malware', 'Phishing', 'Vulnerabilities', 'Network Security', 'Incident Response',
+    'Threat Intelligence', 'Cloud', 'Tools', 'Forensics', 'Policy',
+)
+
+# Skewed towards commonly scanned ports, like real sensor data.
+HOT_PORTS = [22, 23, 80, 443, 445, 3389, 8080, 5900, 1433, 3306, 6379, 25, 53, 123, 161]
+
+# Benchmarking address ranges (RFC 2544, RFC 5180)
+IPV4_RANGE = ipaddress.ip_network('198.18.0.0/15')
+IPV6_RANGE = ipaddress.ip_network('2001:2::/48')
+
+COUNTRIES = ['US', 'CN', 'RU', 'BR', 'IN', 'DE', 'NL', 'FR', 'KR', 'VN', 'GB', 'UA']
+
+
+def address(n):
+    """The ``n``-th seed address: IPv4 first, then IPv6."""
+    if n < IPV4_RANGE.num_addresses:
+        return str(IPV4_RANGE[n])
+    return str(IPV6_RANGE[n - IPV4_RANGE.num_addresses])
+
+
+class Command(BaseCommand):
+    help = 'Seed posts, tags, comments, indicators, IPs, ports and threat levels for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=80)
+        parser.add_argument('--handlers', type=int, default=8)
+        parser.add_argument('--comments', type=int, default=3, help='Approved comments per post')
+        parser.add_argument('--indicators', type=int, default=20000)
+        parser.add_argument('--ips', type=int, default=50000)
+        parser.add_argument('--ports', type=int, default=2000, help='Distinct ports with activity')
+        parser.add_argument('--port-hours', type=int, default=48, help='Hours of port activity buckets')
+        parser.add_argument('--levels', type=int, default=200, help='Threat level changes over the last year')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded rows first')
+
+    def handle(self, *args, **options):
+        if options['ips'] > IPV4_RANGE.num_addresses + IPV6_RANGE.num_addresses:
+            raise CommandError('--ips is larger than the benchmarking address ranges')
+        if options['flush']:
+            self.flush()
+        elif Post.objects.filter(slug__startswith=f'{SEED_PREFIX}-').exists():
+            raise CommandError('The database is already seeded; pass --flush to reseed')
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+
+        with transaction.atomic():
+            handlers = self.seed_handlers(options['handlers'])
+            posts = self.seed_posts(handlers, options['posts'], options['tags'], options['comments'])
+            self.seed_indicators(options['indicators'], handlers[0], posts)
+            self.seed_ips(options['ips'])
+            self.seed_levels(options['levels'], handlers[0])
+        self.seed_ports(options['ports'], options['port_hours'])
+
+        # Bulk inserts bypass the model signals: refresh what they maintain.
+        update_search_vectors(Post.objects.filter(slug__startswith=f'{SEED_PREFIX}-'))
+        related.recompute_all()
+        handler_stats.refresh()
+        rollups.refresh(since=self.now - timedelta(days=366))
+        porttrends.refresh()
+        ipindex.mark_rebuild()
+        bump_version(POSTS_CACHE_NAME)
+        infocon.publish()
+        self.stdout.write(self.style.SUCCESS('Seeded the benchmark data set'))
+
+    def flush(self):
+        User = get_user_model()
+        with transaction.atomic():
+            deleted = Post.objects.filter(slug__startswith=f'{SEED_PREFIX}-').delete()[0]
+            deleted += Category.objects.filter(slug__startswith=f'{SEED_PREFIX}-').delete()[0]
+            deleted += Tag.objects.filter(slug__startswith=f'{SEED_PREFIX}-').delete()[0]
+            deleted += User.objects.filter(username__startswith=f'{SEED_PREFIX}-').delete()[0]
+            deleted += ThreatIndicator.objects.filter(source=SEED_SOURCE).delete()[0]
+            # Raw deletes skip the per-row signals (IP index, rollups,
+            # InfoCon); handle() rebuilds all of them once afterwards.
+            for model in (IPReputation, ThreatLevel):
+                queryset = model.objects.filter(description=SEED_SOURCE)
+                deleted += queryset._raw_delete(queryset.db)
+            # Seeded ports are ones that had no activity before, so all of
+            # their buckets are seeded too.
+            ports = {}
+            for port, protocol in PortActivity.objects.filter(notes=SEED_SOURCE).values_list(
+                'port_number', 'protocol'
+            ):
+                ports.setdefault(protocol, []).append(port)
+            for protocol, numbers in ports.items():
+                deleted += PortActivityBucket.objects.filter(
+                    protocol=protocol, port_number__in=numbers
+                ).delete()[0]
+            deleted += PortActivity.objects.filter(notes=SEED_SOURCE).delete()[0]
+        self.stdout.write(f'Deleted {deleted} seeded rows')
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def content(self):
+        paragraphs = []
+        for n in range(self.rng.randint(4, 10)):
+            if n and self.rng.random() < 0.3:
+                paragraphs.append(f'<h2>{self.words(4).title()}</h2>')
+            paragraphs.append(f'<p>{self.words(self.rng.randint(40, 120))}.</p>')
+            if self.rng.random() < 0.2:
+                paragraphs.append(f'<pre><code>{self.words(12)}</code></pre>')
+        return '\n'.join(paragraphs)
+
+    def seed_handlers(self, count):
+        User = get_user_model()
+        return User.objects.bulk_create([
+            User(
+                username=f'{SEED_PREFIX}-handler-{n}',
+                first_name=self.rng.choice(WORDS).title(),
+                last_name=self.rng.choice(WORDS).title(),
+                email=f'{SEED_PREFIX}-handler-{n}@example.com',
+                is_staff=True,
+            )
+            for n in range(max(count, 1))
+        ])
+
+    def seed_posts(self, handlers, count, tag_count, comments):
+        categories = Category.objects.bulk_create([
+            Category(name=f'{topic} ({SEED_PREFIX})', slug=f'{SEED_PREFIX}-{n}')
+            for n, topic in enumerate(TOPICS)
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(name=f'{SEED_PREFIX} {self.rng.choice(WORDS)} {n}', slug=f'{SEED_PREFIX}-tag-{n}')
+            for n in range(max(tag_count, 1))
+        ])
+
+        posts = []
+        for n in range(count):
+            status = self.rng.choices(['published', 'draft', 'archived'], [90, 5, 5])[0]
+            title = self.words(self.rng.randint(4, 9)).capitalize()
+            excerpt = self.words(30).capitalize() + '.'
+            post = Post(
+                title=title,
+                slug=f'{SEED_PREFIX}-post-{n:06d}',
+                author=self.rng.choice(handlers),
+                category=self.rng.choice(categories),
+                excerpt=excerpt,
+                content=self.content(),
+                status=status,
+                is_featured=self.rng.random() < 0.02,
+                meta_description=excerpt[:160],
+                published_date=(
+                    self.now - timedelta(minutes=self.rng.randint(0, 2 * 365 * 24 * 60))
+                    if status != 'draft' else None
+                ),
+                views_count=int(self.rng.paretovariate(1.2) * 10),
+            )
+            # bulk_create() skips Post.save()
+            post.render_content()
+            posts.append(post)
+        posts = Post.objects.bulk_create(posts, batch_size=500)
+
+        content_type = ContentType.objects.get_for_model(Post)
+        tagged, index = [], []
+        for post in posts:
+            for tag in self.rng.sample(tags, min(len(tags), self.rng.randint(2, 6))):
+                tagged.append(TaggedItem(content_type=content_type, object_id=post.pk, tag=tag))
+                index.append(PostTag(
+                    post=post, tag=tag, tag_slug=tag.slug, tag_name=tag.name,
+                    is_published=post.status == 'published', published_date=post.published_date,
+                ))
+        TaggedItem.objects.bulk_create(tagged, batch_size=2000)
+        PostTag.objects.bulk_create(index, batch_size=2000)
+
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    post=post,
+                    author_name=self.rng.choice(WORDS).title(),
+                    author_email=f'{SEED_PREFIX}-reader@example.com',
+                    content=self.words(self.rng.randint(10, 60)).capitalize() + '.',
+                    is_approved=self.rng.random() < 0.9,
+                )
+                for post in posts
+                for _ in range(comments)
+            ],
+            batch_size=2000,
+        )
+        self.stdout.write(f'{len(posts)} posts, {len(tagged)} tags on posts, {len(posts) * comments} comments')
+        return [post for post in posts if post.status == 'published']
+
+    def indicator_value(self, indicator_type, n):
+        if indicator_type == 'ip':
+            return address(n)
+        if indicator_type == 'domain':
+            return f'{self.rng.choice(WORDS)}-{n}.{SEED_PREFIX}.example'
+        if indicator_type == 'url':
+            return f'http://{self.rng.choice(WORDS)}-{n}.{SEED_PREFIX}.example/{self.rng.choice(WORDS)}'
+        if indicator_type == 'hash':
+            return hashlib.sha256(f'{SEED_PREFIX}-{n}'.encode()).hexdigest()
+        if indicator_type == 'email':
+            return f'{self.rng.choice(WORDS)}-{n}@{SEED_PREFIX}.example'
+        return f'CVE-{2000 + n % 26}-{10000 + n}'
+
+    def seed_indicators(self, count, added_by, posts):
+        types = [choice for choice, _ in ThreatIndicator.IOC_TYPES]
+        severities = [choice for choice, _ in ThreatIndicator.SEVERITY_CHOICES]
+        rows = []
+        for n in range(count):
+            indicator_type = self.rng.choice(types)
+            value = self.indicator_value(indicator_type, n)
+            rows.append(ThreatIndicator(
+                indicator_type=indicator_type,
+                value=value,
+                digest=value_digest(value),
+                description=self.words(12).capitalize(),
+                severity=self.rng.choice(severities),
+                source=SEED_SOURCE,
+                added_by=added_by,
+                related_post=self.rng.choice(posts) if posts and self.rng.random() < 0.1 else None,
+                is_active=self.rng.random() < 0.9,
+            ))
+        ThreatIndicator.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+        self.stdout.write(f'{count} indicators')
+
+    def seed_ips(self, count):
+        reputations = [choice for choice, _ in IPReputation.REPUTATION_CHOICES]
+        IPReputation.objects.bulk_create(
+            [
+                IPReputation(
+                    ip_address=address(n),
+                    reputation=self.rng.choices(reputations, [40, 30, 25, 5])[0],
+                    reports_count=int(self.rng.paretovariate(1.1)),
+                    country=self.rng.choice(COUNTRIES),
+                    asn=self.rng.randint(1000, 65000),
+                    description=SEED_SOURCE,
+                )
+                for n in range(count)
+            ],
+            batch_size=2000,
+            ignore_conflicts=True,
+        )
+        self.stdout.write(f'{count} IP reputations')
+
+    def seed_levels(self, count, updated_by):
+        levels = [choice for choice, _ in ThreatLevel.LEVEL_CHOICES]
+        rows = ThreatLevel.objects.bulk_create([
+            ThreatLevel(level=self.rng.choices(levels, [60, 25, 12, 3])[0], description=SEED_SOURCE,
+                        updated_by=updated_by)
+            for _ in range(count)
+        ])
+        # recorded_date is auto_now_add; spread the changes over the year.
+        moments = sorted(self.now - timedelta(minutes=self.rng.randint(0, 365 * 24 * 60)) for _ in rows)
+        for row, moment in zip(rows, moments):
+            row.recorded_date = moment
+        ThreatLevel.objects.bulk_update(rows, ['recorded_date'], batch_size=1000)
+        self.stdout.write(f'{count} threat level changes')
+
+    def seed_ports(self, count, hours):
+        ports = HOT_PORTS + self.rng.sample(range(1024, 65536), max(count - len(HOT_PORTS), 0))
+        # Counters are added to, so leave ports with real activity alone and
+        # mark the rest for --flush.
+        existing = set(PortActivity.objects.values_list('port_number', 'protocol'))
+        seeded = {}
+        step = get_bucket_seconds()
+        for n in range(hours * 3600 // step):
+            counts = Counter()
+            for port in ports[:count]:
+                if self.rng.random() < 0.3 or port in HOT_PORTS:
+                    protocol = 'TCP' if self.rng.random() < 0.85 else 'UDP'
+                    if (port, protocol) in existing:
+                        continue
+                    counts[port, protocol] += int(self.rng.paretovariate(1.3) * (50 if port in HOT_PORTS else 2))
+                    seeded.setdefault(protocol, set()).add(port)
+            upsert_counts(counts, seen=self.now - timedelta(seconds=n * step))
+        for protocol, numbers in seeded.items():
+            PortActivity.objects.filter(protocol=protocol, port_number__in=numbers).update(notes=SEED_SOURCE)
+        self.stdout.write(f'{hours} hours of activity on {min(count, len(ports))} ports')
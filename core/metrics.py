@@ -0,0 +1,297 @@
+"""
+Per-view request metrics.
+
+While a request is handled, ``RequestMetricsMiddleware`` keeps a
+``RequestMetrics`` in a context variable. The hooks that ``install`` sets up
+add to it:
+
+- a database execute wrapper, installed on every new connection, counts
+  queries and the time spent in them. Transaction control (``BEGIN``,
+  ``COMMIT``, savepoints) is not counted;
+- templates from the ``TimedDjangoTemplates`` backend are timed
+  (outermost template only, so includes are not counted twice);
+- ``core.cache`` and ``core.pagecache`` report hits and misses through
+  ``record_cache``.
+
+Context variables follow the request into ``sync_to_async`` threads, so
+async views are measured like sync ones.
+
+Each process adds finished requests to in-memory per-view totals. A
+background thread folds them into a Redis hash shared by all workers every
+``METRICS_FLUSH_INTERVAL`` seconds, so requests never wait on Redis (when
+the default cache is not Redis the totals stay in-process). ``render``
+formats the totals for Prometheus.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+TOTALS_KEY = 'core:metrics'
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRICS = {
+    'requests': ('isc_view_requests_total', 'counter', 'Requests handled per view.'),
+    'seconds': ('isc_view_seconds_total', 'counter', 'Time spent handling requests per view.'),
+    'duration': ('isc_view_duration_seconds', 'histogram', 'Request duration per view.'),
+    'queries': ('isc_view_queries_total', 'counter', 'Database queries per view.'),
+    'db_seconds': ('isc_view_db_seconds_total', 'counter', 'Time spent in database queries per view.'),
+    'template_seconds': ('isc_view_template_seconds_total', 'counter', 'Time spent rendering templates per view.'),
+    'cache': ('isc_view_cache_requests_total', 'counter', 'Application cache lookups per view and result.'),
+    'over_budget': ('isc_view_query_budget_exceeded_total', 'counter', 'Requests that ran more queries than their budget.'),
+}
+
+# Statements that are transaction control rather than queries
+TRANSACTION_SQL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+_totals = defaultdict(float)
+_totals_lock = threading.Lock()
+# (pid, thread) of the background flusher; a forked worker starts its own
+_flusher = None
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_seconds: float = 0.0
+    template_seconds: float = 0.0
+    template_depth: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+def start():
+    """Begin measuring the current request; returns the token for ``finish``."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def resume(metrics):
+    """Measure into ``metrics`` again (e.g. while a body streams)."""
+    return _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+# Hooks -----------------------------------------------------------------
+
+def record_cache(hit):
+    """Count an application cache lookup against the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None or sql.startswith(TRANSACTION_SQL):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+def _connection_created(sender, connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class TimedTemplate:
+    """A backend template whose ``render`` is timed into the request."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self._template.render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` with render timing (the ``TEMPLATES`` backend).
+
+    Includes and extends are rendered by the engine directly, so only the
+    templates views and feeds ask for are timed.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def install():
+    """Hook query timing into Django; called once at startup."""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_connection_created, dispatch_uid='core.metrics')
+    for connection in connections.all(initialized_only=True):
+        _connection_created(None, connection)
+
+
+# Totals ----------------------------------------------------------------
+
+def _field(metric, view, extra=''):
+    return f'{metric}\t{view}\t{extra}'
+
+
+def add(view, metrics, seconds, over_budget=False):
+    """Add one finished request to the per-view totals (memory only)."""
+    _start_flusher()
+    with _totals_lock:
+        _totals[_field('requests', view)] += 1
+        _totals[_field('seconds', view)] += seconds
+        for bound in DURATION_BUCKETS:
+            if seconds <= bound:
+                _totals[_field('duration', view, bound)] += 1
+        _totals[_field('queries', view)] += metrics.queries
+        _totals[_field('db_seconds', view)] += metrics.db_seconds
+        _totals[_field('template_seconds', view)] += metrics.template_seconds
+        _totals[_field('cache', view, 'hit')] += metrics.cache_hits
+        _totals[_field('cache', view, 'miss')] += metrics.cache_misses
+        if over_budget:
+            _totals[_field('over_budget', view)] += 1
+
+
+def _start_flusher():
+    global _flusher
+
+    pid = os.getpid()
+    if _flusher is not None and _flusher[0] == pid:
+        return
+    with _totals_lock:
+        if _flusher is not None and _flusher[0] == pid:
+            return
+        thread = threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True)
+        _flusher = (pid, thread)
+    thread.start()
+
+
+def _flush_periodically():
+    from .cache import get_redis_client
+
+    if get_redis_client() is None:
+        # Totals stay in-process; nothing to fold.
+        return
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 10))
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush request metrics')
+
+
+def flush():
+    """Fold this process's totals into the shared hash, if there is one."""
+    from .cache import get_redis_client, make_key
+
+    client = get_redis_client()
+    if client is None:
+        return
+    with _totals_lock:
+        pending = dict(_totals)
+        _totals.clear()
+    if not pending:
+        return
+    pipe = client.pipeline(transaction=False)
+    key = make_key(TOTALS_KEY)
+    for field, amount in pending.items():
+        if amount:
+            pipe.hincrbyfloat(key, field, amount)
+    pipe.execute()
+
+
+def totals():
+    """Return ``{(metric, view, extra): amount}`` across all processes."""
+    from .cache import get_redis_client, make_key
+
+    client = get_redis_client()
+    if client is None:
+        with _totals_lock:
+            raw = dict(_totals)
+    else:
+        flush()
+        raw = {
+            field.decode(): float(amount)
+            for field, amount in client.hgetall(make_key(TOTALS_KEY)).items()
+        }
+    return {tuple(field.split('\t')): amount for field, amount in raw.items()}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(amount):
+    return str(int(amount)) if float(amount).is_integer() else repr(amount)
+
+
+def render():
+    """Totals in the Prometheus text exposition format."""
+    by_metric = defaultdict(dict)
+    for (metric, view, extra), amount in totals().items():
+        by_metric[metric][view, extra] = amount
+
+    lines = []
+    for metric, (name, kind, help_text) in METRICS.items():
+        samples = by_metric.get(metric)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if metric == 'duration':
+            requests = by_metric['requests']
+            seconds = by_metric['seconds']
+            for view in sorted({view for view, _ in requests}):
+                labels = f'view="{_label(view)}"'
+                for bound in DURATION_BUCKETS:
+                    count = samples.get((view, str(bound)), 0)
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {_number(count)}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {_number(requests[view, ""])}')
+                lines.append(f'{name}_sum{{{labels}}} {_number(seconds.get((view, ""), 0))}')
+                lines.append(f'{name}_count{{{labels}}} {_number(requests[view, ""])}')
+            continue
+        for (view, extra), amount in sorted(samples.items()):
+            labels = f'view="{_label(view)}"'
+            if metric == 'cache':
+                labels += f',result="{extra}"'
+            lines.append(f'{name}{{{labels}}} {_number(amount)}')
+    return '\n'.join(lines) + '\n'
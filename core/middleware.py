@@ -0,0 +1,140 @@
+"""
+Request instrumentation middleware.
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import FileResponse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view runs more queries than its budget allows and
+    ``QUERY_BUDGET_ACTION`` is ``'raise'`` (tests, CI)."""
+
+
+def get_budget(view):
+    """Query budget of a view name, or None for no budget."""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+class RequestMetricsMiddleware:
+    """Measure queries, DB time, template time and cache hits per view.
+
+    Adds a ``Server-Timing`` header (``SERVER_TIMING_HEADER``), checks the
+    view's query budget (``QUERY_BUDGETS``) and feeds the per-view totals
+    served by ``/metrics/``.
+    
+    Streaming responses are measured until their body is exhausted: the
+    budget check and the totals include queries run while streaming, but
+    the ``Server-Timing`` header, sent before the body, cannot.
+    ``FileResponse`` bodies are not followed (servers may hand the file to
+    ``wsgi.file_wrapper``). Transaction control (``BEGIN``/``COMMIT``,
+    savepoints) is not counted as queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.is_enabled():
+            return self.get_response(request)
+        started = time.perf_counter()
+        measured, token = metrics.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self.process(request, response, measured, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not metrics.is_enabled():
+            return await self.get_response(request)
+        started = time.perf_counter()
+        measured, token = metrics.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self.process(request, response, measured, time.perf_counter() - started)
+
+    def process(self, request, response, measured, seconds):
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            lookups = measured.cache_hits + measured.cache_misses
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={measured.db_seconds * 1000:.1f};desc="{measured.queries} queries"',
+                f'tpl;dur={measured.template_seconds * 1000:.1f}',
+                f'cache;desc="{measured.cache_hits}/{lookups} hits"',
+                f'total;dur={seconds * 1000:.1f}',
+            ])
+
+        if response.streaming and not isinstance(response, FileResponse):
+            measure = self.ameasure_stream if response.is_async else self.measure_stream
+            response.streaming_content = measure(
+                request, response.streaming_content, measured, time.perf_counter() - seconds,
+            )
+            return response
+        self.record(request, measured, seconds)
+        return response
+
+    def measure_stream(self, request, content, measured, started):
+        # The context variable is set only while a chunk is produced, never
+        # across a yield, so it is always reset in the context it was set in.
+        # Aborted streams are not recorded.
+        iterator = iter(content)
+        while True:
+            token = metrics.resume(measured)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                metrics.finish(token)
+            yield chunk
+        self.record(request, measured, time.perf_counter() - started)
+
+    async def ameasure_stream(self, request, content, measured, started):
+        iterator = aiter(content)
+        while True:
+            token = metrics.resume(measured)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            finally:
+                metrics.finish(token)
+            yield chunk
+        self.record(request, measured, time.perf_counter() - started)
+
+    def record(self, request, measured, seconds):
+        view = view_name(request)
+        budget = get_budget(view)
+        over_budget = budget is not None and measured.queries > budget
+        metrics.add(view, measured, seconds, over_budget=over_budget)
+
+        if over_budget:
+            message = f'{view} ran {measured.queries} queries (budget {budget}): {request.path}'
+            if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
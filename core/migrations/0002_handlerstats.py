@@ -0,0 +1,57 @@
+# Generated migration for the handler directory statistics
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+
+def populate_handler_stats(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    HandlerStats = apps.get_model('core', 'HandlerStats')
+    
+    rows = (
+        Post.objects.filter(status='published')
+        .order_by()
+        .values('author_id')
+        .annotate(post_count=Count('id'), latest_post_date=Max('published_date'), total_views=Sum('views_count'))
+    )
+    HandlerStats.objects.bulk_create(
+        [
+            HandlerStats(
+                user_id=row['author_id'],
+                post_count=row['post_count'],
+                latest_post_date=row['latest_post_date'],
+                total_views=row['total_views'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('blog', '0005_post_author_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HandlerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='handler_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('latest_post_date', models.DateTimeField(blank=True, null=True)),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Handler Statistics',
+                'verbose_name_plural': 'Handler Statistics',
+            },
+        ),
+        migrations.RunPython(populate_handler_stats, migrations.RunPython.noop),
+    ]
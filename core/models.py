@@ -4,6 +4,10 @@ Core models for ISC Clone.
 from django.db import models
 from django.contrib.auth.models import User
 
+from .cache import bump_version, cached
+
+SITE_SETTINGS_CACHE_NAME = 'core:site_settings'
+
 
 class SiteSettings(models.Model):
     """Global site settings and ISSN information."""
@@ -53,9 +57,23 @@ class SiteSettings(models.Model):
         # Ensure only one instance exists
         self.pk = 1
         super().save(*args, **kwargs)
+        bump_version(SITE_SETTINGS_CACHE_NAME)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_version(SITE_SETTINGS_CACHE_NAME)
+        return result
     
     @classmethod
     def get_settings(cls):
+        """Return the settings singleton, memoised per process and in Redis.
+        
+        The instance is shared; treat it as read-only.
+        """
+        return cached(SITE_SETTINGS_CACHE_NAME, cls._load_settings)
+    
+    @classmethod
+    def _load_settings(cls):
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
 
@@ -78,4 +96,34 @@ class Handler(models.Model):
         return f'{self.user.get_full_name() or self.user.username} - Handler'
     
     def get_post_count(self):
-        return self.user.blog_posts.filter(status='published').count()
+        """Published posts, from the stats row kept by ``core.handlers``.
+        
+        Free when the handler was fetched with
+        ``select_related('user__handler_stats')``; lists should use the
+        ``post_count`` annotation of ``core.handlers.directory()`` instead.
+        """
+        try:
+            return self.user.handler_stats.post_count
+        except HandlerStats.DoesNotExist:
+            return 0
+
+
+class HandlerStats(models.Model):
+    """Published-post statistics of one author, maintained by ``core.handlers``."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='handler_stats'
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    latest_post_date = models.DateTimeField(null=True, blank=True)
+    total_views = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Handler Statistics'
+        verbose_name_plural = 'Handler Statistics'
+    
+    def __str__(self):
+        return f'{self.user_id}: {self.post_count} posts, {self.total_views} views'
@@ -0,0 +1,155 @@
+"""
+Full-page cache for anonymous traffic.
+
+``cache_page_versions(*names)`` stores a view's rendered response together
+with the content versions (see ``core.cache``) it was built from. A cached
+page stays fresh for as long as every version matches; model signals bump
+the versions, so pages change exactly when their content does, with no
+blind TTL. Every page also depends on the versions read by ``base.html``
+(site name, InfoCon status).
+
+Outdated pages are served stale while one worker rebuilds them: the first
+request to notice takes a short lock with ``cache.add`` and renders, the
+others keep serving the previous copy instead of stampeding the database.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cache import VERSIONED_TIMEOUT, get_versions
+from .context_processors import INFOCON_CACHE_NAME, SITE_CACHE_NAME
+from .metrics import record_cache
+
+BASE_VERSIONS = (SITE_CACHE_NAME, INFOCON_CACHE_NAME)
+STORED_HEADERS = ('Content-Type', 'Content-Language')
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', VERSIONED_TIMEOUT)
+
+
+def get_lock_timeout():
+    return getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30)
+
+
+def page_key(request):
+    url = request.build_absolute_uri()
+    return 'pagecache:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    return not (user and user.is_authenticated)
+
+
+def is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header('Cache-Control')
+        # The page embeds a CSRF token, which is per visitor.
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _from_entry(entry, state):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers'].items():
+        response[name] = value
+    response['X-Page-Cache'] = state
+    return response
+
+
+def _lookup(request, names):
+    """Return ``(cached response or None, state for _store)``."""
+    if not is_cacheable_request(request):
+        return None, None
+    versions = get_versions(names)
+    key = page_key(request)
+    entry = cache.get(key)
+    if entry is not None and entry['versions'] == versions:
+        record_cache(hit=True)
+        return _from_entry(entry, 'hit'), None
+    
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, get_lock_timeout())
+    if not locked and entry is not None:
+        record_cache(hit=True)
+        return _from_entry(entry, 'stale'), None
+    record_cache(hit=False)
+    return None, (key, versions, lock_key if locked else None)
+
+
+def _store(request, state, response):
+    """Store a freshly rendered response and release the rebuild lock."""
+    key, versions, lock_key = state
+    try:
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if is_cacheable_response(request, response):
+            cache.set(key, {
+                'versions': versions,
+                'content': response.content,
+                'status': response.status_code,
+                'headers': {
+                    name: response[name] for name in STORED_HEADERS if response.has_header(name)
+                },
+            }, get_timeout())
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+    response['X-Page-Cache'] = 'miss'
+    return response
+
+
+def _release(state):
+    if state and state[2]:
+        cache.delete(state[2])
+
+
+def cache_page_versions(*names):
+    """Cache a view's anonymous responses until one of ``names`` is bumped.
+    
+    Works on both sync and async views.
+    """
+    names = BASE_VERSIONS + tuple(names)
+    
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                cached_response, state = await sync_to_async(_lookup)(request, names)
+                if cached_response is not None:
+                    return cached_response
+                if state is None:
+                    return await view(request, *args, **kwargs)
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    await sync_to_async(_release)(state)
+                    raise
+                return await sync_to_async(_store)(request, state, response)
+            return async_wrapper
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            cached_response, state = _lookup(request, names)
+            if cached_response is not None:
+                return cached_response
+            if state is None:
+                return view(request, *args, **kwargs)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                _release(state)
+                raise
+            return _store(request, state, response)
+        return wrapper
+    return decorator
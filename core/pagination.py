@@ -0,0 +1,171 @@
+"""
+Paginators for large, frequently crawled listings.
+
+``KeysetPaginator`` seeks with ``WHERE (key1, key2) < (cursor values)``
+instead of ``OFFSET``, so every page costs the same index range scan no
+matter how deep it is, and it never needs ``COUNT(*)``. Cursors are opaque
+URL-safe tokens. Jumping to the last page is a reverse scan from the other
+end of the index.
+
+``CachedCountPaginator`` keeps Django's numbered pages but takes its count
+from a callable, typically a cached one.
+"""
+import base64
+import json
+from functools import cached_property
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+    """Offset paginator whose total comes from ``count_func``."""
+
+    def __init__(self, object_list, per_page, count_func, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count_func = count_func
+
+    @cached_property
+    def count(self):
+        return self._count_func()
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """Cursor paginator over a queryset ordered by ``keys``.
+
+    ``keys`` must be non-null and together unique (end with the primary
+    key). Prefix a key with ``-`` for descending order; all keys must share
+    the same direction so one index can serve both page directions.
+    """
+
+    def __init__(self, queryset, per_page, keys=('-published_date', '-id'), count_func=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = keys[0].startswith('-')
+        self.fields = [key.lstrip('-') for key in keys]
+        if any(key.startswith('-') != self.descending for key in keys):
+            raise ValueError('All keyset fields must share one sort direction')
+        self._count_func = count_func
+
+    @cached_property
+    def count(self):
+        """Total number of rows; only available when ``count_func`` was given."""
+        return self._count_func() if self._count_func else None
+
+    # Cursor encoding ---------------------------------------------------
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = json.loads(raw)
+        except (ValueError, TypeError):
+            raise InvalidCursor(token)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(token)
+        meta = self.queryset.model._meta
+        try:
+            return [meta.get_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor(token)
+
+    # Querying ----------------------------------------------------------
+
+    def _ordering(self, reverse=False):
+        descending = self.descending != reverse
+        return [f'-{name}' if descending else name for name in self.fields]
+
+    def _seek(self, values, forward):
+        """Rows strictly after (``forward``) or before the cursor position."""
+        op = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            term = Q(**{f'{name}__{op}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        # Redundant, but gives the planner a range on the leading key, so
+        # the index scan starts at the cursor instead of filtering from
+        # the top of the index.
+        return Q(**{f'{self.fields[0]}__{op}e': values[0]}) & condition
+
+    def page(self, after=None, before=None, last=False):
+        """Return the page after/before a cursor token, or the first/last page."""
+        size = self.per_page
+        if before:
+            rows = list(
+                self.queryset.filter(self._seek(self.decode_cursor(before), forward=False))
+                .order_by(*self._ordering(reverse=True))[:size + 1]
+            )
+            has_previous = len(rows) > size
+            return KeysetPage(rows[:size][::-1], self, has_next=True, has_previous=has_previous)
+        if last:
+            rows = list(self.queryset.order_by(*self._ordering(reverse=True))[:size + 1])
+            return KeysetPage(rows[:size][::-1], self, has_next=False, has_previous=len(rows) > size)
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self._seek(self.decode_cursor(after), forward=True))
+        rows = list(queryset.order_by(*self._ordering())[:size + 1])
+        return KeysetPage(rows[:size], self, has_next=len(rows) > size, has_previous=bool(after))
+
+    def get_page(self, request):
+        """Page selected by the ``after``/``before``/``last`` query parameters.
+
+        Invalid cursors fall back to the first page, like
+        ``Paginator.get_page`` does for invalid page numbers.
+        """
+        params = request.GET
+        try:
+            return self.page(
+                after=params.get('after'),
+                before=params.get('before'),
+                last=params.get('last') == '1',
+            )
+        except InvalidCursor:
+            return self.page()
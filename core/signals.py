@@ -0,0 +1,68 @@
+"""
+Signal handlers for the core app.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from blog.models import Post
+
+from .cache import bump_version
+from .context_processors import SITE_CACHE_NAME
+from .handlers import HANDLERS_CACHE_NAME
+from .models import Handler
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_changed(sender, **kwargs):
+    bump_version(SITE_CACHE_NAME)
+
+
+# Post fields the handler stats are computed from
+POST_STATS_FIELDS = ('author_id', 'status', 'published_date')
+
+
+@receiver(pre_save, sender=Post)
+def post_stats_inputs(sender, instance, update_fields=None, **kwargs):
+    instance.stats_authors = [instance.author_id]
+    if not instance.pk:
+        return
+    if update_fields is not None and not {'author', 'status', 'published_date'}.intersection(update_fields):
+        instance.stats_authors = []
+        return
+    previous = Post.objects.filter(pk=instance.pk).values_list(*POST_STATS_FIELDS).first()
+    if previous is None:
+        return
+    if previous == tuple(getattr(instance, name) for name in POST_STATS_FIELDS):
+        # Edits to the text, tags or counters leave the stats alone
+        instance.stats_authors = []
+    elif previous[0] != instance.author_id:
+        instance.stats_authors.append(previous[0])
+
+
+@receiver(post_save, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    user_ids = getattr(instance, 'stats_authors', [instance.author_id])
+    if not user_ids:
+        return
+    from .tasks import enqueue_on_commit, refresh_handler_stats
+    enqueue_on_commit(refresh_handler_stats, user_ids)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    from .tasks import enqueue_on_commit, refresh_handler_stats
+    enqueue_on_commit(refresh_handler_stats, [instance.author_id])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=Handler)
+@receiver(post_delete, sender=Handler)
+def handler_changed(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the directory does not show
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version(HANDLERS_CACHE_NAME)
@@ -0,0 +1,35 @@
+"""
+Celery tasks for the core app.
+"""
+import logging
+
+from celery import shared_task
+from django.db import transaction
+from kombu.exceptions import KombuError
+from redis.exceptions import RedisError
+
+from . import handlers
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_on_commit(task, *args, **kwargs):
+    """Queue ``task`` once the current transaction commits.
+    
+    For follow-up work queued by signal handlers: the row is saved by then,
+    so an unreachable broker is logged rather than failing the save (or
+    the admin request). The periodic tasks catch up later.
+    """
+    def send():
+        try:
+            task.delay(*args, **kwargs)
+        except (KombuError, RedisError, OSError):
+            logger.exception('Could not queue %s', task.name)
+    
+    transaction.on_commit(send)
+
+
+@shared_task(ignore_result=True)
+def refresh_handler_stats(user_ids=None):
+    """Recompute handler statistics for some authors, or all of them."""
+    return handlers.refresh(user_ids)
@@ -0,0 +1,101 @@
+"""
+Keyset pagination: walking pages in both directions, the last page, and
+cursors that were tampered with.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from blog.models import Post
+
+from ..pagination import InvalidCursor, KeysetPaginator
+
+
+def token(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='x')
+        now = timezone.now()
+        # Pairs of posts share a date, so the id has to break ties
+        for n in range(7):
+            Post.objects.create(
+                title=f'Post {n}', slug=f'post-{n}', author=author, content='<p>Body</p>',
+                status='published', published_date=now - timedelta(hours=n // 2),
+            )
+        cls.ordered = list(Post.objects.order_by('-published_date', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Post.objects.all(), 3)
+
+    def ids(self, page):
+        return [post.pk for post in page]
+
+    def test_forward_walk_visits_every_row_once(self):
+        page = self.paginator.page()
+        self.assertFalse(page.has_previous())
+        seen = self.ids(page)
+        while page.has_next():
+            page = self.paginator.page(after=page.next_cursor)
+            self.assertTrue(page.has_previous())
+            seen += self.ids(page)
+        self.assertEqual(seen, self.ordered)
+        self.assertIsNone(page.next_cursor)
+
+    def test_backward_walk_from_last_page(self):
+        page = self.paginator.page(last=True)
+        self.assertEqual(self.ids(page), self.ordered[-3:])
+        self.assertFalse(page.has_next())
+        seen = self.ids(page)
+        while page.has_previous():
+            page = self.paginator.page(before=page.previous_cursor)
+            self.assertTrue(page.has_next())
+            seen = self.ids(page) + seen
+        self.assertEqual(seen, self.ordered)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_before_returns_the_preceding_page(self):
+        second = self.paginator.page(after=self.paginator.page().next_cursor)
+        first = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(self.ids(first), self.ordered[:3])
+        self.assertFalse(first.has_previous())
+
+    def test_tampered_cursors(self):
+        post = Post.objects.get(pk=self.ordered[0])
+        for cursor in (
+            'not base64!',
+            token({'published_date': 'x'}),
+            token([post.published_date.isoformat()]),
+            token(['yesterday', post.pk]),
+            token([post.published_date.isoformat(), 'one']),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    self.paginator.page(after=cursor)
+                request = RequestFactory().get('/', {'before': cursor})
+                self.assertEqual(self.ids(self.paginator.get_page(request)), self.ordered[:3])
+
+    def test_get_page_parameters(self):
+        request = RequestFactory().get('/', {'last': '1'})
+        self.assertEqual(self.ids(self.paginator.get_page(request)), self.ordered[-3:])
+
+    def test_count_is_lazy(self):
+        calls = []
+        paginator = KeysetPaginator(Post.objects.all(), 3, count_func=lambda: calls.append(1) or 7)
+        paginator.page()
+        self.assertEqual(calls, [])
+        self.assertEqual((paginator.count, paginator.count), (7, 7))
+        self.assertEqual(calls, [1])
+        self.assertIsNone(self.paginator.count)
+
+    def test_keys_share_one_direction(self):
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Post.objects.all(), 3, keys=('-published_date', 'id'))
@@ -0,0 +1,128 @@
+"""
+Query budget checks: request every view listed in ``QUERY_BUDGETS`` with
+``QUERY_BUDGET_ACTION = 'raise'``, so a view that goes over its budget
+fails the test run instead of logging a warning. The same views must run
+the same number of queries after more rows are added.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import Category, Comment, Post
+from threats.models import IPReputation, PortActivity, ThreatIndicator, ThreatLevel
+
+from ..benchmark import clear_caches, parse_queries
+from ..models import Handler, SiteSettings
+
+
+def seed(prefix, size):
+    """``size`` handlers, categories and tags, with a post for every
+    handler and category, each tagged twice and commented twice, plus IPs,
+    indicators, ports and threat levels. Returns the first post.
+    """
+    # Every post is published in the same month, a few days back, so the
+    # month archive pages through all of them.
+    month = (timezone.localtime() - timedelta(days=3)).replace(day=2, hour=0, minute=0)
+    users = []
+    for n in range(size):
+        user = User.objects.create_user(f'{prefix}-handler-{n}', password='x', is_staff=True)
+        Handler.objects.create(user=user, bio=f'Handler {n}')
+        users.append(user)
+    categories = [
+        Category.objects.create(name=f'{prefix} category {n}', slug=f'{prefix}-category-{n}')
+        for n in range(size)
+    ]
+    tags = ['scanning'] + [f'{prefix}-tag-{n}' for n in range(size)]
+    posts = []
+    for i, user in enumerate(users):
+        for j, category in enumerate(categories):
+            post = Post.objects.create(
+                title=f'Scanning report {prefix} {i}-{j}',
+                slug=f'{prefix}-post-{i}-{j}',
+                author=user,
+                category=category,
+                excerpt='Excerpt',
+                content='<h2>Heading</h2><p>Scanning activity</p>',
+                status='published',
+                published_date=month - timedelta(minutes=i * size + j),
+            )
+            post.tags.add(tags[0], tags[1 + (i + j) % size])
+            for k in range(2):
+                Comment.objects.create(
+                    post=post,
+                    author_name=f'Reader {k}',
+                    author_email='reader@example.com',
+                    content='Thanks',
+                    is_approved=True,
+                )
+            posts.append(post)
+    for n in range(size * 5):
+        IPReputation.objects.create(
+            ip_address=f'192.0.2.{len(prefix) * 40 + n}', reputation='malicious', reports_count=n
+        )
+        ThreatIndicator.objects.create(
+            indicator_type='domain',
+            value=f'{prefix}-{n}.example.com',
+            description='Test indicator',
+            added_by=users[0],
+        )
+        PortActivity.objects.create(port_number=len(prefix) * 1000 + n, scan_count=n)
+    for level in ('low', 'medium', 'high')[:size]:
+        ThreatLevel.objects.create(level=level, description='Test level', updated_by=users[0])
+    return posts[0]
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise', METRICS_ENABLED=True, SERVER_TIMING_HEADER=True)
+class QueryBudgetTests(TestCase):
+    """Every budgeted view stays within its budget, whatever the row count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Created by the first page that reads it otherwise
+        SiteSettings.objects.get_or_create(pk=1)
+        cls.post = seed('a', 4)
+
+    def url_kwargs(self, name):
+        published = self.post.published_date
+        return {
+            'blog:post_detail': {'slug': self.post.slug},
+            'blog:category_posts': {'slug': self.post.category.slug},
+            'blog:tag_posts': {'slug': 'scanning'},
+            'blog:archive_month': {'year': published.year, 'month': published.month},
+            'core:handler_detail': {'username': self.post.author.username},
+        }.get(name, {})
+
+    def query_counts(self):
+        """Request every budgeted view on cold caches; ``{name: queries}``."""
+        counts = {}
+        for name in settings.QUERY_BUDGETS:
+            with self.subTest(view=name):
+                clear_caches()
+                # Django keeps the Site in memory for the life of the process
+                Site.objects.get_current()
+                url = reverse(name, kwargs=self.url_kwargs(name))
+                params = {'q': 'scanning'} if name == 'blog:search' else {}
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                else:
+                    counts[name] = parse_queries(response.get('Server-Timing'))
+                    self.assertIsNotNone(counts[name])
+        return counts
+
+    def test_views_within_budget(self):
+        self.query_counts()
+
+    def test_query_count_independent_of_rows(self):
+        before = self.query_counts()
+        seed('bb', 4)
+        after = self.query_counts()
+        for name, count in before.items():
+            with self.subTest(view=name):
+                self.assertEqual(after[name], count)
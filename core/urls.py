@@ -6,6 +6,8 @@ app_name = 'core'
 urlpatterns = [
     path('', views.home, name='home'),
     path('health/', views.health_check, name='health'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('handlers/', views.handlers, name='handlers'),
+    path('handlers/<str:username>/', views.handler_detail, name='handler_detail'),
     path('about/', views.about, name='about'),
 ]
@@ -1,10 +1,17 @@
-from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render
+from django.http import Http404, JsonResponse, HttpResponse
 from django.views.decorators.cache import never_cache
+from blog.models import POSTS_CACHE_NAME
+from blog.popular import POPULAR_CACHE_NAME
+from . import metrics
+from .handlers import HANDLERS_CACHE_NAME, directory
+from .pagecache import cache_page_versions
+from .pagination import KeysetPaginator
 
 
 @never_cache
-def health_check(request):
+async def health_check(request):
     """Simple health check endpoint that doesn't hit the database."""
     return JsonResponse({
         'status': 'healthy',
@@ -13,6 +20,19 @@ def health_check(request):
     })
 
 
+@never_cache
+def metrics_view(request):
+    """Per-view request metrics in Prometheus text format.
+    
+    Only answers direct requests from METRICS_ALLOWED_IPS; anything that
+    came through a proxy gets a 404.
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed or 'X-Forwarded-For' in request.headers:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @never_cache
 def simple_home(request):
     """Simple homepage without database queries."""
@@ -95,13 +115,16 @@ def simple_home(request):
     return HttpResponse(html)
 
 
+@cache_page_versions(POSTS_CACHE_NAME, POPULAR_CACHE_NAME)
 def home(request):
     """Homepage view."""
     from blog.models import Post
     from threats.models import ThreatLevel
     
     # Get latest posts
-    latest_posts = Post.objects.filter(status='published').order_by('-published_date')[:5]
+    latest_posts = Post.objects.filter(status='published').select_related(
+        'author', 'category'
+    ).defer('content', 'content_html', 'toc', 'search_vector').order_by('-published_date')[:5]
     
     # Get current threat level (most recent)
     try:
@@ -116,18 +139,33 @@ def home(request):
     return render(request, 'core/home.html', context)
 
 
+@cache_page_versions(HANDLERS_CACHE_NAME)
 def handlers(request):
-    """Display list of handlers."""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
+    """Display the handler directory."""
+    context = {
+        'handlers': directory(),
+    }
+    return render(request, 'core/handlers.html', context)
+
+
+@cache_page_versions(HANDLERS_CACHE_NAME, POSTS_CACHE_NAME)
+def handler_detail(request, username):
+    """Handler profile with their published posts, newest first."""
+    from blog.views import POSTS_PER_PAGE, published_posts
     
-    # Get all staff users (handlers)
-    handlers_list = User.objects.filter(is_staff=True, is_active=True).order_by('username')
+    handler = get_object_or_404(directory(), username=username)
+    posts = published_posts().filter(author=handler, published_date__isnull=False)
+    
+    # The total comes from the stats row already joined in by directory()
+    paginator = KeysetPaginator(posts, POSTS_PER_PAGE, count_func=lambda: handler.post_count)
+    page_obj = paginator.get_page(request)
     
     context = {
-        'handlers': handlers_list,
+        'handler': handler,
+        'page_obj': page_obj,
+        'posts': page_obj.object_list,
     }
-    return render(request, 'core/handlers.html', context)
+    return render(request, 'core/handler_detail.html', context)
 
 
 def about(request):
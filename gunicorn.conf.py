@@ -1,15 +1,27 @@
 # Gunicorn configuration file
 
 import multiprocessing
+import os
 import sys
 
 # Server socket
 bind = '0.0.0.0:8000'
 backlog = 2048
 
+# Serving mode: 'wsgi' runs isc_project.wsgi on sync workers; 'asgi' runs
+# isc_project.asgi on uvicorn workers, where async views (feeds, blog
+# listings, InfoCon/health APIs) share one event loop per worker instead of
+# tying up a whole worker per request.
+server_mode = os.environ.get('GUNICORN_SERVER_MODE', 'wsgi')
+if server_mode == 'asgi':
+    wsgi_app = 'isc_project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'isc_project.wsgi:application'
+    worker_class = 'sync'
+
 # Worker processes - reduced for initial stability
-workers = 2
-worker_class = 'sync'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
 worker_connections = 1000
 timeout = 300  # 5 minutes - very generous for debugging
 graceful_timeout = 60
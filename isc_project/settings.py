@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     
     # Third party apps
     'ckeditor',
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,7 +54,8 @@ ROOT_URLCONF = 'isc_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timed for the request metrics (core.metrics)
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -131,6 +134,64 @@ ISSN_L = os.environ.get('ISSN_L', '')
 PUBLISHER_NAME = os.environ.get('PUBLISHER_NAME', 'ISC Clone')
 PUBLISHER_COUNTRY = os.environ.get('PUBLISHER_COUNTRY', 'US')
 
+# View counters
+# 'sync' writes every post view straight to the database; 'buffered' collects
+# increments in Redis (or in-process) and flushes them from Celery beat.
+VIEW_COUNTER_MODE = os.environ.get('VIEW_COUNTER_MODE', 'buffered')
+VIEW_COUNTER_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', '30'))
+VIEW_COUNTER_BATCH_SIZE = 500
+
+# Seconds between checks for IPReputation changes made by other processes
+IP_INDEX_REFRESH_INTERVAL = int(os.environ.get('IP_INDEX_REFRESH_INTERVAL', '5'))
+
+# Seconds between incremental refreshes of the ThreatLevel rollups
+THREAT_ROLLUP_INTERVAL = 300
+
+# Port activity time series (threats.portlogs/porttrends): bucket size and
+# retention, and trending = hits in the last PORT_TREND_WINDOW seconds vs
+# the rate over the PORT_TREND_BASELINE seconds before, recomputed every
+# PORT_TREND_INTERVAL seconds
+PORT_BUCKET_SECONDS = 300
+PORT_BUCKET_RETENTION_DAYS = int(os.environ.get('PORT_BUCKET_RETENTION_DAYS', '30'))
+PORT_TREND_WINDOW = 60 * 60
+PORT_TREND_BASELINE = 60 * 60 * 24
+PORT_TREND_INTERVAL = 300
+PORT_TREND_LIMIT = 20
+
+# Bulk exports (threats.exports): rows fetched per server-side cursor round
+# trip, where the gzip snapshots are written, and seconds between checks for
+# changed datasets
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_ROOT = Path(os.environ.get('EXPORT_ROOT', MEDIA_ROOT / 'exports'))
+EXPORT_SNAPSHOT_INTERVAL = 300
+
+# Blog listing pagination: 'offset' (numbered pages) or 'keyset' (cursors on
+# published_date/id; constant cost per page however deep)
+BLOG_PAGINATION = os.environ.get('BLOG_PAGINATION', 'offset')
+
+# Text search configuration used for the post search index
+SEARCH_CONFIG = 'english'
+
+# Number of related posts precomputed and shown per post
+RELATED_POSTS_LIMIT = 3
+
+# Post body rendering (blog.rendering): reading speed behind the reading
+# time, widths of the resized copies made of uploaded images, and the
+# matching `sizes` attribute (the content column is at most ~1150px wide)
+POST_READING_WPM = 230
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_SIZES = '(max-width: 1200px) 100vw, 1150px'
+
+# Popular posts widgets (blog.popular): entries per list, half-life of the
+# "trending" score in seconds, and seconds between leaderboard refreshes
+POPULAR_POSTS_LIMIT = 5
+POPULAR_TRENDING_HALF_LIFE = 60 * 60 * 24 * 2
+POPULAR_POSTS_INTERVAL = 300
+
+# Seconds between full rebuilds of the handler directory statistics
+# (core.handlers); an author's row is also refreshed when their posts change
+HANDLER_STATS_INTERVAL = 60 * 15
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
@@ -138,6 +199,40 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'flush-post-views': {
+        'task': 'blog.tasks.flush_post_views',
+        'schedule': VIEW_COUNTER_FLUSH_INTERVAL,
+    },
+    'recompute-related-posts': {
+        'task': 'blog.tasks.recompute_related_posts',
+        'schedule': 60 * 60 * 24,
+    },
+    'rollup-threat-levels': {
+        'task': 'threats.tasks.rollup_threat_levels',
+        'schedule': THREAT_ROLLUP_INTERVAL,
+    },
+    'refresh-port-trends': {
+        'task': 'threats.tasks.refresh_port_trends',
+        'schedule': PORT_TREND_INTERVAL,
+    },
+    'prune-port-buckets': {
+        'task': 'threats.tasks.prune_port_buckets',
+        'schedule': 60 * 60,
+    },
+    'build-export-snapshots': {
+        'task': 'threats.tasks.build_export_snapshots',
+        'schedule': EXPORT_SNAPSHOT_INTERVAL,
+    },
+    'refresh-popular-posts': {
+        'task': 'blog.tasks.refresh_popular_posts',
+        'schedule': POPULAR_POSTS_INTERVAL,
+    },
+    'refresh-handler-stats': {
+        'task': 'core.tasks.refresh_handler_stats',
+        'schedule': HANDLER_STATS_INTERVAL,
+    },
+}
 
 # Cache
 CACHES = {
@@ -147,6 +242,66 @@ CACHES = {
     }
 }
 
+# Seconds a process trusts its in-memory copy of a cached value before
+# re-checking the shared version in Redis (see core.cache)
+CACHE_VERSION_CHECK_INTERVAL = 2
+
+# Upper bound on how long a rendered RSS/Atom feed is kept; content changes
+# invalidate it earlier through its versioned key
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Anonymous page cache (core.pagecache): pages are invalidated by content
+# versions; the timeout only bounds how long an unused page is kept. The
+# lock timeout bounds how long stale copies are served while one worker
+# rebuilds a page
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# InfoCon Server-Sent Events stream (threats.infocon): reconnect delay sent
+# to clients in milliseconds, and seconds between keepalive comments
+INFOCON_STREAM_RETRY = 5000
+INFOCON_STREAM_HEARTBEAT = 15
+
+# Request instrumentation (core.metrics): Server-Timing headers and
+# per-view totals, scraped in Prometheus format from /metrics/ by the
+# listed addresses (direct requests only, not through the proxy)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_FLUSH_INTERVAL = 10
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+SERVER_TIMING_HEADER = True
+
+# Most queries a view may run, by URL name. 'log' warns about views over
+# budget; 'raise' fails the request, which is what CI and tests want
+# (core/tests/test_query_budgets.py requests every view listed here, with
+# two data set sizes). Streaming bodies count
+# towards the budget once fully sent; transaction control (BEGIN, COMMIT,
+# savepoints) is not counted
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGETS = {
+    'core:home': 6,
+    'core:handlers': 3,
+    'core:handler_detail': 5,
+    'core:about': 2,
+    'blog:post_list': 5,
+    'blog:post_detail': 5,
+    'blog:archive': 3,
+    'blog:archive_month': 5,
+    'blog:category_posts': 6,
+    'blog:tag_posts': 6,
+    'blog:tag_counts': 3,
+    'blog:search': 4,
+    'blog:rss_feed': 7,
+    'blog:atom_feed': 7,
+    'threats:dashboard': 5,
+    'threats:ports': 4,
+    'threats:ips': 3,
+    'threats:indicators': 3,
+    'threats:ip_list_api': 3,
+    'threats:indicator_list_api': 3,
+    'threats:threat_level_history': 3,
+}
+QUERY_BUDGET_ACTION = os.environ.get('QUERY_BUDGET_ACTION', 'log')
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Small closed-loop HTTP load generator for comparing serving modes.
+
+Start the app in one mode, run this against it, then repeat with the other:
+
+    GUNICORN_SERVER_MODE=wsgi gunicorn --config gunicorn.conf.py
+    python scripts/loadtest.py http://127.0.0.1:8000 --concurrency 32 --duration 20
+
+    GUNICORN_SERVER_MODE=asgi gunicorn --config gunicorn.conf.py
+    python scripts/loadtest.py http://127.0.0.1:8000 --concurrency 32 --duration 20
+
+Each client keeps one connection open and requests the paths round-robin.
+Prints throughput, error count and latency percentiles per path as JSON.
+Only the standard library is used so it runs outside the app's virtualenv.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    '/health/',
+    '/threats/infocon/',
+    '/blog/',
+    '/blog/feed/rss/',
+    '/blog/feed/atom/',
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def client(base, paths, deadline, offset, results, errors, lock):
+    parts = urlsplit(base)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(parts.hostname, parts.port, timeout=30)
+    prefix = parts.path.rstrip('/')
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', prefix + path, headers={'Host': parts.netloc})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        if ok:
+            latencies[path].append(time.perf_counter() - start)
+        else:
+            failures[path] += 1
+    connection.close()
+    with lock:
+        for path, values in latencies.items():
+            results[path].extend(values)
+        for path, count in failures.items():
+            errors[path] += count
+
+
+def run(base, paths, concurrency, duration):
+    results = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(base, paths, deadline, n, results, errors, lock))
+        for n in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    report = {'url': base, 'concurrency': concurrency, 'duration': round(elapsed, 2), 'paths': {}}
+    total = 0
+    for path in paths:
+        values = sorted(results[path])
+        total += len(values)
+        report['paths'][path] = {
+            'requests': len(values),
+            'errors': errors[path],
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2) if values else None,
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2) if values else None,
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2) if values else None,
+        }
+    report['rps'] = round(total / elapsed, 1)
+    report['errors'] = sum(errors.values())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('url', help='Base URL of the running server')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable)')
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.paths or DEFAULT_PATHS, args.concurrency, args.duration), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import ThreatLevel, PortActivity, IPReputation, ThreatIndicator
+from django.contrib import admin, messages
+from django.db.models import Q
+from .ipindex import covered_hosts
+from .models import ThreatLevel, PortActivity, IPReputation, IPNetwork, ThreatIndicator
+from .normalize import canonical, value_digest
 
 
 @admin.register(ThreatLevel)
@@ -35,6 +38,21 @@ class IPReputationAdmin(admin.ModelAdmin):
     list_filter = ('reputation', 'country', 'last_seen')
     search_fields = ('ip_address', 'description', 'tags')
     ordering = ('-reports_count', '-last_seen')
+    actions = ['delete_covered_hosts']
+    
+    @admin.action(description='Delete hosts already covered by a network with the same reputation')
+    def delete_covered_hosts(self, request, queryset):
+        redundant = covered_hosts(queryset)
+        deleted, _ = IPReputation.objects.filter(pk__in=redundant).delete()
+        self.message_user(request, f'Deleted {deleted} host entries covered by IP networks.', messages.SUCCESS)
+
+
+@admin.register(IPNetwork)
+class IPNetworkAdmin(admin.ModelAdmin):
+    list_display = ('network', 'reputation', 'country', 'asn', 'reports_count', 'last_seen')
+    list_filter = ('reputation', 'country', 'last_seen')
+    search_fields = ('network', 'description', 'tags')
+    ordering = ('-reports_count', '-last_seen')
 
 
 @admin.register(ThreatIndicator)
@@ -49,6 +67,20 @@ class ThreatIndicatorAdmin(admin.ModelAdmin):
         return obj.value[:50] + '...' if len(obj.value) > 50 else obj.value
     value_short.short_description = 'Value'
     
+    def get_search_results(self, request, queryset, search_term):
+        # A term that is a complete indicator is looked up by digest, one
+        # unique-index probe per type; anything else falls back to
+        # substring search.
+        if search_term.strip():
+            exact = Q()
+            for indicator_type, _ in ThreatIndicator.IOC_TYPES:
+                digest = value_digest(canonical(indicator_type, search_term))
+                exact |= Q(indicator_type=indicator_type, digest=digest)
+            matches = queryset.filter(exact)
+            if matches.exists():
+                return matches, False
+        return super().get_search_results(request, queryset, search_term)
+    
     def save_model(self, request, obj, form, change):
         if not change:
             obj.added_by = request.user
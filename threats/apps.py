@@ -5,3 +5,6 @@ class ThreatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'threats'
     verbose_name = 'Threat Intelligence'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,366 @@
+"""
+Bulk export of threat indicators and IP blocklists.
+
+``export`` yields a dataset as text chunks in one of ``FORMATS``: plain
+blocklists (one value per line), CSV, JSONL or a STIX 2.1 bundle. Rows are
+read through a server-side cursor (``.iterator(chunk_size=...)``) and
+written as they arrive, so memory use does not grow with the export.
+``aexport`` serves the same chunks to ASGI responses, one thread hop per
+chunk, instead of Django buffering a sync stream into a list.
+
+A full export lists what a consumer should block: active indicators, and
+IPs whose reputation is malicious or blocked. A delta (``since``) also
+returns rows that dropped off the list since then, with their current
+reputation or ``is_active`` flag (STIX marks them ``revoked``), so
+consumers can remove them. Plain blocklists only carry listed values.
+Deleted rows are not tracked; consumers that need them should re-fetch the
+full export now and then.
+
+``build_snapshots`` writes every full export gzip-compressed under
+``EXPORT_ROOT``. Only datasets that changed since the last build are
+written again. It runs from Celery beat, so the large downloads are static
+files.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timezone as dt_timezone
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import IPReputation, ThreatIndicator
+
+FORMATS = ('txt', 'csv', 'jsonl', 'stix')
+
+EXTENSIONS = {'txt': 'txt', 'csv': 'csv', 'jsonl': 'jsonl', 'stix': 'json'}
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'stix': 'application/stix+json;version=2.1',
+}
+
+LISTED_REPUTATIONS = ('malicious', 'blocked')
+
+MANIFEST_NAME = 'manifest.json'
+
+# Stable namespace for STIX ids, so an object keeps its id across exports.
+STIX_NAMESPACE = uuid.UUID('6f1d0c6e-4d5b-4a0e-9a51-2c5e2b7f3c10')
+
+STIX_TYPES = {
+    'domain': 'domain-name',
+    'url': 'url',
+    'email': 'email-addr',
+}
+
+HASH_ALGORITHMS = {32: 'MD5', 40: 'SHA-1', 64: 'SHA-256', 128: 'SHA-512'}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    model: type
+    fields: tuple
+    # Column written to plain blocklists
+    value_field: str
+    # auto_now column that delta exports filter on
+    changed_field: str
+
+
+DATASETS = {
+    'indicators': Dataset(
+        ThreatIndicator,
+        fields=('id', 'indicator_type', 'value', 'severity', 'source', 'description',
+                'is_active', 'added_date', 'updated_date'),
+        value_field='value',
+        changed_field='updated_date',
+    ),
+    'ips': Dataset(
+        IPReputation,
+        fields=('ip_address', 'reputation', 'country', 'asn', 'reports_count', 'first_seen', 'last_seen'),
+        value_field='ip_address',
+        changed_field='last_seen',
+    ),
+}
+
+
+def get_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def get_root():
+    return Path(getattr(settings, 'EXPORT_ROOT', Path(settings.MEDIA_ROOT) / 'exports'))
+
+
+def parse_moment(value):
+    """Parse an ISO date or datetime (``since``); naive values are UTC."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+
+def filename(dataset, fmt):
+    return f'{dataset}.{EXTENSIONS[fmt]}'
+
+
+# Querying --------------------------------------------------------------
+
+def _listed(dataset):
+    if dataset == 'ips':
+        return {'reputation__in': LISTED_REPUTATIONS}
+    return {'is_active': True}
+
+
+def records(dataset, since=None, indicator_type=None, listed_only=False, chunk_size=None):
+    """Yield the rows of ``dataset`` as dicts, in primary key order."""
+    spec = DATASETS[dataset]
+    rows = spec.model.objects.all()
+    if since is not None:
+        rows = rows.filter(**{f'{spec.changed_field}__gte': since})
+    if since is None or listed_only:
+        rows = rows.filter(**_listed(dataset))
+    if indicator_type and dataset == 'indicators':
+        rows = rows.filter(indicator_type=indicator_type)
+    fields = ('pk',) + tuple(name for name in spec.fields if name != 'id')
+    for row in rows.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size or get_chunk_size()):
+        record = dict(zip(fields, row))
+        record['id'] = record.pop('pk')
+        yield record
+
+
+# Formats ---------------------------------------------------------------
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def write_txt(dataset, rows):
+    spec = DATASETS[dataset]
+    yield f'# {dataset} blocklist generated {timezone.now().isoformat()}\n'
+    for row in rows:
+        yield f'{row[spec.value_field]}\n'
+
+
+def write_csv(dataset, rows):
+    fields = DATASETS[dataset].fields
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_plain(row[name]) for name in fields])
+
+
+def write_jsonl(dataset, rows):
+    fields = DATASETS[dataset].fields
+    for row in rows:
+        yield json.dumps({name: row[name] for name in fields}, cls=DjangoJSONEncoder) + '\n'
+
+
+def _stix_time(moment):
+    return moment.astimezone(dt_timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _stix_pattern(indicator_type, value):
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    if indicator_type == 'ip':
+        return f"[{'ipv6-addr' if ':' in value else 'ipv4-addr'}:value = '{escaped}']"
+    if indicator_type == 'hash':
+        algorithm = HASH_ALGORITHMS.get(len(value))
+        return f"[file:hashes.'{algorithm}' = '{escaped}']" if algorithm else None
+    if indicator_type in STIX_TYPES:
+        return f"[{STIX_TYPES[indicator_type]}:value = '{escaped}']"
+    return None
+
+
+def stix_object(dataset, row):
+    """STIX 2.1 object for one row, or None if it has no STIX form."""
+    if dataset == 'ips':
+        indicator_type, value = 'ip', row['ip_address']
+        label, revoked = row['reputation'], row['reputation'] not in LISTED_REPUTATIONS
+        created, modified = row['first_seen'], row['last_seen']
+        description = ''
+    else:
+        indicator_type, value = row['indicator_type'], row['value']
+        label, revoked = row['severity'], not row['is_active']
+        created, modified = row['added_date'], row['updated_date']
+        description = row['description']
+
+    stix_id = uuid.uuid5(STIX_NAMESPACE, f'{dataset}:{row["id"]}')
+    common = {
+        'spec_version': '2.1',
+        'created': _stix_time(created),
+        'modified': _stix_time(modified),
+    }
+    if indicator_type == 'cve':
+        return {
+            'type': 'vulnerability',
+            'id': f'vulnerability--{stix_id}',
+            **common,
+            'name': value,
+            'description': description,
+            'external_references': [{'source_name': 'cve', 'external_id': value}],
+        }
+    pattern = _stix_pattern(indicator_type, value)
+    if pattern is None:
+        return None
+    obj = {
+        'type': 'indicator',
+        'id': f'indicator--{stix_id}',
+        **common,
+        'name': value,
+        'pattern': pattern,
+        'pattern_type': 'stix',
+        'valid_from': common['created'],
+        'labels': [label],
+        'revoked': revoked,
+    }
+    if description:
+        obj['description'] = description
+    return obj
+
+
+def write_stix(dataset, rows):
+    yield '{"type": "bundle", "id": "bundle--%s", "objects": [' % uuid.uuid4()
+    separator = ''
+    for row in rows:
+        obj = stix_object(dataset, row)
+        if obj is not None:
+            yield separator + json.dumps(obj)
+            separator = ','
+    yield ']}\n'
+
+
+WRITERS = {
+    'txt': write_txt,
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'stix': write_stix,
+}
+
+
+def _joined(pieces, size):
+    """Group small string pieces so each response chunk carries ``size`` rows."""
+    batch = []
+    for piece in pieces:
+        batch.append(piece)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def export(dataset, fmt, since=None, indicator_type=None, chunk_size=None):
+    """Yield ``dataset`` in ``fmt`` as text chunks; see the module docstring."""
+    chunk_size = chunk_size or get_chunk_size()
+    rows = records(
+        dataset,
+        since=since,
+        indicator_type=indicator_type,
+        listed_only=fmt == 'txt',
+        chunk_size=chunk_size,
+    )
+    return _joined(WRITERS[fmt](dataset, rows), chunk_size)
+
+
+async def aexport(dataset, fmt, since=None, indicator_type=None, chunk_size=None):
+    """Async iterator over ``export``, for streaming responses under ASGI.
+    
+    Each chunk is produced by ``sync_to_async`` on the thread-sensitive
+    executor, so the server-side cursor stays on its connection's thread.
+    """
+    chunks = export(dataset, fmt, since=since, indicator_type=indicator_type, chunk_size=chunk_size)
+    advance = sync_to_async(next)
+    try:
+        # StopIteration cannot cross sync_to_async: use a sentinel.
+        while (chunk := await advance(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+# Snapshots -------------------------------------------------------------
+
+def snapshot_path(dataset, fmt):
+    return get_root() / f'{filename(dataset, fmt)}.gz'
+
+
+def read_manifest():
+    try:
+        with open(get_root() / MANIFEST_NAME) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {'datasets': {}}
+
+
+def _write_atomic(path, chunks, compress):
+    tmp = path.with_name(path.name + '.tmp')
+    opener = gzip.open if compress else open
+    with opener(tmp, 'wt', encoding='utf-8') as fp:
+        for chunk in chunks:
+            fp.write(chunk)
+    os.replace(tmp, path)
+
+
+def stamp(dataset):
+    """Cheap fingerprint of a dataset: row count, highest id, latest change."""
+    spec = DATASETS[dataset]
+    result = spec.model.objects.aggregate(
+        rows=Count('pk'), last_id=Max('pk'), changed=Max(spec.changed_field)
+    )
+    return [result['rows'], result['last_id'], _plain(result['changed'])]
+
+
+def build_snapshots(force=False):
+    """Rewrite the snapshots of every dataset that changed; return their names."""
+    root = get_root()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest()
+    built = []
+    for dataset in DATASETS:
+        current = stamp(dataset)
+        entry = manifest['datasets'].get(dataset)
+        if not force and entry and entry['stamp'] == current:
+            continue
+        generated_at = timezone.now().isoformat()
+        for fmt in FORMATS:
+            _write_atomic(snapshot_path(dataset, fmt), export(dataset, fmt), compress=True)
+        manifest['datasets'][dataset] = {
+            'stamp': current,
+            'generated_at': generated_at,
+            'etag': '"%s"' % hashlib.md5(f'{dataset}:{generated_at}'.encode()).hexdigest(),
+        }
+        built.append(dataset)
+    if built:
+        _write_atomic(root / MANIFEST_NAME, [json.dumps(manifest, indent=2)], compress=False)
+    return built
+
+
+def get_snapshot(dataset, fmt):
+    """Return ``(path, manifest entry)`` of a snapshot, or None if not built."""
+    entry = read_manifest()['datasets'].get(dataset)
+    path = snapshot_path(dataset, fmt)
+    if entry is None or not path.exists():
+        return None
+    return path, entry
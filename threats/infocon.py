@@ -0,0 +1,158 @@
+"""
+Precomputed InfoCon status.
+
+The JSON body served by ``/threats/infocon/`` and its ETag are built once
+when a ``ThreatLevel`` is saved or deleted, and kept in the two-level cache
+(see ``core.cache``). Serving the status is then a dictionary lookup, and
+pollers that send ``If-None-Match`` get 304s.
+
+``stream`` produces Server-Sent Events. Each process runs one watcher
+coroutine per event loop. It re-reads the shared status every
+``CACHE_VERSION_CHECK_INTERVAL`` seconds and wakes every connected client
+when the status changes. An idle watcher therefore costs an open socket and
+a suspended coroutine, not a query or a worker.
+"""
+import asyncio
+import hashlib
+import json
+import weakref
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.cache import bump_version, cached, peek
+
+from .models import ThreatLevel
+
+STATUS_CACHE_NAME = 'threats:infocon'
+
+
+@dataclass(frozen=True)
+class Status:
+    level: str
+    body: bytes
+    etag: str
+
+    @property
+    def event_id(self):
+        return self.etag.strip('"')
+
+
+def build():
+    current = ThreatLevel.objects.first()
+    if current:
+        data = {
+            'status': current.level,
+            'recorded_date': current.recorded_date.isoformat(),
+            'description': current.description,
+        }
+    else:
+        data = {
+            'status': 'low',
+            'description': 'Normal activity',
+        }
+    body = json.dumps(data).encode()
+    return Status(data['status'], body, '"%s"' % hashlib.md5(body).hexdigest())
+
+
+def get_status():
+    return cached(STATUS_CACHE_NAME, build)
+
+
+async def aget_status():
+    status = peek(STATUS_CACHE_NAME)
+    if status is None:
+        status = await sync_to_async(get_status)()
+    return status
+
+
+def publish():
+    """Rebuild the shared status after a ThreatLevel change."""
+    bump_version(STATUS_CACHE_NAME)
+    get_status()
+
+
+def get_retry():
+    """Milliseconds SSE clients wait before reconnecting."""
+    return getattr(settings, 'INFOCON_STREAM_RETRY', 5000)
+
+
+def get_heartbeat():
+    return getattr(settings, 'INFOCON_STREAM_HEARTBEAT', 15)
+
+
+def format_event(status):
+    return f'id: {status.event_id}\nevent: infocon\ndata: {status.body.decode()}\n\n'
+
+
+class Watcher:
+    """Fans status changes out to the stream clients of one event loop."""
+
+    def __init__(self):
+        self.clients = 0
+        self.status = None
+        self.changed = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.status = None
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        interval = getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 2)
+        while self.clients:
+            status = await aget_status()
+            if self.status is None or status.etag != self.status.etag:
+                self.status = status
+                changed, self.changed = self.changed, asyncio.Event()
+                changed.set()
+            await asyncio.sleep(interval)
+
+
+_watchers = weakref.WeakKeyDictionary()
+
+
+def get_watcher():
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = Watcher()
+    return watcher
+
+
+async def stream(last_event_id=None):
+    """Yield the current status, then one event per change, until cancelled.
+
+    Nothing is sent at first if ``last_event_id`` (from the client's
+    ``Last-Event-ID`` header) is already current.
+    """
+    watcher = get_watcher()
+    watcher.clients += 1
+    watcher.start()
+    heartbeat = get_heartbeat()
+    try:
+        yield f'retry: {get_retry()}\n\n'
+        while True:
+            changed = watcher.changed
+            status = watcher.status or await aget_status()
+            if status.event_id != last_event_id:
+                last_event_id = status.event_id
+                yield format_event(status)
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+    finally:
+        watcher.clients -= 1
+
+
+async def snapshot(last_event_id=None):
+    """Single-response stream for servers that cannot hold connections open."""
+    status = await aget_status()
+    events = f'retry: {get_retry()}\n\n'
+    if status.event_id != last_event_id:
+        events += format_event(status)
+    return events
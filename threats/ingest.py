@@ -0,0 +1,345 @@
+"""
+Bulk ingestion of threat indicators (IoCs) from feed files.
+
+Feeds are streamed through a generator pipeline::
+
+    parse (CSV / JSONL / STIX bundle) -> normalise -> chunk -> write
+
+Each chunk is deduplicated in memory and against existing rows, then
+written with one ``bulk_create`` and one ``bulk_update``, so memory use is
+bounded by the chunk size rather than the size of the feed. Progress is
+checkpointed after every chunk so an interrupted import can be resumed.
+"""
+import csv
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ThreatIndicator
+from .normalize import normalize_value, value_digest
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl', 'stix')
+
+TYPE_ALIASES = {
+    'ip': 'ip', 'ipv4': 'ip', 'ipv6': 'ip', 'ip-src': 'ip', 'ip-dst': 'ip',
+    'ipv4-addr': 'ip', 'ipv6-addr': 'ip',
+    'domain': 'domain', 'hostname': 'domain', 'fqdn': 'domain', 'domain-name': 'domain',
+    'url': 'url', 'uri': 'url',
+    'hash': 'hash', 'md5': 'hash', 'sha1': 'hash', 'sha256': 'hash', 'sha512': 'hash',
+    'filehash': 'hash', 'file': 'hash',
+    'email': 'email', 'email-addr': 'email', 'email-src': 'email',
+    'cve': 'cve', 'vulnerability': 'cve',
+}
+
+SEVERITIES = {choice for choice, _ in ThreatIndicator.SEVERITY_CHOICES}
+
+# Matches the comparison expressions of simple STIX 2.x patterns, e.g.
+# [ipv4-addr:value = '198.51.100.1'] or [file:hashes.'SHA-256' = '...'].
+STIX_PATTERN_RE = re.compile(r"([a-z0-9-]+):([\w.'-]+)\s*=\s*'((?:[^'\\]|\\.)*)'")
+
+
+class IngestError(ValueError):
+    """Raised for feed files that cannot be parsed."""
+
+
+@dataclass
+class IngestStats:
+    read: int = 0
+    skipped: int = 0
+    created: int = 0
+    updated: int = 0
+    invalid: int = 0
+    resumed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return (self.read - self.resumed) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'read': self.read,
+            'skipped': self.skipped,
+            'created': self.created,
+            'updated': self.updated,
+            'invalid': self.invalid,
+            'seconds': round(self.elapsed, 2),
+            'rows_per_sec': round(self.rate, 1),
+        }
+
+
+# Parsers ---------------------------------------------------------------
+
+def parse_csv(fp):
+    """Yield raw records from a CSV file with a header row."""
+    for row in csv.DictReader(fp):
+        yield row
+
+
+def parse_jsonl(fp):
+    """Yield raw records from a file with one JSON object per line."""
+    for lineno, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise IngestError(f'Invalid JSON on line {lineno}: {exc}') from exc
+
+
+def parse_stix(fp, chunk_size=65536):
+    """Yield raw records from the ``objects`` array of a STIX 2.x bundle.
+
+    The bundle is decoded incrementally so that very large bundles never
+    have to be loaded into memory in one piece.
+    """
+    for obj in _iter_json_array(fp, 'objects', chunk_size):
+        yield from _stix_records(obj)
+
+
+def _iter_json_array(fp, key, chunk_size):
+    decoder = json.JSONDecoder()
+    buf = ''
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+
+    # Seek to the opening bracket of the array.
+    while True:
+        match = marker.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        data = fp.read(chunk_size)
+        if not data:
+            raise IngestError(f'No "{key}" array found in STIX bundle')
+        # Keep a tail in case the marker spans two reads.
+        buf = buf[-len(key) - 8:] + data
+
+    while True:
+        buf = buf.lstrip().lstrip(',').lstrip()
+        if buf.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            data = fp.read(chunk_size)
+            if not data:
+                raise IngestError('Truncated STIX bundle')
+            buf += data
+            continue
+        yield obj
+        buf = buf[end:]
+
+
+def _stix_records(obj):
+    if obj.get('type') == 'vulnerability' and obj.get('name', '').upper().startswith('CVE-'):
+        yield {
+            'indicator_type': 'cve',
+            'value': obj['name'],
+            'description': obj.get('description', ''),
+        }
+        return
+    if obj.get('type') != 'indicator' or obj.get('pattern_type', 'stix') != 'stix':
+        return
+    for obj_type, prop, value in STIX_PATTERN_RE.findall(obj.get('pattern', '')):
+        if obj_type == 'file' and not prop.startswith('hashes'):
+            continue
+        yield {
+            'indicator_type': obj_type,
+            'value': value.replace("\\'", "'"),
+            'description': obj.get('description') or obj.get('name', ''),
+            'severity': _stix_severity(obj),
+            'is_active': not obj.get('revoked', False),
+        }
+
+
+def _stix_severity(obj):
+    for label in obj.get('labels', []):
+        if label.lower() in SEVERITIES:
+            return label.lower()
+    confidence = obj.get('confidence')
+    if confidence is None:
+        return None
+    if confidence >= 85:
+        return 'high'
+    if confidence >= 50:
+        return 'medium'
+    return 'low'
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'jsonl': parse_jsonl,
+    'stix': parse_stix,
+}
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith(('.json', '.stix')):
+        return 'stix'
+    raise IngestError(f'Cannot detect feed format of {path}; pass it explicitly')
+
+
+# Normalisation ---------------------------------------------------------
+
+def normalize_type(indicator_type):
+    """Map a feed's indicator type name onto ``ThreatIndicator.IOC_TYPES``."""
+    return TYPE_ALIASES.get((indicator_type or '').strip().lower())
+
+
+def normalize(records, stats, default_source='', default_severity='medium'):
+    """Turn raw feed records into clean field dicts, counting bad rows."""
+    for record in records:
+        stats.read += 1
+        indicator_type = normalize_type(record.get('indicator_type') or record.get('type'))
+        try:
+            value = normalize_value(indicator_type, record.get('value'))
+        except ValueError:
+            stats.invalid += 1
+            continue
+        severity = (record.get('severity') or default_severity).lower()
+        if severity not in SEVERITIES:
+            severity = default_severity
+        is_active = record.get('is_active', True)
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower() not in ('0', 'false', 'no', '')
+        yield {
+            'indicator_type': indicator_type,
+            'value': value,
+            'digest': value_digest(value),
+            'description': record.get('description') or '',
+            'severity': severity,
+            'source': (record.get('source') or default_source)[:200],
+            'is_active': bool(is_active),
+        }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Writing ---------------------------------------------------------------
+
+UPDATE_FIELDS = ['description', 'severity', 'source', 'is_active', 'updated_date']
+
+
+def write_chunk(rows, stats, added_by=None):
+    """Upsert one chunk of normalised rows."""
+    # Later rows in a feed win over earlier duplicates.
+    unique = {}
+    for row in rows:
+        unique[(row['indicator_type'], row['digest'])] = row
+
+    by_type = {}
+    for indicator_type, digest in unique:
+        by_type.setdefault(indicator_type, []).append(digest)
+
+    # Served by the unique index on (indicator_type, digest).
+    existing = {}
+    for indicator_type, digests in by_type.items():
+        for obj in ThreatIndicator.objects.filter(indicator_type=indicator_type, digest__in=digests):
+            existing[(obj.indicator_type, obj.digest)] = obj
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for key, row in unique.items():
+        obj = existing.get(key)
+        if obj is None:
+            to_create.append(ThreatIndicator(added_by=added_by, **row))
+            continue
+        row['description'] = row['description'] or obj.description
+        row['source'] = row['source'] or obj.source
+        if any(getattr(obj, name) != row[name] for name in UPDATE_FIELDS[:-1]):
+            for name in UPDATE_FIELDS[:-1]:
+                setattr(obj, name, row[name])
+            obj.updated_date = now
+            to_update.append(obj)
+
+    with transaction.atomic():
+        # A concurrent import may have created the same indicator since
+        # the lookup above; the unique index turns that into a no-op.
+        ThreatIndicator.objects.bulk_create(to_create, ignore_conflicts=True)
+        ThreatIndicator.objects.bulk_update(to_update, UPDATE_FIELDS)
+    stats.skipped += len(rows) - len(to_create) - len(to_update)
+    stats.created += len(to_create)
+    stats.updated += len(to_update)
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp).get('records', 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_checkpoint(path, records):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump({'records': records}, fp)
+    os.replace(tmp, path)
+
+
+def import_indicators(path, fmt=None, source='', severity='medium', added_by=None,
+                      chunk_size=5000, resume=False, checkpoint=None, progress=None):
+    """Import a feed file into ``ThreatIndicator``.
+
+    ``progress`` is called with the running :class:`IngestStats` after each
+    chunk. With ``resume=True`` records already covered by the checkpoint
+    file are skipped; the checkpoint is removed once the import completes.
+    """
+    if chunk_size < 1:
+        raise IngestError('chunk_size must be at least 1')
+    fmt = fmt or detect_format(path)
+    if fmt not in PARSERS:
+        raise IngestError(f'Unsupported format {fmt!r}; expected one of {", ".join(FORMATS)}')
+    checkpoint = checkpoint or f'{path}.checkpoint'
+    done = _read_checkpoint(checkpoint) if resume else 0
+
+    stats = IngestStats()
+    opener = open
+    if path.endswith('.gz'):
+        import gzip
+        opener = gzip.open
+
+    with opener(path, 'rt', encoding='utf-8', newline='') as fp:
+        records = PARSERS[fmt](fp)
+        if done:
+            logger.info('Resuming %s after %d records', path, done)
+            records = islice(records, done, None)
+            stats.read = stats.resumed = done
+        for rows in chunked(normalize(records, stats, source, severity), chunk_size):
+            write_chunk(rows, stats, added_by=added_by)
+            _write_checkpoint(checkpoint, stats.read)
+            if progress:
+                progress(stats)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logger.info('Imported %s: %s', path, stats.as_dict())
+    return stats
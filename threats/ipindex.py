@@ -0,0 +1,373 @@
+"""
+In-process IP reputation index.
+
+Every worker keeps the ``IPReputation`` table in sorted integer arrays (one
+per address family) with compact parallel arrays for the fields the lookup
+API returns, so a lookup is a binary search instead of a database round
+trip.
+
+``IPNetwork`` ranges are held in one hash table per prefix length. A
+longest-prefix match masks the address once per prefix length that is
+actually in use (a handful in practice) and probes the table, most specific
+first.
+
+The index is kept current incrementally: saves of ``IPReputation`` bump a
+change stamp in the shared cache, and each process periodically pulls only
+the rows modified since its last refresh (``last_seen`` is ``auto_now``).
+Deletes, saves that change a row's address or network, and bulk writes
+(``update()``, ``bulk_create()``, ``bulk_update()``, which neither send
+signals nor reliably touch ``last_seen``) bump a generation number once
+they commit. Each process then rebuilds in a background thread and keeps
+serving its current index until the new one replaces it.
+"""
+import ipaddress
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import IPNetwork, IPReputation
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'threats:ipindex:generation'
+CHANGED_KEY = 'threats:ipindex:changed'
+
+NETWORK_FIELDS = ('network', 'reputation', 'reports_count', 'country', 'asn')
+
+REPUTATIONS = [choice for choice, _ in IPReputation.REPUTATION_CHOICES]
+REPUTATION_CODES = {name: code for code, name in enumerate(REPUTATIONS)}
+
+
+def _encode_country(country):
+    country = (country or '').upper()[:2]
+    return int.from_bytes(country.encode('ascii', 'replace').ljust(2, b'\0'), 'big')
+
+
+def _decode_country(code):
+    return code.to_bytes(2, 'big').rstrip(b'\0').decode('ascii')
+
+
+class _Table:
+    """Sorted address keys plus parallel value arrays for one IP family."""
+
+    def __init__(self, typecode):
+        self.keys = array(typecode) if typecode else []
+        self.reputation = array('B')
+        self.reports = array('I')
+        self.country = array('H')
+        self.asn = array('I')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+    def append(self, key, row):
+        # Only valid while building from rows ordered by address.
+        self.keys.append(key)
+        self._append_values(row)
+
+    def _append_values(self, row):
+        reputation, reports, country, asn = row
+        self.reputation.append(REPUTATION_CODES.get(reputation, 0))
+        self.reports.append(reports or 0)
+        self.country.append(_encode_country(country))
+        self.asn.append(asn or 0)
+
+    def upsert(self, key, row):
+        i = bisect_left(self.keys, key)
+        reputation, reports, country, asn = row
+        if i < len(self.keys) and self.keys[i] == key:
+            self.reputation[i] = REPUTATION_CODES.get(reputation, 0)
+            self.reports[i] = reports or 0
+            self.country[i] = _encode_country(country)
+            self.asn[i] = asn or 0
+            return
+        self.keys.insert(i, key)
+        self.reputation.insert(i, REPUTATION_CODES.get(reputation, 0))
+        self.reports.insert(i, reports or 0)
+        self.country.insert(i, _encode_country(country))
+        self.asn.insert(i, asn or 0)
+
+    def get(self, i):
+        return {
+            'reputation': REPUTATIONS[self.reputation[i]],
+            'reports_count': self.reports[i],
+            'country': _decode_country(self.country[i]),
+            'asn': self.asn[i] or None,
+        }
+
+
+class _PrefixTable:
+    """CIDR networks of one IP family, keyed by prefix length."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.by_length = {}
+        self.lengths = []
+
+    def __len__(self):
+        return sum(len(networks) for networks in self.by_length.values())
+
+    def upsert(self, network, values):
+        length = network.prefixlen
+        key = int(network.network_address) >> (self.bits - length)
+        if length not in self.by_length:
+            self.by_length[length] = {}
+            self.lengths = sorted(self.by_length, reverse=True)
+        self.by_length[length][key] = (str(network), *values)
+
+    def matches(self, addr_int, first_only=False):
+        """Yield stored entries covering the address, most specific first."""
+        for length in self.lengths:
+            entry = self.by_length[length].get(addr_int >> (self.bits - length))
+            if entry is not None:
+                yield entry
+                if first_only:
+                    return
+
+
+def _network_result(entry):
+    network, reputation, reports, country, asn = entry
+    return {
+        'network': network,
+        'reputation': reputation,
+        'reports_count': reports or 0,
+        'country': country or '',
+        'asn': asn or None,
+    }
+
+
+class IPIndex:
+    """Lookup structure over the whole IPReputation table."""
+
+    def __init__(self):
+        # IPv4 keys fit in unsigned 32-bit array slots; IPv6 keys are
+        # 128-bit so they live in a plain sorted list.
+        self.v4 = _Table('I')
+        self.v6 = _Table(None)
+        self.networks4 = _PrefixTable(32)
+        self.networks6 = _PrefixTable(128)
+        self.built_at = None
+
+    def __len__(self):
+        return len(self.v4) + len(self.v6) + len(self.networks4) + len(self.networks6)
+
+    def _table(self, addr):
+        return self.v4 if addr.version == 4 else self.v6
+
+    def _networks(self, version):
+        return self.networks4 if version == 4 else self.networks6
+
+    @classmethod
+    def build(cls, queryset=None, chunk_size=20000):
+        index = cls()
+        index.built_at = timezone.now()
+        queryset = queryset if queryset is not None else IPReputation.objects.all()
+        rows = queryset.values_list('ip_address', 'reputation', 'reports_count', 'country', 'asn')
+        # Addresses are stored as text, so database order is not numeric
+        # order; sort per family once instead of inserting one by one.
+        pending = {4: [], 6: []}
+        for ip, *values in rows.iterator(chunk_size=chunk_size):
+            addr = index._address(ip)
+            pending[addr.version].append((int(addr), values))
+        for version, table in ((4, index.v4), (6, index.v6)):
+            for key, values in sorted(pending[version], key=lambda item: item[0]):
+                table.append(key, values)
+        index.apply_networks(IPNetwork.objects.values_list(*NETWORK_FIELDS).iterator(chunk_size=chunk_size))
+        return index
+
+    def apply(self, rows):
+        """Upsert ``(ip, reputation, reports_count, country, asn)`` rows."""
+        for ip, *values in rows:
+            addr = self._address(ip)
+            self._table(addr).upsert(int(addr), values)
+
+    def apply_networks(self, rows):
+        """Upsert ``(network, reputation, reports_count, country, asn)`` rows."""
+        for network, *values in rows:
+            network = self._network(network)
+            self._networks(network.version).upsert(network, values)
+
+    # IPv4-mapped IPv6 (::ffff:a.b.c.d) is stored and looked up as IPv4, so
+    # rows and lookups agree whichever form they use.
+
+    def _address(self, ip):
+        addr = ip if isinstance(ip, (ipaddress.IPv4Address, ipaddress.IPv6Address)) else ipaddress.ip_address(ip)
+        if addr.version == 6 and addr.ipv4_mapped:
+            addr = addr.ipv4_mapped
+        return addr
+
+    def _network(self, network):
+        network = ipaddress.ip_network(network, strict=False)
+        if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped:
+            network = ipaddress.ip_network(
+                f'{network.network_address.ipv4_mapped}/{network.prefixlen - 96}'
+            )
+        return network
+
+    def lookup(self, ip):
+        """Return reputation data for ``ip`` or None if it is not listed.
+
+        An exact host entry wins; otherwise the longest matching network
+        is used and named in the result's ``network`` key.
+
+        Raises ValueError for strings that are not IP addresses.
+        """
+        addr = self._address(ip)
+        table = self._table(addr)
+        i = table.find(int(addr))
+        if i is not None:
+            return table.get(i)
+        for entry in self._networks(addr.version).matches(int(addr), first_only=True):
+            return _network_result(entry)
+        return None
+
+    def covering_networks(self, ip):
+        """Return every stored network containing ``ip``, most specific first."""
+        addr = self._address(ip)
+        return [_network_result(entry) for entry in self._networks(addr.version).matches(int(addr))]
+
+
+_lock = threading.Lock()
+_index = None
+_generation = None
+_changed = None
+_checked_at = 0.0
+_rebuilding = None
+
+
+def get_index():
+    """Return this process's index, refreshing it if other processes changed data."""
+    global _index, _generation, _changed, _checked_at
+
+    interval = getattr(settings, 'IP_INDEX_REFRESH_INTERVAL', 5)
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < interval:
+        return _index
+
+    with _lock:
+        if _index is not None and now - _checked_at < interval:
+            return _index
+        shared = cache.get_many([GENERATION_KEY, CHANGED_KEY])
+        generation = shared.get(GENERATION_KEY, 0)
+        changed = shared.get(CHANGED_KEY)
+        _checked_at = now
+        if _index is None:
+            # Nothing to serve yet: the first lookup waits for the build.
+            _index = IPIndex.build()
+        elif generation != _generation:
+            _start_rebuild(generation, changed)
+            return _index
+        elif changed != _changed:
+            # Pull only rows saved since the last refresh. Overlap by the
+            # refresh interval so saves racing the previous refresh are
+            # not missed; re-applying a row is idempotent.
+            since = _index.built_at - timedelta(seconds=interval)
+            _index.built_at = timezone.now()
+            _index.apply(
+                IPReputation.objects.filter(last_seen__gte=since)
+                .values_list('ip_address', 'reputation', 'reports_count', 'country', 'asn')
+            )
+            _index.apply_networks(
+                IPNetwork.objects.filter(last_seen__gte=since).values_list(*NETWORK_FIELDS)
+            )
+        _generation = generation
+        _changed = changed
+        return _index
+
+
+def _start_rebuild(generation, changed):
+    global _rebuilding
+
+    # Called with _lock held.
+    if _rebuilding is not None and _rebuilding.is_alive():
+        return
+    _rebuilding = threading.Thread(
+        target=rebuild, args=(generation, changed), name='ipindex-rebuild', daemon=True,
+    )
+    _rebuilding.start()
+
+
+def rebuild(generation=None, changed=None):
+    """Build a new index and swap it in; lookups keep the old one meanwhile.
+
+    A generation bumped again during the build triggers another rebuild.
+    """
+    global _index, _generation, _changed
+
+    if generation is None:
+        shared = cache.get_many([GENERATION_KEY, CHANGED_KEY])
+        generation, changed = shared.get(GENERATION_KEY, 0), shared.get(CHANGED_KEY)
+    try:
+        index = IPIndex.build()
+    except Exception:
+        # Retried on the next refresh check.
+        logger.exception('Could not rebuild the IP index')
+        return None
+    finally:
+        if threading.current_thread() is _rebuilding:
+            connection.close()
+    with _lock:
+        _index, _generation, _changed = index, generation, changed
+    return index
+
+
+def clear_local():
+    """Forget this process's index; the next lookup rebuilds it (cold benchmarks)."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def mark_changed(instance=None):
+    """Record a saved row so every process pulls recent changes."""
+    cache.set(CHANGED_KEY, time.time(), None)
+    if _index is None or instance is None:
+        return
+    with _lock:
+        if isinstance(instance, IPNetwork):
+            _index.apply_networks([[getattr(instance, name) for name in NETWORK_FIELDS]])
+        else:
+            _index.apply([(instance.ip_address, instance.reputation, instance.reports_count,
+                           instance.country, instance.asn)])
+
+
+def mark_rebuild():
+    """Make every process rebuild its index from scratch (deletes, key
+    changes and bulk writes; call it once they have committed)."""
+    global _checked_at
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+    # Notice the new generation on the next lookup in this process too.
+    _checked_at = 0.0
+
+
+def covered_hosts(queryset, networks=None):
+    """Return pks of host rows in ``queryset`` made redundant by a network.
+
+    A host is redundant when the longest network covering it has the same
+    reputation, so deleting the host row does not change lookup results.
+    """
+    index = IPIndex()
+    index.apply_networks((networks if networks is not None else IPNetwork.objects).values_list(*NETWORK_FIELDS))
+    redundant = []
+    for pk, ip, reputation in queryset.values_list('pk', 'ip_address', 'reputation').iterator():
+        match = index.lookup(ip)
+        if match is not None and match['reputation'] == reputation:
+            redundant.append(pk)
+    return redundant
@@ -0,0 +1,93 @@
+"""
+Compare IP reputation lookup latency: in-process index vs per-row ORM query.
+
+Seeded rows (``--seed-rows``) only exist inside a transaction that is
+rolled back at the end, so they never reach lookups, exports or indexes.
+"""
+import ipaddress
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from threats.ipindex import IPIndex
+from threats.models import IPReputation
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Report p50/p99 lookup latency of the IP reputation index against the ORM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=5000)
+        parser.add_argument('--seed-rows', type=int, default=0,
+                            help='Insert this many synthetic IPReputation rows first (rolled back)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, **options):
+        rng = random.Random(options['seed'])
+        if options['seed_rows']:
+            self.seed(rng, options['seed_rows'])
+
+        known = list(IPReputation.objects.values_list('ip_address', flat=True)[:options['lookups']])
+        # Mix listed and unlisted addresses, like real traffic.
+        ips = [
+            rng.choice(known) if known and rng.random() < 0.5
+            else str(ipaddress.IPv4Address(rng.getrandbits(32)))
+            for _ in range(options['lookups'])
+        ]
+
+        started = time.perf_counter()
+        index = IPIndex.build()
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'Built index over {len(index)} rows in {build_ms:.1f} ms')
+
+        self.report('index', self.time_each(index.lookup, ips))
+        self.report('orm', self.time_each(
+            lambda ip: IPReputation.objects.filter(ip_address=ip).first(), ips
+        ))
+
+        started = time.perf_counter()
+        for ip in ips[:10000]:
+            index.lookup(ip)
+        batch_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'index batch of {min(len(ips), 10000)} lookups: {batch_ms:.1f} ms')
+
+    def seed(self, rng, count):
+        reputations = [choice for choice, _ in IPReputation.REPUTATION_CHOICES]
+        rows = {
+            str(ipaddress.IPv4Address(rng.getrandbits(32))): rng.choice(reputations)
+            for _ in range(count)
+        }
+        IPReputation.objects.bulk_create(
+            [IPReputation(ip_address=ip, reputation=rep, reports_count=rng.randint(0, 500))
+             for ip, rep in rows.items()],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        self.stdout.write(f'Seeded {len(rows)} IPReputation rows')
+
+    def time_each(self, func, ips):
+        samples = []
+        for ip in ips:
+            started = time.perf_counter()
+            func(ip)
+            samples.append((time.perf_counter() - started) * 1e6)
+        return samples
+
+    def report(self, label, samples):
+        self.stdout.write(
+            f'{label:>5}: p50 {percentile(samples, 50):8.1f} us   '
+            f'p99 {percentile(samples, 99):8.1f} us   '
+            f'({len(samples) / (sum(samples) / 1e6):,.0f} lookups/sec)'
+        )
@@ -0,0 +1,58 @@
+"""
+Export threat indicators or IP blocklists, or rebuild the export snapshots.
+"""
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from threats import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream a dataset as a blocklist, CSV, JSONL or STIX bundle, or rebuild the gzip snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', nargs='?', choices=sorted(exports.DATASETS))
+        parser.add_argument('format', nargs='?', choices=exports.FORMATS)
+        parser.add_argument('--since', help='Only rows changed since this ISO date or datetime (UTC if naive)')
+        parser.add_argument('--indicator-type', help='Only indicators of this type')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout); .gz is compressed')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per database round trip')
+        parser.add_argument('--snapshots', action='store_true', help='Rebuild the snapshots under EXPORT_ROOT')
+        parser.add_argument('--force', action='store_true', help='With --snapshots, rebuild unchanged datasets too')
+
+    def handle(self, *args, **options):
+        if options['snapshots']:
+            built = exports.build_snapshots(force=options['force'])
+            self.stderr.write(self.style.SUCCESS(
+                f'Rebuilt snapshots of {", ".join(built)}' if built else 'Snapshots are up to date'
+            ))
+            return
+        if not options['dataset'] or not options['format']:
+            raise CommandError('Pass a dataset and a format, or --snapshots')
+
+        since = None
+        if options['since']:
+            try:
+                since = exports.parse_moment(options['since'])
+            except ValueError:
+                raise CommandError(f'Invalid --since: {options["since"]}')
+        chunks = exports.export(
+            options['dataset'],
+            options['format'],
+            since=since,
+            indicator_type=options['indicator_type'],
+            chunk_size=options['chunk_size'],
+        )
+
+        output = options['output']
+        if not output:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+        opener = gzip.open if output.endswith('.gz') else open
+        with opener(output, 'wt', encoding='utf-8') as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Wrote {output}'))
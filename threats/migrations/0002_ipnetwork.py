@@ -0,0 +1,33 @@
+# Generated migration for IP network (CIDR) reputation
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IPNetwork',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(help_text='CIDR notation, e.g. 198.51.100.0/24', max_length=43, unique=True)),
+                ('reputation', models.CharField(choices=[('clean', 'Clean'), ('suspicious', 'Suspicious'), ('malicious', 'Malicious'), ('blocked', 'Blocked')], default='suspicious', max_length=20)),
+                ('reports_count', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+                ('country', models.CharField(blank=True, help_text='ISO country code', max_length=2)),
+                ('asn', models.PositiveIntegerField(blank=True, help_text='Autonomous System Number', null=True)),
+                ('description', models.TextField(blank=True)),
+                ('tags', models.CharField(blank=True, help_text='Comma-separated tags', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'IP Network',
+                'verbose_name_plural': 'IP Networks',
+                'ordering': ['-reports_count', '-last_seen'],
+            },
+        ),
+    ]
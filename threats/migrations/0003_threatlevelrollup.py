@@ -0,0 +1,34 @@
+# Generated migration for ThreatLevel rollups
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threats', '0002_ipnetwork'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='threatlevel',
+            index=models.Index(fields=['recorded_date'], name='threats_level_recorded_idx'),
+        ),
+        migrations.CreateModel(
+            name='ThreatLevelRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateTimeField()),
+                ('low_seconds', models.PositiveIntegerField(default=0)),
+                ('medium_seconds', models.PositiveIntegerField(default=0)),
+                ('high_seconds', models.PositiveIntegerField(default=0)),
+                ('critical_seconds', models.PositiveIntegerField(default=0)),
+                ('changes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['period', 'start'],
+                'unique_together': {('period', 'start')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated migration for port activity time-series buckets
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threats', '0003_threatlevelrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='portactivity',
+            index=models.Index(fields=['-scan_count'], name='threats_port_scan_count_idx'),
+        ),
+        migrations.CreateModel(
+            name='PortActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('port_number', models.PositiveIntegerField()),
+                ('protocol', models.CharField(max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'unique_together': {('bucket_start', 'port_number', 'protocol')},
+                'indexes': [models.Index(fields=['port_number', 'protocol', 'bucket_start'], name='threats_portbucket_port_idx')],
+            },
+        ),
+    ]
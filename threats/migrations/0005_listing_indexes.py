@@ -0,0 +1,37 @@
+# Generated migration for the IP reputation and indicator listing indexes
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threats', '0004_portactivitybucket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ipreputation',
+            index=models.Index(fields=['-reports_count', '-last_seen', '-id'], name='threats_ip_reports_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ipreputation',
+            index=models.Index(fields=['reputation', '-reports_count', '-last_seen', '-id'], name='threats_ip_rep_reports_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ipreputation',
+            index=models.Index(fields=['country', '-reports_count', '-last_seen', '-id'], name='threats_ip_country_reports_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='threatindicator',
+            index=models.Index(fields=['is_active', '-added_date', '-id'], name='threats_ioc_active_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='threatindicator',
+            index=models.Index(fields=['is_active', 'severity', '-added_date', '-id'], name='threats_ioc_severity_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='threatindicator',
+            index=models.Index(fields=['is_active', 'indicator_type', '-added_date', '-id'], name='threats_ioc_type_added_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated migration for the delta export indexes
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threats', '0005_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ipreputation',
+            index=models.Index(fields=['last_seen'], name='threats_ip_last_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='threatindicator',
+            index=models.Index(fields=['updated_date'], name='threats_ioc_updated_idx'),
+        ),
+    ]
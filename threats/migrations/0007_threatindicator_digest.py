@@ -0,0 +1,113 @@
+# Generated migration for the ThreatIndicator value digest
+
+import hashlib
+import ipaddress
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Frozen copy of threats.normalize as of this migration: later changes to
+# the canonical forms must not change what a fresh migrate produces.
+
+def normalize_value(indicator_type, value):
+    value = (value or '').strip()
+    if not value:
+        raise ValueError('empty value')
+    if indicator_type == 'ip':
+        return str(ipaddress.ip_address(value))
+    if indicator_type == 'domain':
+        return value.rstrip('.').lower().encode('idna').decode('ascii')
+    if indicator_type == 'url':
+        parts = urlsplit(value)
+        if not parts.scheme or not parts.netloc:
+            raise ValueError(f'not an absolute URL: {value}')
+        return urlunsplit((
+            parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+            parts.query, '',
+        ))
+    if indicator_type == 'hash':
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{32,128}', value):
+            raise ValueError(f'not a hex digest: {value}')
+        return value
+    if indicator_type == 'email':
+        local, sep, domain = value.rpartition('@')
+        if not sep or not local or not domain:
+            raise ValueError(f'not an email address: {value}')
+        return f'{local}@{domain.lower()}'
+    if indicator_type == 'cve':
+        value = value.upper()
+        if not re.fullmatch(r'CVE-\d{4}-\d{4,}', value):
+            raise ValueError(f'not a CVE id: {value}')
+        return value
+    raise ValueError(f'unknown indicator type: {indicator_type}')
+
+
+def canonical(indicator_type, value):
+    try:
+        return normalize_value(indicator_type, value)
+    except ValueError:
+        return (value or '').strip()
+
+
+def value_digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def backfill_digests(apps, schema_editor):
+    ThreatIndicator = apps.get_model('threats', 'ThreatIndicator')
+
+    batch = []
+    for indicator in ThreatIndicator.objects.only('indicator_type', 'value').order_by('pk').iterator(chunk_size=2000):
+        indicator.value = canonical(indicator.indicator_type, indicator.value)
+        indicator.digest = value_digest(indicator.value)
+        batch.append(indicator)
+        if len(batch) >= 2000:
+            ThreatIndicator.objects.bulk_update(batch, ['value', 'digest'])
+            batch = []
+    ThreatIndicator.objects.bulk_update(batch, ['value', 'digest'])
+
+    # Values that only differed before normalisation are now duplicates:
+    # keep the oldest row of each, active if any copy was, linked to a post
+    # if any copy was.
+    duplicates = (
+        ThreatIndicator.objects.values('indicator_type', 'digest')
+        .annotate(rows=Count('pk'), keep=Min('pk'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        copies = ThreatIndicator.objects.filter(indicator_type=group['indicator_type'], digest=group['digest'])
+        kept = copies.get(pk=group['keep'])
+        others = copies.exclude(pk=kept.pk)
+        kept.is_active = copies.filter(is_active=True).exists()
+        if kept.related_post_id is None:
+            kept.related_post_id = others.exclude(related_post=None).values_list('related_post', flat=True).first()
+        kept.save(update_fields=['is_active', 'related_post'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+    # The backfill commits on its own: PostgreSQL refuses to add the unique
+    # index in the transaction that updated the rows.
+    atomic = False
+
+    dependencies = [
+        ('threats', '0006_export_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='threatindicator',
+            name='digest',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop, atomic=True),
+        migrations.AlterUniqueTogether(
+            name='threatindicator',
+            unique_together={('indicator_type', 'digest')},
+        ),
+    ]
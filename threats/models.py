@@ -1,10 +1,15 @@
 """
 Threat intelligence models for ISC Clone.
 """
-from django.db import models
+import ipaddress
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from blog.models import Post
 
+from .normalize import canonical, normalize_value, value_digest
+
 
 class ThreatLevel(models.Model):
     """Historical threat level tracking."""
@@ -22,11 +27,50 @@ class ThreatLevel(models.Model):
     
     class Meta:
         ordering = ['-recorded_date']
+        indexes = [
+            models.Index(fields=['recorded_date'], name='threats_level_recorded_idx'),
+        ]
     
     def __str__(self):
         return f'{self.level.upper()} - {self.recorded_date.strftime("%Y-%m-%d %H:%M")}'
 
 
+class ThreatLevelRollup(models.Model):
+    """Time spent at each threat level per hour, day or month.
+    
+    Maintained by ``threats.rollups``; a level lasts from its
+    ``recorded_date`` until the next ThreatLevel is recorded.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+    
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    
+    # Seconds spent at each level within the bucket
+    low_seconds = models.PositiveIntegerField(default=0)
+    medium_seconds = models.PositiveIntegerField(default=0)
+    high_seconds = models.PositiveIntegerField(default=0)
+    critical_seconds = models.PositiveIntegerField(default=0)
+    
+    # Number of ThreatLevel records made within the bucket
+    changes = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['period', 'start']
+        unique_together = ['period', 'start']
+    
+    def __str__(self):
+        return f'{self.period} {self.start:%Y-%m-%d %H:%M}'
+    
+    def seconds(self):
+        """Return ``{level: seconds}`` for every level."""
+        return {level: getattr(self, f'{level}_seconds') for level, _ in ThreatLevel.LEVEL_CHOICES}
+
+
 class PortActivity(models.Model):
     """Port scanning and activity statistics."""
     port_number = models.PositiveIntegerField()
@@ -61,11 +105,66 @@ class PortActivity(models.Model):
         ordering = ['-scan_count']
         unique_together = ['port_number', 'protocol']
         verbose_name_plural = 'Port Activities'
+        indexes = [
+            models.Index(fields=['-scan_count'], name='threats_port_scan_count_idx'),
+        ]
     
     def __str__(self):
         return f'Port {self.port_number}/{self.protocol} - {self.service_name or "Unknown"}'
 
 
+class PortActivityBucket(models.Model):
+    """Hits on one port/protocol within one fixed time interval.
+    
+    Written by ``threats.portlogs`` alongside the cumulative PortActivity
+    counters; ``PORT_BUCKET_SECONDS`` sets the interval and
+    ``PORT_BUCKET_RETENTION_DAYS`` how long buckets are kept.
+    """
+    port_number = models.PositiveIntegerField()
+    protocol = models.CharField(max_length=10)
+    bucket_start = models.DateTimeField()
+    hits = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['bucket_start']
+        # Leads with bucket_start: trending and pruning are range scans
+        # over recent (or expired) buckets.
+        unique_together = ['bucket_start', 'port_number', 'protocol']
+        indexes = [
+            models.Index(fields=['port_number', 'protocol', 'bucket_start'], name='threats_portbucket_port_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.port_number}/{self.protocol} @ {self.bucket_start:%Y-%m-%d %H:%M}: {self.hits}'
+
+
+class IPIndexedQuerySet(models.QuerySet):
+    """Bulk writes skip the save signals that keep ``threats.ipindex``
+    current, so they make every process rebuild its index instead."""
+    
+    def _mark_rebuild(self):
+        from .ipindex import mark_rebuild
+        transaction.on_commit(mark_rebuild, using=self.db)
+    
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            self._mark_rebuild()
+        return rows
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            self._mark_rebuild()
+        return created
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if rows:
+            self._mark_rebuild()
+        return rows
+
+
 class IPReputation(models.Model):
     """IP address reputation tracking."""
     ip_address = models.GenericIPAddressField(unique=True)
@@ -96,15 +195,78 @@ class IPReputation(models.Model):
     description = models.TextField(blank=True)
     tags = models.CharField(max_length=200, blank=True, help_text='Comma-separated tags')
     
+    objects = IPIndexedQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-reports_count', '-last_seen']
         verbose_name = 'IP Reputation'
         verbose_name_plural = 'IP Reputations'
+        # Listings page through (reports_count, last_seen, id) with keyset
+        # cursors, optionally filtered on one of the leading columns.
+        indexes = [
+            models.Index(fields=['-reports_count', '-last_seen', '-id'], name='threats_ip_reports_idx'),
+            models.Index(fields=['reputation', '-reports_count', '-last_seen', '-id'], name='threats_ip_rep_reports_idx'),
+            models.Index(fields=['country', '-reports_count', '-last_seen', '-id'], name='threats_ip_country_reports_idx'),
+            # Delta exports and the IP index refresh read rows changed since a time
+            models.Index(fields=['last_seen'], name='threats_ip_last_seen_idx'),
+        ]
     
     def __str__(self):
         return f'{self.ip_address} - {self.reputation}'
 
 
+class IPNetwork(models.Model):
+    """Reputation of a whole IP network (CIDR range)."""
+    network = models.CharField(
+        max_length=43,
+        unique=True,
+        help_text='CIDR notation, e.g. 198.51.100.0/24'
+    )
+    reputation = models.CharField(
+        max_length=20,
+        choices=IPReputation.REPUTATION_CHOICES,
+        default='suspicious'
+    )
+    
+    # Tracking
+    reports_count = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+    
+    # Geographic data
+    country = models.CharField(max_length=2, blank=True, help_text='ISO country code')
+    asn = models.PositiveIntegerField(null=True, blank=True, help_text='Autonomous System Number')
+    
+    # Additional info
+    description = models.TextField(blank=True)
+    tags = models.CharField(max_length=200, blank=True, help_text='Comma-separated tags')
+    
+    objects = IPIndexedQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-reports_count', '-last_seen']
+        verbose_name = 'IP Network'
+        verbose_name_plural = 'IP Networks'
+    
+    def __str__(self):
+        return f'{self.network} - {self.reputation}'
+    
+    def clean(self):
+        try:
+            self.network = str(ipaddress.ip_network(self.network.strip(), strict=False))
+        except ValueError:
+            raise ValidationError({'network': 'Enter a valid CIDR network, e.g. 198.51.100.0/24.'})
+    
+    def save(self, *args, **kwargs):
+        # Store the canonical form so equal networks collide on the unique index
+        self.network = str(ipaddress.ip_network(self.network.strip(), strict=False))
+        super().save(*args, **kwargs)
+    
+    @property
+    def ip_network(self):
+        return ipaddress.ip_network(self.network)
+
+
 class ThreatIndicator(models.Model):
     """Indicators of Compromise (IoCs)."""
     IOC_TYPES = [
@@ -118,6 +280,8 @@ class ThreatIndicator(models.Model):
     
     indicator_type = models.CharField(max_length=10, choices=IOC_TYPES)
     value = models.TextField()
+    # SHA-256 of the normalised value; see threats.normalize
+    digest = models.CharField(max_length=64, editable=False)
     description = models.TextField()
     
     # Severity
@@ -149,6 +313,47 @@ class ThreatIndicator(models.Model):
     
     class Meta:
         ordering = ['-added_date']
+        unique_together = ['indicator_type', 'digest']
+        # Listings page through (added_date, id) with keyset cursors,
+        # active indicators only unless asked otherwise.
+        indexes = [
+            models.Index(fields=['is_active', '-added_date', '-id'], name='threats_ioc_active_added_idx'),
+            models.Index(fields=['is_active', 'severity', '-added_date', '-id'], name='threats_ioc_severity_added_idx'),
+            models.Index(fields=['is_active', 'indicator_type', '-added_date', '-id'], name='threats_ioc_type_added_idx'),
+            # Delta exports read rows changed since a time
+            models.Index(fields=['updated_date'], name='threats_ioc_updated_idx'),
+        ]
     
     def __str__(self):
         return f'{self.indicator_type.upper()}: {self.value[:50]}'
+    
+    def clean(self):
+        try:
+            self.value = normalize_value(self.indicator_type, self.value)
+        except ValueError as exc:
+            raise ValidationError({'value': str(exc)})
+        # digest is not a form field, so model validation skips the
+        # unique_together check
+        self.digest = value_digest(self.value)
+        duplicate = ThreatIndicator.objects.filter(
+            indicator_type=self.indicator_type, digest=self.digest
+        ).exclude(pk=self.pk)
+        if duplicate.exists():
+            raise ValidationError({'value': 'This indicator already exists.'})
+    
+    def save(self, *args, **kwargs):
+        # Store the canonical form so equal indicators collide on the unique index
+        self.value = canonical(self.indicator_type, self.value)
+        self.digest = value_digest(self.value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'digest'}
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def lookup(cls, indicator_type, value):
+        """Indicators equal to ``value`` once normalised (an index hit)."""
+        return cls.objects.filter(
+            indicator_type=indicator_type,
+            digest=value_digest(canonical(indicator_type, value)),
+        )
@@ -0,0 +1,68 @@
+"""
+Canonical forms of threat indicator values.
+
+Indicators are deduplicated on ``(indicator_type, digest)``, where the
+digest is the SHA-256 of the normalised value. Every writer has to
+normalise the same way: ``ThreatIndicator.save``, bulk ingestion and
+lookups. Otherwise ``Example.COM`` and ``example.com.`` would become two
+rows.
+"""
+import hashlib
+import ipaddress
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+
+def normalize_value(indicator_type, value):
+    """Return the canonical form of an indicator value.
+
+    Raises ValueError for values that are not valid for the type.
+    """
+    value = (value or '').strip()
+    if not value:
+        raise ValueError('empty value')
+    if indicator_type == 'ip':
+        return str(ipaddress.ip_address(value))
+    if indicator_type == 'domain':
+        return value.rstrip('.').lower().encode('idna').decode('ascii')
+    if indicator_type == 'url':
+        parts = urlsplit(value)
+        if not parts.scheme or not parts.netloc:
+            raise ValueError(f'not an absolute URL: {value}')
+        return urlunsplit((
+            parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+            parts.query, '',
+        ))
+    if indicator_type == 'hash':
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{32,128}', value):
+            raise ValueError(f'not a hex digest: {value}')
+        return value
+    if indicator_type == 'email':
+        local, sep, domain = value.rpartition('@')
+        if not sep or not local or not domain:
+            raise ValueError(f'not an email address: {value}')
+        return f'{local}@{domain.lower()}'
+    if indicator_type == 'cve':
+        value = value.upper()
+        if not re.fullmatch(r'CVE-\d{4}-\d{4,}', value):
+            raise ValueError(f'not a CVE id: {value}')
+        return value
+    raise ValueError(f'unknown indicator type: {indicator_type}')
+
+
+def canonical(indicator_type, value):
+    """Normalised value, or the stripped value if it does not validate.
+
+    Used where rows must be stored whatever their shape (admin edits of
+    old data, backfills); ingestion rejects invalid values instead.
+    """
+    try:
+        return normalize_value(indicator_type, value)
+    except ValueError:
+        return (value or '').strip()
+
+
+def value_digest(value):
+    """Fixed-width key of a normalised value."""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
@@ -0,0 +1,397 @@
+"""
+Aggregated PortActivity ingestion from firewall and sensor logs.
+
+Log lines are streamed and counted in memory per ``(port, protocol)`` and
+time bucket; each batch of lines then becomes a single ``INSERT ... ON
+CONFLICT DO UPDATE`` that adds the batch counts to ``scan_count`` using the
+``(port_number, protocol)`` unique constraint, and another that adds them
+to the ``PortActivityBucket`` rows (the time series behind
+``threats.porttrends``). The number of queries is proportional to the
+number of batches, not the number of lines.
+
+Hits are bucketed by the time on their line, so replaying an old log fills
+the buckets it covers rather than the current one. Lines without a
+timestamp, and timestamps in the future, count as now.
+
+Supported formats:
+
+* ``iptables`` - kernel log lines from iptables or nftables ``log``
+  rules (``... PROTO=TCP SPT=51234 DPT=22 ...``), with a syslog
+  (``Jan 12 03:14:05``, local time of the last year) or ISO 8601 prefix
+* ``csv`` - sensor exports with a header row and ``dst_port``/``port``,
+  ``protocol``/``proto`` and ``timestamp``/``time`` columns (ISO 8601 or
+  Unix seconds; naive times are in ``TIME_ZONE``)
+* ``jsonl`` - one JSON object per line with the same keys
+"""
+import csv
+import gzip
+import json
+import logging
+import math
+import re
+import socket
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PortActivity, PortActivityBucket
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('iptables', 'csv', 'jsonl')
+
+PROTOCOLS = {choice for choice, _ in PortActivity._meta.get_field('protocol').choices}
+
+IPTABLES_RE = re.compile(r'\bPROTO=(\w+)\b.*?\bDPT=(\d+)')
+
+# Syslog prefix of a kernel log line: RFC 3164 (no year) or RFC 5424/ISO
+SYSLOG_RE = re.compile(
+    r'(?:<\d+>\d* ?)?(?:(\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?)'
+    r'|([A-Z][a-z]{2} +\d{1,2} \d\d:\d\d:\d\d))'
+)
+
+PORT_KEYS = ('dst_port', 'dport', 'dest_port', 'destination_port', 'port')
+PROTO_KEYS = ('protocol', 'proto', 'transport')
+TIME_KEYS = ('timestamp', '@timestamp', 'time', 'ts', 'datetime', 'date')
+
+
+@dataclass
+class PortIngestStats:
+    lines: int = 0
+    matched: int = 0
+    undated: int = 0
+    batches: int = 0
+    ports: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'lines': self.lines,
+            'matched': self.matched,
+            'undated': self.undated,
+            'batches': self.batches,
+            'ports_upserted': self.ports,
+            'seconds': round(self.elapsed, 2),
+            'lines_per_sec': round(self.rate, 1),
+        }
+
+
+# Timestamps ------------------------------------------------------------
+# Parsed to Unix seconds; log lines repeat the same stamp, so cache them.
+
+@lru_cache(maxsize=4096)
+def iso_seconds(value):
+    """Unix time of an ISO 8601 string; naive values are in TIME_ZONE."""
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_default_timezone())
+    return moment.timestamp()
+
+
+@lru_cache(maxsize=4096)
+def _syslog_seconds(stamp, year):
+    try:
+        moment = datetime.strptime(f'{year} {" ".join(stamp.split())}', '%Y %b %d %H:%M:%S')
+    except ValueError:
+        return None
+    return timezone.make_aware(moment, timezone.get_default_timezone()).timestamp()
+
+
+def syslog_seconds(stamp, now):
+    """Unix time of a year-less syslog stamp: the latest one not after ``now``."""
+    year = datetime.fromtimestamp(now, tz=timezone.get_default_timezone()).year
+    seconds = _syslog_seconds(stamp, year)
+    # Allow a day of clock skew before deciding the line is from last year.
+    if seconds is not None and seconds > now + 86400:
+        seconds = _syslog_seconds(stamp, year - 1)
+    return seconds
+
+
+def _time_value(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        value = str(value).strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            return iso_seconds(value)
+    if not math.isfinite(seconds) or seconds <= 0:
+        return None
+    # Milliseconds since the epoch, as some sensors write them
+    return seconds / 1000 if seconds > 1e11 else seconds
+
+
+# Parsers ---------------------------------------------------------------
+# Each parser maps an iterable of lines to (port, protocol, seconds)
+# tuples, seconds being None when the line has no timestamp, or to None
+# for lines that carry no usable port.
+
+def parse_iptables(lines):
+    search = IPTABLES_RE.search
+    stamp_match = SYSLOG_RE.match
+    for line in lines:
+        match = search(line)
+        if match is None:
+            yield None
+            continue
+        stamp = stamp_match(line)
+        if stamp is None:
+            seconds = None
+        elif stamp.group(1):
+            seconds = iso_seconds(stamp.group(1))
+        else:
+            seconds = syslog_seconds(stamp.group(2), time.time())
+        yield int(match.group(2)), match.group(1).upper(), seconds
+
+
+def parse_csv(lines):
+    for row in csv.DictReader(lines):
+        yield _from_mapping(row)
+
+
+def parse_jsonl(lines):
+    for line in lines:
+        try:
+            yield _from_mapping(json.loads(line))
+        except (ValueError, AttributeError):
+            yield None
+
+
+def _from_mapping(row):
+    port = next((row[key] for key in PORT_KEYS if row.get(key) not in (None, '')), None)
+    proto = next((row[key] for key in PROTO_KEYS if row.get(key)), 'TCP')
+    stamp = next((row[key] for key in TIME_KEYS if row.get(key) not in (None, '')), None)
+    try:
+        return int(port), str(proto).upper(), _time_value(stamp) if stamp is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+PARSERS = {
+    'iptables': parse_iptables,
+    'csv': parse_csv,
+    'jsonl': parse_jsonl,
+}
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'iptables'
+
+
+# Aggregation and upsert ------------------------------------------------
+
+@lru_cache(maxsize=None)
+def service_name(port, protocol):
+    try:
+        return socket.getservbyport(port, protocol.lower())[:100]
+    except (OSError, OverflowError):
+        return ''
+
+
+def get_bucket_seconds():
+    return getattr(settings, 'PORT_BUCKET_SECONDS', 300)
+
+
+def bucket_start(moment):
+    """Start of the PortActivityBucket interval containing ``moment``."""
+    seconds = get_bucket_seconds()
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def _upsert(model, columns, rows, conflict, increment, replace=(), earliest=(), latest=()):
+    """Insert ``rows``, adding the ``increment`` columns onto existing rows.
+
+    ``replace`` columns take the new value, ``earliest`` and ``latest``
+    columns the lesser and the greater of the two. Backends with a low bound-parameter limit (SQLite) get the
+    statement split into as few pieces as the limit allows.
+    """
+    meta = model._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    fields = [meta.get_field(name) for name in columns]
+    batch_size = connection.ops.bulk_batch_size(fields, rows) or len(rows)
+    placeholder = '(%s)' % ', '.join(['%s'] * len(columns))
+    column_sql = ', '.join(qn(name) for name in columns)
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    updates = [f'{qn(name)} = {table}.{qn(name)} + EXCLUDED.{qn(name)}' for name in increment]
+    updates += [f'{qn(name)} = EXCLUDED.{qn(name)}' for name in replace]
+    updates += [f'{qn(name)} = {least}({table}.{qn(name)}, EXCLUDED.{qn(name)})' for name in earliest]
+    updates += [f'{qn(name)} = {greatest}({table}.{qn(name)}, EXCLUDED.{qn(name)})' for name in latest]
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = [value for row in batch for value in row]
+            cursor.execute(
+                f'INSERT INTO {table} ({column_sql}) '
+                f'VALUES {", ".join([placeholder] * len(batch))} '
+                f'ON CONFLICT ({", ".join(qn(name) for name in conflict)}) DO UPDATE SET '
+                f'{", ".join(updates)}',
+                params,
+            )
+
+
+@dataclass
+class PortHits:
+    """Hits per ``(bucket, port, protocol)``, and the first and last time
+    each ``(port, protocol)`` was seen, all in Unix seconds."""
+    hits: Counter = field(default_factory=Counter)
+    first: dict = field(default_factory=dict)
+    last: dict = field(default_factory=dict)
+    bucket_seconds: int = field(default_factory=get_bucket_seconds)
+
+    def add(self, port, protocol, seconds, count=1):
+        key = port, protocol
+        whole = int(seconds)
+        self.hits[whole - whole % self.bucket_seconds, port, protocol] += count
+        if seconds < self.first.get(key, seconds + 1):
+            self.first[key] = seconds
+        if seconds > self.last.get(key, seconds - 1):
+            self.last[key] = seconds
+
+    def __bool__(self):
+        return bool(self.hits)
+
+
+def _moment(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def upsert_hits(port_hits):
+    """Write a PortHits batch: one statement for PortActivity (cumulative
+    ``scan_count``, first and last seen) and one for its time buckets.
+
+    Returns the number of ``(port, protocol)`` rows touched.
+    """
+    if not port_hits:
+        return 0
+    # Only the timestamps need adapting for the backend.
+    prep = PortActivity._meta.get_field('last_seen').get_db_prep_save
+    totals = Counter()
+    buckets = {}
+    bucket_rows = []
+    for (bucket, port, proto), hits in port_hits.hits.items():
+        totals[port, proto] += hits
+        if bucket not in buckets:
+            buckets[bucket] = prep(_moment(bucket), connection)
+        bucket_rows.append((buckets[bucket], port, proto, hits))
+    rows = [
+        (port, proto, service_name(port, proto), 'low', '', hits,
+         prep(_moment(port_hits.first[port, proto]), connection),
+         prep(_moment(port_hits.last[port, proto]), connection))
+        for (port, proto), hits in totals.items()
+    ]
+
+    with transaction.atomic():
+        _upsert(
+            PortActivity,
+            ['port_number', 'protocol', 'service_name', 'risk_level', 'notes',
+             'scan_count', 'first_seen', 'last_seen'],
+            rows,
+            conflict=('port_number', 'protocol'),
+            increment=('scan_count',),
+            earliest=('first_seen',),
+            latest=('last_seen',),
+        )
+        _upsert(
+            PortActivityBucket,
+            ['bucket_start', 'port_number', 'protocol', 'hits'],
+            bucket_rows,
+            conflict=('bucket_start', 'port_number', 'protocol'),
+            increment=('hits',),
+        )
+    return len(rows)
+
+
+def upsert_counts(counts, seen=None):
+    """Add ``{(port, protocol): hits}``, all seen at ``seen`` (default now)."""
+    seconds = (seen or timezone.now()).timestamp()
+    port_hits = PortHits()
+    for (port, proto), hits in counts.items():
+        port_hits.add(port, proto, seconds, hits)
+    return upsert_hits(port_hits)
+
+
+def aggregate(records, stats, batch_lines):
+    """Yield a PortHits batch for every ``batch_lines`` input lines."""
+    port_hits = PortHits()
+    pending = 0
+    clock = time.time
+    for record in records:
+        stats.lines += 1
+        pending += 1
+        if record is not None:
+            port, proto, seconds = record
+            if 0 < port < 65536 and proto in PROTOCOLS:
+                now = clock()
+                if seconds is None:
+                    stats.undated += 1
+                    seconds = now
+                elif seconds > now:
+                    seconds = now
+                port_hits.add(port, proto, seconds)
+                stats.matched += 1
+        if pending >= batch_lines:
+            yield port_hits
+            port_hits = PortHits()
+            pending = 0
+    if pending:
+        yield port_hits
+
+
+def ingest_port_logs(path, fmt=None, batch_lines=100000, progress=None):
+    """Stream a log file (or ``-`` for stdin) into PortActivity."""
+    fmt = fmt or detect_format(path)
+    if fmt not in PARSERS:
+        raise ValueError(f'Unsupported format {fmt!r}; expected one of {", ".join(FORMATS)}')
+
+    stats = PortIngestStats()
+    if path == '-':
+        fp = sys.stdin
+    elif path.endswith('.gz'):
+        fp = gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    else:
+        fp = open(path, encoding='utf-8', errors='replace', newline='')
+
+    try:
+        for port_hits in aggregate(PARSERS[fmt](fp), stats, batch_lines):
+            stats.ports += upsert_hits(port_hits)
+            stats.batches += 1
+            if progress:
+                progress(stats)
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+    logger.info('Ingested port log %s: %s', path, stats.as_dict())
+    return stats
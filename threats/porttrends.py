@@ -0,0 +1,128 @@
+"""
+Trending ports, computed from the PortActivityBucket time series.
+
+A port trends when its hit rate over the last ``PORT_TREND_WINDOW`` seconds
+is well above its rate over the preceding ``PORT_TREND_BASELINE`` seconds.
+The score is the smoothed ratio of recent hits to the hits the baseline
+rate predicts for the window, so a port that was silent and suddenly gets
+hundreds of hits outranks one that doubles from a handful.
+
+Both sums come from one aggregate over a range scan of the bucket index.
+Celery recomputes the top ports every ``PORT_TREND_INTERVAL`` seconds and
+stores them in the cache, so the API and the port list only read that
+result; before the first refresh they show no trending ports.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import PortActivityBucket
+from .portlogs import bucket_start, service_name
+
+TRENDS_KEY = 'threats:port_trends'
+
+# Recent hits a port needs before it can trend at all.
+MIN_HITS = 10
+
+
+def get_window():
+    return timedelta(seconds=getattr(settings, 'PORT_TREND_WINDOW', 3600))
+
+
+def get_baseline():
+    return timedelta(seconds=getattr(settings, 'PORT_TREND_BASELINE', 86400))
+
+
+def get_limit():
+    return getattr(settings, 'PORT_TREND_LIMIT', 20)
+
+
+def compute(now=None, limit=None):
+    """Return the top ``limit`` trending ports as a serialisable dict."""
+    now = now or timezone.now()
+    limit = limit or get_limit()
+    window, baseline = get_window(), get_baseline()
+    recent_start = bucket_start(now - window)
+    baseline_start = bucket_start(recent_start - baseline)
+
+    rows = (
+        PortActivityBucket.objects.filter(bucket_start__gte=baseline_start)
+        .values('port_number', 'protocol')
+        .annotate(
+            recent=Sum('hits', filter=Q(bucket_start__gte=recent_start)),
+            earlier=Sum('hits', filter=Q(bucket_start__lt=recent_start)),
+        )
+        .filter(recent__gte=MIN_HITS)
+    )
+    recent_seconds = (now - recent_start).total_seconds()
+    baseline_seconds = (recent_start - baseline_start).total_seconds()
+    ports = []
+    for row in rows.iterator():
+        earlier = row['earlier'] or 0
+        expected = earlier / baseline_seconds * recent_seconds
+        ports.append({
+            'port': row['port_number'],
+            'protocol': row['protocol'],
+            'service': service_name(row['port_number'], row['protocol']),
+            'recent_hits': row['recent'],
+            'baseline_hits': earlier,
+            'expected_hits': round(expected, 1),
+            'score': round((row['recent'] + 1) / (expected + 1), 2),
+        })
+    ports.sort(key=lambda port: (port['score'], port['recent_hits']), reverse=True)
+    return {
+        'computed_at': now.isoformat(),
+        'window_seconds': int(window.total_seconds()),
+        'baseline_seconds': int(baseline.total_seconds()),
+        'ports': ports[:limit],
+    }
+
+
+def refresh(now=None):
+    trends = compute(now)
+    cache.set(TRENDS_KEY, trends, None)
+    return trends
+
+
+def get_trends():
+    """Latest precomputed trends; empty if the cache lost them."""
+    trends = cache.get(TRENDS_KEY)
+    if trends is None:
+        # Queue a refresh rather than waiting for the next periodic one
+        if cache.add(f'{TRENDS_KEY}:queued', True, getattr(settings, 'PORT_TREND_INTERVAL', 300)):
+            from core.tasks import enqueue_on_commit
+
+            from .tasks import refresh_port_trends
+
+            enqueue_on_commit(refresh_port_trends)
+        trends = {
+            'computed_at': None,
+            'window_seconds': int(get_window().total_seconds()),
+            'baseline_seconds': int(get_baseline().total_seconds()),
+            'ports': [],
+        }
+    return trends
+
+
+def get_retention():
+    return timedelta(days=getattr(settings, 'PORT_BUCKET_RETENTION_DAYS', 30))
+
+
+def prune(now=None):
+    """Delete buckets older than the retention period."""
+    cutoff = (now or timezone.now()) - get_retention()
+    deleted, _ = PortActivityBucket.objects.filter(bucket_start__lt=cutoff).delete()
+    return deleted
+
+
+def series(port, protocol, start, end=None):
+    """Return ``[(bucket start, hits), ...]`` for one port, oldest first."""
+    buckets = PortActivityBucket.objects.filter(
+        port_number=port, protocol=protocol, bucket_start__gte=start
+    )
+    if end is not None:
+        buckets = buckets.filter(bucket_start__lt=end)
+    return list(buckets.order_by('bucket_start').values_list('bucket_start', 'hits'))
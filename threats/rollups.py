@@ -0,0 +1,186 @@
+"""
+Rollups of ThreatLevel history.
+
+ThreatLevel rows form a step function: a level holds from its
+``recorded_date`` until the next row is recorded. ``refresh`` walks those
+steps and stores the seconds spent at each level per hour, day and month
+(UTC buckets) in ``ThreatLevelRollup``, so charts spanning years read a
+handful of rows instead of the raw table.
+
+Refreshes are incremental. They restart from the month holding the latest
+stored hour bucket (the only open one), or from an earlier month if a
+ThreatLevel there was edited or deleted since the last run (see
+``mark_dirty``). Each refresh rewrites whole months, so refreshes run one
+at a time under a cache lock.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.cache import bump_version
+
+from .models import ThreatLevel, ThreatLevelRollup
+
+ROLLUP_CACHE_NAME = 'threats:rollups'
+DIRTY_KEY = 'threats:rollups:dirty'
+LOCK_KEY = 'threats:rollups:lock'
+
+# Upper bound on a refresh holding the lock (a full rebuild of years of
+# history); the lock expires after it if a worker dies mid-refresh
+LOCK_TIMEOUT = 60 * 10
+
+PERIODS = [period for period, _ in ThreatLevelRollup.PERIOD_CHOICES]
+LEVELS = [level for level, _ in ThreatLevel.LEVEL_CHOICES]
+
+
+def floor(moment, period):
+    """Start of the UTC bucket of ``period`` containing ``moment``."""
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period in ('day', 'month'):
+        moment = moment.replace(hour=0)
+    if period == 'month':
+        moment = moment.replace(day=1)
+    return moment
+
+
+def next_start(start, period):
+    if period == 'hour':
+        return start + timedelta(hours=1)
+    if period == 'day':
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def steps(start, end):
+    """Yield ``(from, to, level)`` covering ``start``..``end``."""
+    levels = ThreatLevel.objects.order_by('recorded_date').values_list('recorded_date', 'level')
+    current = levels.filter(recorded_date__lte=start).order_by('-recorded_date').first()
+    previous = (start, current[1]) if current else None
+    for recorded, level in levels.filter(recorded_date__gt=start, recorded_date__lt=end).iterator():
+        if previous:
+            yield previous[0], recorded, previous[1]
+        previous = (recorded, level)
+    if previous:
+        yield previous[0], end, previous[1]
+
+
+def compute(start, end):
+    """Return ``{(period, bucket start): {level or 'changes': amount}}``."""
+    buckets = defaultdict(lambda: defaultdict(float))
+    for step_start, step_end, level in steps(start, end):
+        for period in PERIODS:
+            cursor = step_start
+            while cursor < step_end:
+                bucket = floor(cursor, period)
+                bucket_end = min(next_start(bucket, period), step_end)
+                buckets[period, bucket][level] += (bucket_end - cursor).total_seconds()
+                cursor = bucket_end
+    recorded = ThreatLevel.objects.filter(recorded_date__gte=start, recorded_date__lt=end)
+    for moment in recorded.values_list('recorded_date', flat=True).iterator():
+        for period in PERIODS:
+            buckets[period, floor(moment, period)]['changes'] += 1
+    return buckets
+
+
+def mark_dirty(moment):
+    """Make the next refresh recompute from ``moment`` onwards."""
+    current = cache.get(DIRTY_KEY)
+    if current is None or moment < current:
+        cache.set(DIRTY_KEY, moment, None)
+
+
+def pending_since():
+    """Earliest moment whose rollups may be out of date, or None."""
+    candidates = [
+        cache.get(DIRTY_KEY),
+        ThreatLevelRollup.objects.filter(period='hour').aggregate(latest=Max('start'))['latest'],
+    ]
+    if candidates[1] is None:
+        # Nothing rolled up yet: start from the first record.
+        candidates[1] = ThreatLevel.objects.order_by('recorded_date').values_list(
+            'recorded_date', flat=True
+        ).first()
+    candidates = [moment for moment in candidates if moment is not None]
+    return min(candidates) if candidates else None
+
+
+def refresh(since=None, now=None):
+    """Recompute every bucket from the month of ``since`` up to ``now``.
+
+    ``since`` defaults to ``pending_since()``; pass the epoch for a full
+    rebuild. Returns the number of buckets written, or None if another
+    refresh is running (``since`` is then left for the next one).
+    """
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        if since:
+            mark_dirty(since)
+        return None
+    try:
+        return _refresh(since, now)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _refresh(since, now):
+    now = now or timezone.now()
+    since = since or pending_since()
+    cache.delete(DIRTY_KEY)
+    if since is None:
+        return 0
+    start = floor(since, 'month')
+    buckets = compute(start, now)
+    rows = [
+        ThreatLevelRollup(
+            period=period,
+            start=bucket,
+            changes=int(values['changes']),
+            **{f'{level}_seconds': round(values[level]) for level in LEVELS},
+        )
+        for (period, bucket), values in buckets.items()
+    ]
+    with transaction.atomic():
+        ThreatLevelRollup.objects.filter(start__gte=start).delete()
+        ThreatLevelRollup.objects.bulk_create(rows, batch_size=1000)
+    bump_version(ROLLUP_CACHE_NAME)
+    return len(rows)
+
+
+def get_buckets(period, first, last):
+    """Serialisable rollups of ``period`` from bucket ``first`` to ``last`` inclusive."""
+    rows = ThreatLevelRollup.objects.filter(
+        period=period, start__gte=first, start__lte=last
+    ).order_by('start')
+    return [
+        {'start': row.start.isoformat(), **row.seconds(), 'changes': row.changes}
+        for row in rows
+    ]
+
+
+def chart(months=36, now=None):
+    """Monthly share of time at each level for the dashboard, oldest first."""
+    now = now or timezone.now()
+    start = floor(now, 'month')
+    for _ in range(months - 1):
+        start = floor(start - timedelta(days=1), 'month')
+    rows = ThreatLevelRollup.objects.filter(period='month', start__gte=start).order_by('start')
+    bars = []
+    for row in rows:
+        seconds = row.seconds()
+        total = sum(seconds.values())
+        if not total:
+            continue
+        bars.append({
+            'start': row.start,
+            'changes': row.changes,
+            'segments': [
+                {'level': level, 'percent': round(100 * seconds[level] / total, 2)}
+                for level in LEVELS if seconds[level]
+            ],
+        })
+    return bars
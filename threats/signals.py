@@ -0,0 +1,51 @@
+"""
+Signal handlers for the threats app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.tasks import enqueue_on_commit
+
+from . import infocon, ipindex, rollups
+from .models import IPNetwork, IPReputation, ThreatLevel
+
+
+# Field each process indexes a row under
+INDEX_KEYS = {IPNetwork: 'network', IPReputation: 'ip_address'}
+
+
+@receiver(pre_save, sender=IPNetwork)
+@receiver(pre_save, sender=IPReputation)
+def ip_reputation_key(sender, instance, **kwargs):
+    key = INDEX_KEYS[sender]
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(key, flat=True).first()
+    instance.ipindex_key_changed = previous is not None and previous != getattr(instance, key)
+
+
+@receiver(post_save, sender=IPNetwork)
+@receiver(post_save, sender=IPReputation)
+def ip_reputation_saved(sender, instance, **kwargs):
+    if getattr(instance, 'ipindex_key_changed', False):
+        # Upserts cannot drop the old key from other processes' indexes
+        transaction.on_commit(ipindex.mark_rebuild)
+    else:
+        ipindex.mark_changed(instance)
+
+
+@receiver(post_delete, sender=IPNetwork)
+@receiver(post_delete, sender=IPReputation)
+def ip_reputation_deleted(sender, instance, **kwargs):
+    # Rebuilding before the commit could read the row back
+    transaction.on_commit(ipindex.mark_rebuild)
+
+
+@receiver(post_save, sender=ThreatLevel)
+@receiver(post_delete, sender=ThreatLevel)
+def threat_level_changed(sender, instance, **kwargs):
+    from .tasks import rollup_threat_levels
+    rollups.mark_dirty(instance.recorded_date)
+    transaction.on_commit(infocon.publish)
+    enqueue_on_commit(rollup_threat_levels)
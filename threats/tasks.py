@@ -0,0 +1,65 @@
+"""
+Celery tasks for the threats app.
+"""
+from celery import shared_task
+
+from . import exports, ingest, porttrends, portlogs, rollups
+
+
+@shared_task(bind=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+def import_indicators(self, path, fmt=None, source='', severity='medium', added_by_id=None,
+                      chunk_size=5000):
+    """Import an IoC feed file; retries resume from the last checkpoint.
+    
+    The first attempt starts over, whatever checkpoint an earlier import
+    of the same path left behind.
+    """
+    from django.contrib.auth.models import User
+
+    added_by = User.objects.filter(pk=added_by_id).first() if added_by_id else None
+    stats = ingest.import_indicators(
+        path,
+        fmt=fmt,
+        source=source,
+        severity=severity,
+        added_by=added_by,
+        chunk_size=chunk_size,
+        resume=self.request.retries > 0,
+    )
+    build_export_snapshots.delay()
+    return stats.as_dict()
+
+
+@shared_task(ignore_result=True)
+def ingest_port_logs(path, fmt=None, batch_lines=100000):
+    """Aggregate a firewall/sensor log file into PortActivity."""
+    return portlogs.ingest_port_logs(path, fmt=fmt, batch_lines=batch_lines).as_dict()
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def rollup_threat_levels(self):
+    """Bring ThreatLevel hour/day/month rollups up to date."""
+    written = rollups.refresh()
+    if written is None:
+        # Another refresh is running and may have read the levels before
+        # the change that queued this one.
+        raise self.retry(countdown=30)
+    return written
+
+
+@shared_task(ignore_result=True)
+def refresh_port_trends():
+    """Recompute the top trending ports."""
+    porttrends.refresh()
+
+
+@shared_task(ignore_result=True)
+def prune_port_buckets():
+    """Drop port time-series buckets past their retention period."""
+    return porttrends.prune()
+
+
+@shared_task(ignore_result=True)
+def build_export_snapshots(force=False):
+    """Rewrite the gzip export snapshots of datasets that changed."""
+    return exports.build_snapshots(force=force)
@@ -0,0 +1,211 @@
+"""
+Bulk exports: what each format lists, delta exports, and snapshots that
+are rebuilt only when their dataset changed.
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import exports
+from ..models import IPReputation, ThreatIndicator
+
+SHA256 = 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+
+
+def text(dataset, fmt, **kwargs):
+    return ''.join(exports.export(dataset, fmt, **kwargs))
+
+
+class ExportTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def indicator(indicator_type, value, severity='high', is_active=True):
+            return ThreatIndicator.objects.create(
+                indicator_type=indicator_type, value=value, severity=severity,
+                description=f'{indicator_type} sighting', source='test', is_active=is_active,
+            )
+        cls.ip = indicator('ip', '192.0.2.1')
+        cls.retired = indicator('domain', 'retired.example', is_active=False)
+        cls.hash = indicator('hash', SHA256, severity='critical')
+        cls.cve = indicator('cve', 'CVE-2024-0001', severity='medium')
+        cls.url = indicator('url', "http://example.com/it's")
+        cls.malicious = IPReputation.objects.create(ip_address='198.51.100.1', reputation='malicious')
+        cls.blocked = IPReputation.objects.create(ip_address='2001:db8::1', reputation='blocked')
+        cls.clean = IPReputation.objects.create(ip_address='198.51.100.2', reputation='clean')
+
+
+class FormatTests(ExportTestCase):
+
+    def test_txt_lists_only_listed_values(self):
+        lines = text('indicators', 'txt').splitlines()
+        self.assertTrue(lines[0].startswith('# indicators blocklist generated '))
+        self.assertEqual(lines[1:], ['192.0.2.1', SHA256, 'CVE-2024-0001', "http://example.com/it's"])
+        self.assertEqual(text('ips', 'txt').splitlines()[1:], ['198.51.100.1', '2001:db8::1'])
+        # Delta blocklists still only carry listed values
+        since = timezone.now() - timedelta(days=1)
+        self.assertEqual(text('ips', 'txt', since=since).splitlines()[1:], ['198.51.100.1', '2001:db8::1'])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(text('indicators', 'csv'))))
+        self.assertEqual(list(rows[0]), list(exports.DATASETS['indicators'].fields))
+        self.assertEqual([row['value'] for row in rows], ['192.0.2.1', SHA256, 'CVE-2024-0001', "http://example.com/it's"])
+        self.assertEqual(rows[0]['id'], str(self.ip.pk))
+        self.assertEqual(rows[0]['updated_date'], self.ip.updated_date.isoformat())
+        rows = list(csv.DictReader(io.StringIO(text('indicators', 'csv', indicator_type='hash'))))
+        self.assertEqual([row['severity'] for row in rows], ['critical'])
+
+    def test_jsonl(self):
+        lines = [json.loads(line) for line in text('ips', 'jsonl').splitlines()]
+        self.assertEqual([line['ip_address'] for line in lines], ['198.51.100.1', '2001:db8::1'])
+        self.assertEqual(set(lines[0]), set(exports.DATASETS['ips'].fields))
+        self.assertEqual(lines[0]['reports_count'], 0)
+
+    def test_delta_includes_rows_that_dropped_off(self):
+        since = timezone.now() - timedelta(days=1)
+        values = [json.loads(line)['value'] for line in text('indicators', 'jsonl', since=since).splitlines()]
+        self.assertIn('retired.example', values)
+        ips = {json.loads(line)['ip_address']: json.loads(line)['reputation']
+               for line in text('ips', 'jsonl', since=since).splitlines()}
+        self.assertEqual(ips['198.51.100.2'], 'clean')
+        self.assertEqual(text('ips', 'jsonl', since=timezone.now() + timedelta(days=1)), '')
+
+    def test_stix(self):
+        bundle = json.loads(text('indicators', 'stix'))
+        self.assertEqual(bundle['type'], 'bundle')
+        objects = {obj['name']: obj for obj in bundle['objects']}
+        self.assertEqual(objects['192.0.2.1']['pattern'], "[ipv4-addr:value = '192.0.2.1']")
+        self.assertEqual(objects[SHA256]['pattern'], f"[file:hashes.'SHA-256' = '{SHA256}']")
+        self.assertEqual(
+            objects["http://example.com/it's"]['pattern'], "[url:value = 'http://example.com/it\\'s']"
+        )
+        self.assertEqual(objects['CVE-2024-0001']['type'], 'vulnerability')
+        self.assertEqual(objects['192.0.2.1']['labels'], ['high'])
+        self.assertFalse(objects['192.0.2.1']['revoked'])
+        self.assertTrue(objects['192.0.2.1']['created'].endswith('Z'))
+
+        ips = json.loads(text('ips', 'stix'))['objects']
+        self.assertEqual(ips[1]['pattern'], "[ipv6-addr:value = '2001:db8::1']")
+
+    def test_stix_ids_are_stable_and_revoked_rows_marked(self):
+        since = timezone.now() - timedelta(days=1)
+        first = {obj['name']: obj for obj in json.loads(text('indicators', 'stix', since=since))['objects']}
+        second = {obj['name']: obj for obj in json.loads(text('indicators', 'stix', since=since))['objects']}
+        self.assertEqual({name: obj['id'] for name, obj in first.items()},
+                         {name: obj['id'] for name, obj in second.items()})
+        self.assertTrue(first['retired.example']['revoked'])
+
+    def test_chunks_group_rows(self):
+        chunks = list(exports.export('indicators', 'jsonl', chunk_size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(''.join(chunks), text('indicators', 'jsonl'))
+
+    async def test_aexport_matches_export(self):
+        chunks = [chunk async for chunk in exports.aexport('ips', 'csv', chunk_size=1)]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(''.join(chunks), await exports.sync_to_async(text)('ips', 'csv'))
+
+    def test_parse_moment(self):
+        self.assertEqual(exports.parse_moment('2024-02-01').isoformat(), '2024-02-01T00:00:00+00:00')
+        self.assertEqual(exports.parse_moment('2024-02-01T10:30:00+02:00').isoformat(), '2024-02-01T10:30:00+02:00')
+        with self.assertRaises(ValueError):
+            exports.parse_moment('yesterday')
+
+
+class SnapshotTests(ExportTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(EXPORT_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def read(self, dataset, fmt):
+        path, _ = exports.get_snapshot(dataset, fmt)
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as fp:
+            return fp.read()
+
+    def etag(self, dataset):
+        return exports.get_snapshot(dataset, 'csv')[1]['etag']
+
+    def test_build_writes_every_format(self):
+        self.assertIsNone(exports.get_snapshot('ips', 'csv'))
+        self.assertEqual(exports.build_snapshots(), ['indicators', 'ips'])
+        for dataset in exports.DATASETS:
+            for fmt in exports.FORMATS:
+                self.assertIsNotNone(exports.get_snapshot(dataset, fmt))
+        self.assertEqual(self.read('indicators', 'csv'), text('indicators', 'csv'))
+        self.assertEqual(self.read('ips', 'jsonl'), text('ips', 'jsonl'))
+
+    def test_unchanged_datasets_are_not_rebuilt(self):
+        exports.build_snapshots()
+        etag = self.etag('indicators')
+        self.assertEqual(exports.build_snapshots(), [])
+        self.assertEqual(self.etag('indicators'), etag)
+
+    def test_edit_makes_the_snapshot_stale(self):
+        exports.build_snapshots()
+        etag, ips_etag = self.etag('indicators'), self.etag('ips')
+        self.ip.severity = 'low'
+        self.ip.save()
+        self.assertEqual(exports.build_snapshots(), ['indicators'])
+        self.assertNotEqual(self.etag('indicators'), etag)
+        self.assertEqual(self.etag('ips'), ips_etag)
+        self.assertIn(',low,', self.read('indicators', 'csv'))
+
+    def test_insert_and_delete_make_the_snapshot_stale(self):
+        exports.build_snapshots()
+        IPReputation.objects.create(ip_address='203.0.113.9', reputation='blocked')
+        self.assertEqual(exports.build_snapshots(), ['ips'])
+        self.assertIn('203.0.113.9', self.read('ips', 'txt'))
+        # Deleting the newest row leaves the latest change as it was
+        IPReputation.objects.filter(ip_address='203.0.113.9').delete()
+        self.assertEqual(exports.build_snapshots(), ['ips'])
+        self.assertNotIn('203.0.113.9', self.read('ips', 'txt'))
+        self.clean.delete()
+        self.assertEqual(exports.build_snapshots(), ['ips'])
+
+    def test_force_rebuilds_everything(self):
+        exports.build_snapshots()
+        self.assertEqual(exports.build_snapshots(force=True), ['indicators', 'ips'])
+
+    def test_missing_file_or_manifest(self):
+        exports.build_snapshots()
+        exports.snapshot_path('ips', 'stix').unlink()
+        self.assertIsNone(exports.get_snapshot('ips', 'stix'))
+        (exports.get_root() / exports.MANIFEST_NAME).write_text('{not json')
+        self.assertIsNone(exports.get_snapshot('ips', 'csv'))
+        # A lost manifest rebuilds everything
+        self.assertEqual(exports.build_snapshots(), ['indicators', 'ips'])
+
+    def test_view_serves_the_snapshot(self):
+        exports.build_snapshots()
+        url = reverse('threats:export', args=['ips', 'csv'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], self.etag('ips'))
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(body, text('ips', 'csv'))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=self.etag('ips'))
+        self.assertEqual(response.status_code, 304)
+
+        # Deltas and clients without gzip are streamed from the database
+        for params, headers in (({'since': '2000-01-01'}, {'HTTP_ACCEPT_ENCODING': 'gzip'}), ({}, {})):
+            response = self.client.get(url, params, **headers)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertIn('198.51.100.1', b''.join(response.streaming_content).decode())
+
+    def test_view_rejects_bad_parameters(self):
+        url = reverse('threats:export', args=['ips', 'csv'])
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'indicator_type': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('threats:export', args=['ips', 'xml'])).status_code, 404)
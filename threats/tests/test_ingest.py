@@ -0,0 +1,110 @@
+"""
+Bulk indicator import: deduplication, chunking and checkpoint resume.
+"""
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..ingest import IngestError, import_indicators
+from ..models import ThreatIndicator
+
+FEED = """indicator_type,value,severity,description
+domain,Example.COM.,low,First sighting
+domain,example.com,high,Seen again
+ip,192.0.2.1,medium,Scanner
+ip,not-an-ip,medium,Broken row
+hash,D41D8CD98F00B204E9800998ECF8427E,critical,Empty file
+url,HTTP://Example.com/path,medium,Landing page
+"""
+
+
+class ImportIndicatorsTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'feed.csv')
+        self.write(FEED)
+
+    def write(self, text):
+        with open(self.path, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+
+    def test_duplicates_collapse_to_one_row(self):
+        stats = import_indicators(self.path)
+        self.assertEqual((stats.read, stats.created, stats.invalid), (6, 4, 1))
+        domain = ThreatIndicator.objects.get(indicator_type='domain')
+        # The later duplicate wins
+        self.assertEqual((domain.value, domain.severity), ('example.com', 'high'))
+        self.assertEqual(
+            ThreatIndicator.objects.get(indicator_type='url').value, 'http://example.com/path'
+        )
+
+    def test_reimport_updates_only_changed_rows(self):
+        import_indicators(self.path)
+        stats = import_indicators(self.path)
+        self.assertEqual((stats.created, stats.updated), (0, 0))
+
+        self.write(FEED.replace('192.0.2.1,medium', '192.0.2.1,high'))
+        stats = import_indicators(self.path)
+        self.assertEqual((stats.created, stats.updated), (0, 1))
+        self.assertEqual(ThreatIndicator.objects.get(indicator_type='ip').severity, 'high')
+        self.assertEqual(ThreatIndicator.objects.count(), 4)
+
+    def test_chunk_size(self):
+        chunks = []
+        import_indicators(self.path, chunk_size=2, progress=lambda stats: chunks.append(stats.read))
+        # Five valid rows in chunks of two; the invalid row is read but not chunked
+        self.assertEqual(chunks, [2, 5, 6])
+        self.assertEqual(ThreatIndicator.objects.count(), 4)
+
+    def test_chunk_size_below_one(self):
+        with self.assertRaises(IngestError):
+            import_indicators(self.path, chunk_size=0)
+        with self.assertRaisesMessage(CommandError, '--chunk-size'):
+            call_command('import_indicators', self.path, chunk_size=0)
+
+    def test_resume_from_checkpoint(self):
+        def interrupt(stats):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            import_indicators(self.path, chunk_size=2, progress=interrupt)
+        checkpoint = f'{self.path}.checkpoint'
+        with open(checkpoint) as fp:
+            self.assertEqual(json.load(fp), {'records': 2})
+        self.assertEqual(ThreatIndicator.objects.count(), 1)
+
+        stats = import_indicators(self.path, chunk_size=2, resume=True)
+        self.assertEqual((stats.resumed, stats.read, stats.created), (2, 6, 3))
+        self.assertEqual(ThreatIndicator.objects.count(), 4)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_without_resume_checkpoint_is_ignored(self):
+        with open(f'{self.path}.checkpoint', 'w') as fp:
+            json.dump({'records': 4}, fp)
+        stats = import_indicators(self.path)
+        self.assertEqual(stats.created, 4)
+
+    def test_jsonl_and_stix(self):
+        self.path = self.path.replace('.csv', '.jsonl')
+        self.write(
+            '{"type": "ipv4", "value": "198.51.100.7"}\n'
+            '\n'
+            '{"type": "sha256", "value": "%s"}\n' % ('A' * 64)
+        )
+        self.assertEqual(import_indicators(self.path).created, 2)
+
+        self.path = self.path.replace('.jsonl', '.json')
+        self.write(json.dumps({'type': 'bundle', 'objects': [
+            {'type': 'indicator', 'pattern': "[domain-name:value = 'evil.example']", 'confidence': 90},
+            {'type': 'vulnerability', 'name': 'cve-2024-12345'},
+            {'type': 'malware', 'name': 'ignored'},
+        ]}))
+        self.assertEqual(import_indicators(self.path).created, 2)
+        self.assertEqual(ThreatIndicator.objects.get(indicator_type='domain').severity, 'high')
+        self.assertTrue(ThreatIndicator.objects.filter(indicator_type='cve', value='CVE-2024-12345').exists())
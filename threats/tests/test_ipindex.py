@@ -0,0 +1,137 @@
+"""
+IP reputation index: exact and longest-prefix lookups, IPv4-mapped
+addresses, and keeping the index current as rows change.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import ipindex
+from ..ipindex import IPIndex
+from ..models import IPNetwork, IPReputation
+
+
+def values(reputation, reports=1, country='', asn=None):
+    return [reputation, reports, country, asn]
+
+
+class HostLookupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = IPIndex()
+        self.index.apply([
+            ('10.1.2.3', *values('clean', 2, 'US')),
+            ('::ffff:192.0.2.5', *values('malicious', 7)),
+            ('2001:db8::1', *values('blocked')),
+        ])
+
+    def test_exact_host(self):
+        self.assertEqual(
+            self.index.lookup('10.1.2.3'),
+            {'reputation': 'clean', 'reports_count': 2, 'country': 'US', 'asn': None},
+        )
+        self.assertEqual(self.index.lookup('2001:db8::1')['reputation'], 'blocked')
+
+    def test_unlisted_and_invalid(self):
+        self.assertIsNone(self.index.lookup('11.0.0.1'))
+        self.assertIsNone(self.index.lookup('2001:db8::2'))
+        with self.assertRaises(ValueError):
+            self.index.lookup('10.1.2.300')
+
+    def test_ipv4_mapped_addresses(self):
+        # Stored mapped, looked up plain, and the other way round
+        self.assertEqual(self.index.lookup('192.0.2.5')['reports_count'], 7)
+        self.assertEqual(self.index.lookup('::ffff:10.1.2.3')['reputation'], 'clean')
+
+    def test_upsert_keeps_keys_sorted(self):
+        self.index.apply([('10.0.0.1', *values('blocked')), ('10.1.2.3', *values('suspicious'))])
+        self.assertEqual(list(self.index.v4.keys), sorted(self.index.v4.keys))
+        self.assertEqual(self.index.lookup('10.0.0.1')['reputation'], 'blocked')
+        self.assertEqual(self.index.lookup('10.1.2.3')['reputation'], 'suspicious')
+
+
+class NetworkLookupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = IPIndex()
+        self.index.apply_networks([
+            ('10.0.0.0/8', *values('suspicious')),
+            ('10.1.0.0/16', *values('malicious', 5, 'NL', 64500)),
+            ('2001:db8::/32', *values('suspicious')),
+            ('::ffff:198.51.100.0/120', *values('blocked')),
+        ])
+        self.index.apply([('10.1.2.3', *values('clean'))])
+
+    def test_longest_prefix_match(self):
+        self.assertEqual(self.index.lookup('10.1.200.1'), {
+            'network': '10.1.0.0/16', 'reputation': 'malicious', 'reports_count': 5,
+            'country': 'NL', 'asn': 64500,
+        })
+        self.assertEqual(self.index.lookup('10.200.0.1')['network'], '10.0.0.0/8')
+        self.assertEqual(self.index.lookup('2001:db8:ffff::1')['network'], '2001:db8::/32')
+        self.assertIsNone(self.index.lookup('11.0.0.1'))
+
+    def test_host_entry_beats_networks(self):
+        self.assertNotIn('network', self.index.lookup('10.1.2.3'))
+        self.assertEqual(
+            [entry['network'] for entry in self.index.covering_networks('10.1.2.3')],
+            ['10.1.0.0/16', '10.0.0.0/8'],
+        )
+        self.assertEqual(self.index.covering_networks('11.0.0.1'), [])
+
+    def test_ipv4_mapped_networks(self):
+        self.assertEqual(self.index.lookup('198.51.100.9')['network'], '198.51.100.0/24')
+        self.assertEqual(self.index.lookup('::ffff:198.51.100.9')['network'], '198.51.100.0/24')
+
+
+@override_settings(IP_INDEX_REFRESH_INTERVAL=0)
+class RefreshTests(TestCase):
+    """The process-wide index follows saves, key changes and bulk writes."""
+
+    def setUp(self):
+        cache.delete_many([ipindex.GENERATION_KEY, ipindex.CHANGED_KEY])
+        ipindex.clear_local()
+        self.addCleanup(ipindex.clear_local)
+        self.row = IPReputation.objects.create(ip_address='192.0.2.1', reputation='malicious')
+
+    def test_saves_apply_in_place(self):
+        index = ipindex.get_index()
+        IPReputation.objects.create(ip_address='192.0.2.2', reputation='blocked')
+        IPNetwork.objects.create(network='198.51.100.0/24', reputation='suspicious')
+        self.assertIs(ipindex.get_index(), index)
+        self.assertEqual(index.lookup('192.0.2.2')['reputation'], 'blocked')
+        self.assertEqual(index.lookup('198.51.100.1')['network'], '198.51.100.0/24')
+
+    @mock.patch('threats.ipindex._start_rebuild')
+    def test_rebuild_after_key_change(self, start_rebuild):
+        old = ipindex.get_index()
+        self.row.ip_address = '192.0.2.99'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.row.save()
+
+        # The old index is served until the rebuild swaps in a new one
+        self.assertIs(ipindex.get_index(), old)
+        start_rebuild.assert_called_once()
+        new = ipindex.rebuild()
+        self.assertIs(ipindex.get_index(), new)
+        self.assertIsNone(new.lookup('192.0.2.1'))
+        self.assertEqual(new.lookup('192.0.2.99')['reputation'], 'malicious')
+
+    @mock.patch('threats.ipindex._start_rebuild')
+    def test_bulk_writes_trigger_rebuild(self, start_rebuild):
+        ipindex.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            IPReputation.objects.filter(pk=self.row.pk).update(reputation='clean')
+        ipindex.get_index()
+        start_rebuild.assert_called_once()
+        self.assertEqual(ipindex.rebuild().lookup('192.0.2.1')['reputation'], 'clean')
+
+    @mock.patch('threats.ipindex._start_rebuild')
+    def test_delete_triggers_rebuild(self, start_rebuild):
+        ipindex.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.row.delete()
+        ipindex.get_index()
+        start_rebuild.assert_called_once()
+        self.assertIsNone(ipindex.rebuild().lookup('192.0.2.1'))
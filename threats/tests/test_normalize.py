@@ -0,0 +1,99 @@
+"""
+Canonical indicator values, and the digest they are deduplicated on.
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase
+
+from ..models import ThreatIndicator
+from ..normalize import canonical, normalize_value, value_digest
+
+
+class NormalizeValueTests(SimpleTestCase):
+
+    def test_canonical_forms(self):
+        for indicator_type, value, expected in (
+            ('ip', ' 192.0.2.1 ', '192.0.2.1'),
+            ('ip', '2001:DB8:0:0::1', '2001:db8::1'),
+            ('domain', 'Example.COM.', 'example.com'),
+            ('domain', 'Bücher.example', 'xn--bcher-kva.example'),
+            ('url', 'HTTP://Example.COM', 'http://example.com/'),
+            ('url', 'https://Example.com/Path?q=A#frag', 'https://example.com/Path?q=A'),
+            ('hash', 'D41D8CD98F00B204E9800998ECF8427E', 'd41d8cd98f00b204e9800998ecf8427e'),
+            ('email', 'Alice@Example.COM', 'Alice@example.com'),
+            ('cve', 'cve-2024-3094', 'CVE-2024-3094'),
+        ):
+            with self.subTest(indicator_type=indicator_type, value=value):
+                self.assertEqual(normalize_value(indicator_type, value), expected)
+                # Normalising is idempotent
+                self.assertEqual(normalize_value(indicator_type, expected), expected)
+
+    def test_invalid_values(self):
+        for indicator_type, value in (
+            ('ip', '192.0.2.256'),
+            ('domain', '   '),
+            ('url', 'example.com/path'),
+            ('hash', 'xyz'),
+            ('hash', 'abc123'),
+            ('email', 'no-at-sign'),
+            ('cve', 'CVE-24-1'),
+            ('asn', '64500'),
+        ):
+            with self.subTest(indicator_type=indicator_type, value=value):
+                with self.assertRaises(ValueError):
+                    normalize_value(indicator_type, value)
+
+    def test_canonical_keeps_invalid_values(self):
+        self.assertEqual(canonical('domain', ' Example.COM '), 'example.com')
+        self.assertEqual(canonical('ip', ' not an ip '), 'not an ip')
+
+    def test_digest(self):
+        self.assertEqual(len(value_digest('example.com')), 64)
+        self.assertEqual(
+            value_digest(normalize_value('domain', 'EXAMPLE.com.')),
+            value_digest(normalize_value('domain', 'example.com')),
+        )
+        self.assertNotEqual(value_digest('example.com'), value_digest('example.org'))
+
+
+class IndicatorDigestTests(TestCase):
+
+    def create(self, indicator_type, value):
+        return ThreatIndicator.objects.create(
+            indicator_type=indicator_type, value=value, description='Test'
+        )
+
+    def test_save_stores_canonical_value_and_digest(self):
+        indicator = self.create('domain', 'Example.COM.')
+        self.assertEqual(indicator.value, 'example.com')
+        self.assertEqual(indicator.digest, value_digest('example.com'))
+
+        indicator.value = 'Other.example'
+        indicator.save(update_fields=['value'])
+        indicator.refresh_from_db()
+        self.assertEqual(indicator.digest, value_digest('other.example'))
+
+    def test_equal_values_collide(self):
+        self.create('domain', 'example.com')
+        with self.assertRaises(IntegrityError):
+            self.create('domain', 'EXAMPLE.com.')
+
+    def test_same_value_of_another_type_does_not_collide(self):
+        self.create('domain', 'example.com')
+        self.create('email', 'abuse@example.com')
+        self.create('url', 'http://example.com')
+        self.assertEqual(ThreatIndicator.objects.count(), 3)
+
+    def test_clean_reports_duplicates(self):
+        self.create('hash', 'D41D8CD98F00B204E9800998ECF8427E')
+        duplicate = ThreatIndicator(
+            indicator_type='hash', value='d41d8cd98f00b204e9800998ecf8427e', description='Again'
+        )
+        with self.assertRaises(ValidationError):
+            duplicate.clean()
+        with self.assertRaises(ValidationError):
+            ThreatIndicator(indicator_type='ip', value='nope', description='Bad').clean()
+
+    def test_lookup_by_any_spelling(self):
+        indicator = self.create('url', 'HTTP://Example.com/path')
+        self.assertEqual(list(ThreatIndicator.lookup('url', 'http://EXAMPLE.com/path#top')), [indicator])
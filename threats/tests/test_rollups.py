@@ -0,0 +1,168 @@
+"""
+ThreatLevel rollups: a level holds from its ``recorded_date`` until the
+next one, split across hour, day and month buckets, and refreshes keep
+the stored buckets in step with edits.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from .. import rollups
+from ..models import ThreatLevel, ThreatLevelRollup
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class BucketTests(SimpleTestCase):
+
+    def test_floor(self):
+        moment = utc(2024, 3, 15, 13, 45, 10, 5)
+        self.assertEqual(rollups.floor(moment, 'hour'), utc(2024, 3, 15, 13))
+        self.assertEqual(rollups.floor(moment, 'day'), utc(2024, 3, 15))
+        self.assertEqual(rollups.floor(moment, 'month'), utc(2024, 3, 1))
+
+    def test_floor_is_utc(self):
+        moment = datetime(2024, 3, 1, 0, 30, tzinfo=dt_timezone(-timedelta(hours=5)))
+        self.assertEqual(rollups.floor(moment, 'day'), utc(2024, 3, 1))
+        self.assertEqual(rollups.floor(moment, 'hour'), utc(2024, 3, 1, 5))
+
+    def test_next_start(self):
+        self.assertEqual(rollups.next_start(utc(2024, 2, 29, 23), 'hour'), utc(2024, 3, 1))
+        self.assertEqual(rollups.next_start(utc(2024, 2, 29), 'day'), utc(2024, 3, 1))
+        self.assertEqual(rollups.next_start(utc(2024, 1, 1), 'month'), utc(2024, 2, 1))
+        self.assertEqual(rollups.next_start(utc(2024, 12, 1), 'month'), utc(2025, 1, 1))
+
+
+class RollupTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.low = self.record('low', utc(2024, 1, 31, 22, 30))
+        self.high = self.record('high', utc(2024, 2, 1, 1, 15))
+
+    def record(self, level, at):
+        threat_level = ThreatLevel.objects.create(level=level, description=level)
+        # recorded_date is auto_now_add
+        ThreatLevel.objects.filter(pk=threat_level.pk).update(recorded_date=at)
+        threat_level.recorded_date = at
+        rollups.mark_dirty(at)
+        return threat_level
+
+    def bucket(self, period, start):
+        row = ThreatLevelRollup.objects.get(period=period, start=start)
+        return {level: seconds for level, seconds in row.seconds().items() if seconds}, row.changes
+
+
+class StepTests(RollupTestCase):
+
+    def test_level_holds_until_the_next(self):
+        self.assertEqual(list(rollups.steps(utc(2024, 1, 1), utc(2024, 2, 1, 3))), [
+            (utc(2024, 1, 31, 22, 30), utc(2024, 2, 1, 1, 15), 'low'),
+            (utc(2024, 2, 1, 1, 15), utc(2024, 2, 1, 3), 'high'),
+        ])
+
+    def test_level_before_the_window_carries_in(self):
+        self.assertEqual(list(rollups.steps(utc(2024, 2, 1), utc(2024, 2, 1, 2))), [
+            (utc(2024, 2, 1), utc(2024, 2, 1, 1, 15), 'low'),
+            (utc(2024, 2, 1, 1, 15), utc(2024, 2, 1, 2), 'high'),
+        ])
+        self.assertEqual(list(rollups.steps(utc(2024, 2, 1, 1), utc(2024, 2, 1, 1, 10))), [
+            (utc(2024, 2, 1, 1), utc(2024, 2, 1, 1, 10), 'low'),
+        ])
+
+    def test_nothing_before_the_first_record(self):
+        self.assertEqual(list(rollups.steps(utc(2024, 1, 1), utc(2024, 1, 31))), [])
+
+    def test_record_at_the_window_start(self):
+        self.assertEqual(list(rollups.steps(utc(2024, 2, 1, 1, 15), utc(2024, 2, 1, 2))), [
+            (utc(2024, 2, 1, 1, 15), utc(2024, 2, 1, 2), 'high'),
+        ])
+
+    def test_compute_splits_steps_across_buckets(self):
+        buckets = rollups.compute(utc(2024, 1, 1), utc(2024, 2, 1, 3))
+        hours = {start.hour: dict(values) for (period, start), values in buckets.items() if period == 'hour'}
+        self.assertEqual(hours, {
+            22: {'low': 1800, 'changes': 1},
+            23: {'low': 3600},
+            0: {'low': 3600},
+            1: {'low': 900, 'high': 2700, 'changes': 1},
+            2: {'high': 3600},
+        })
+        self.assertEqual(dict(buckets['day', utc(2024, 1, 31)]), {'low': 5400, 'changes': 1})
+        self.assertEqual(dict(buckets['day', utc(2024, 2, 1)]), {'low': 4500, 'high': 6300, 'changes': 1})
+        self.assertEqual(dict(buckets['month', utc(2024, 1, 1)]), {'low': 5400, 'changes': 1})
+        for period in rollups.PERIODS:
+            total = sum(
+                seconds for (bucket_period, _), values in buckets.items() if bucket_period == period
+                for level, seconds in values.items() if level != 'changes'
+            )
+            self.assertEqual(total, 4.5 * 3600, period)
+
+
+class RefreshTests(RollupTestCase):
+
+    def test_first_refresh(self):
+        self.assertEqual(rollups.pending_since(), utc(2024, 1, 31, 22, 30))
+        self.assertEqual(rollups.refresh(now=utc(2024, 2, 1, 3)), 9)
+        self.assertEqual(self.bucket('month', utc(2024, 2, 1)), ({'low': 4500, 'high': 6300}, 1))
+        self.assertEqual(self.bucket('hour', utc(2024, 2, 1, 1)), ({'low': 900, 'high': 2700}, 1))
+        self.assertIsNone(cache.get(rollups.DIRTY_KEY))
+
+    def test_incremental_refresh_keeps_closed_months(self):
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        january = ThreatLevelRollup.objects.get(period='month', start=utc(2024, 1, 1)).pk
+        self.record('critical', utc(2024, 2, 1, 4))
+        rollups.refresh(now=utc(2024, 2, 1, 5))
+        self.assertEqual(ThreatLevelRollup.objects.get(period='month', start=utc(2024, 1, 1)).pk, january)
+        self.assertEqual(
+            self.bucket('day', utc(2024, 2, 1)),
+            ({'low': 4500, 'high': 9900, 'critical': 3600}, 2),
+        )
+        # The open hour is extended rather than duplicated
+        self.assertEqual(self.bucket('hour', utc(2024, 2, 1, 4)), ({'critical': 3600}, 1))
+
+    def test_refresh_without_new_records_extends_the_last_level(self):
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        rollups.refresh(now=utc(2024, 2, 2))
+        self.assertEqual(self.bucket('day', utc(2024, 2, 1)), ({'low': 4500, 'high': 81900}, 1))
+        self.assertEqual(ThreatLevelRollup.objects.filter(period='hour').count(), 26)
+
+    def test_edit_recomputes_earlier_months(self):
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        self.low.level = 'medium'
+        self.low.save()
+        self.assertEqual(rollups.pending_since(), utc(2024, 1, 31, 22, 30))
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        self.assertEqual(self.bucket('month', utc(2024, 1, 1)), ({'medium': 5400}, 1))
+        self.assertEqual(self.bucket('month', utc(2024, 2, 1)), ({'medium': 4500, 'high': 6300}, 1))
+
+    def test_delete_recomputes_earlier_months(self):
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        self.low.delete()
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        self.assertFalse(ThreatLevelRollup.objects.filter(start__lt=utc(2024, 2, 1)).exists())
+        self.assertFalse(ThreatLevelRollup.objects.filter(period='hour', start=utc(2024, 2, 1)).exists())
+        self.assertEqual(self.bucket('month', utc(2024, 2, 1)), ({'high': 6300}, 1))
+
+    def test_locked_refresh_leaves_since_for_the_next(self):
+        cache.delete(rollups.DIRTY_KEY)
+        cache.add(rollups.LOCK_KEY, 1)
+        self.assertIsNone(rollups.refresh(since=utc(2023, 6, 1), now=utc(2024, 2, 1, 3)))
+        self.assertFalse(ThreatLevelRollup.objects.exists())
+        self.assertEqual(cache.get(rollups.DIRTY_KEY), utc(2023, 6, 1))
+        cache.delete(rollups.LOCK_KEY)
+        self.assertEqual(rollups.refresh(now=utc(2024, 2, 1, 3)), 9)
+
+    def test_chart(self):
+        rollups.refresh(now=utc(2024, 2, 1, 3))
+        bars = rollups.chart(months=2, now=utc(2024, 2, 1, 3))
+        self.assertEqual([bar['start'] for bar in bars], [utc(2024, 1, 1), utc(2024, 2, 1)])
+        self.assertEqual(bars[0]['segments'], [{'level': 'low', 'percent': 100.0}])
+        self.assertEqual(
+            bars[1]['segments'],
+            [{'level': 'low', 'percent': 41.67}, {'level': 'high', 'percent': 58.33}],
+        )
+        self.assertEqual(rollups.chart(months=1, now=utc(2024, 2, 1, 3))[0]['start'], utc(2024, 2, 1))
@@ -5,5 +5,18 @@ app_name = 'threats'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('ports/', views.ports, name='ports'),
+    path('ips/', views.ips, name='ips'),
+    path('indicators/', views.indicators, name='indicators'),
     path('infocon/', views.infocon_status, name='infocon_api'),
+    path('infocon/stream/', views.infocon_stream, name='infocon_stream'),
+    path('api/levels/', views.threat_level_history, name='threat_level_history'),
+    path('api/ips/', views.ip_list_api, name='ip_list_api'),
+    path('api/indicators/', views.indicator_list_api, name='indicator_list_api'),
+    path('export/', views.export_index, name='export_index'),
+    path('export/<slug:dataset>.<slug:fmt>', views.export, name='export'),
+    path('api/ports/trending/', views.port_trends, name='port_trends'),
+    path('api/ports/<int:port>/', views.port_series, name='port_series'),
+    path('api/ip/batch/', views.ip_lookup_batch, name='ip_lookup_batch'),
+    path('api/ip/<str:ip>/', views.ip_lookup, name='ip_lookup'),
 ]
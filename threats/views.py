@@ -1,8 +1,55 @@
+import json
+import math
+from datetime import timedelta
+
 from django.shortcuts import render
-from django.http import JsonResponse
-from .models import ThreatLevel
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from core.cache import cached_for_version
+from core.pagecache import cache_page_versions
+from core.pagination import KeysetPaginator
+from . import exports, infocon, porttrends, portlogs, rollups
+from .ipindex import get_index
+from .models import IPReputation, PortActivity, ThreatIndicator, ThreatLevel
+
+IP_BATCH_LIMIT = 10000
+TRENDING_ON_PAGE = 10
+
+# Keyset pagination of the IP and indicator listings; the keys match the
+# model orderings (plus id) and the indexes on those models.
+LIST_PER_PAGE = 50
+PORTS_PER_PAGE = 100
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+IP_KEYS = ('-reports_count', '-last_seen', '-id')
+IP_FIELDS = ('ip_address', 'reputation', 'country', 'asn', 'reports_count', 'first_seen', 'last_seen')
+INDICATOR_KEYS = ('-added_date', '-id')
+PORT_KEYS = ('-scan_count', '-id')
+CURSOR_PARAMS = ('after', 'before', 'last')
 
+# Default range of the level history API per period, and the most buckets
+# one request may return
+HISTORY_SPANS = {
+    'hour': timedelta(days=7),
+    'day': timedelta(days=365),
+    'month': timedelta(days=365 * 10),
+}
+HISTORY_MAX_BUCKETS = 5000
+BUCKET_LENGTHS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'month': timedelta(days=28),
+}
 
+
+# Every ThreatLevel change bumps the InfoCon version, which all cached
+# pages depend on.
+@cache_page_versions(rollups.ROLLUP_CACHE_NAME)
 def dashboard(request):
     """Threat intelligence dashboard."""
     # Get most recent threat (first in ordered queryset)
@@ -12,24 +59,402 @@ def dashboard(request):
     context = {
         'current_threat': current_threat,
         'threat_history': threat_history,
+        'level_chart': rollups.chart(),
     }
     return render(request, 'threats/dashboard.html', context)
 
 
-def infocon_status(request):
-    """API endpoint for current InfoCon status."""
-    current = ThreatLevel.objects.first()
+def ports(request):
+    """Port activity list with the currently trending ports."""
+    port_list = PortActivity.objects.all()
+    risk = request.GET.get('risk')
+    if risk:
+        if risk not in dict(PortActivity.RISK_CHOICES):
+            return HttpResponseBadRequest(f'Unknown risk: {risk}')
+        port_list = port_list.filter(risk_level=risk)
+    page_obj = KeysetPaginator(port_list, PORTS_PER_PAGE, keys=PORT_KEYS).get_page(request)
+    
+    context = {
+        'ports': page_obj,
+        'page_obj': page_obj,
+        'query': _filter_query(request),
+        'risk': risk,
+        'trending': porttrends.get_trends()['ports'][:TRENDING_ON_PAGE],
+    }
+    return render(request, 'threats/port_list.html', context)
+
+
+def _ip_filters(params):
+    """IPReputation filters from the ``reputation`` and ``country`` parameters."""
+    filters = {}
+    reputation = params.get('reputation')
+    if reputation:
+        if reputation not in dict(IPReputation.REPUTATION_CHOICES):
+            raise ValueError(f'Unknown reputation: {reputation}')
+        filters['reputation'] = reputation
+    country = params.get('country')
+    if country:
+        if len(country) != 2 or not country.isalpha():
+            raise ValueError('country must be a two-letter ISO code')
+        filters['country'] = country.upper()
+    return filters
+
+
+def _indicator_filters(params):
+    """ThreatIndicator filters from the ``severity``, ``indicator_type`` and
+    ``is_active`` parameters; only active indicators by default.
+    """
+    is_active = params.get('is_active', 'true').lower()
+    if is_active not in ('true', 'false', '1', '0'):
+        raise ValueError('is_active must be true or false')
+    filters = {'is_active': is_active in ('true', '1')}
+    for name, choices in (
+        ('severity', ThreatIndicator.SEVERITY_CHOICES),
+        ('indicator_type', ThreatIndicator.IOC_TYPES),
+    ):
+        value = params.get(name)
+        if value:
+            if value not in dict(choices):
+                raise ValueError(f'Unknown {name}: {value}')
+            filters[name] = value
+    return filters
+
+
+def _filter_query(request):
+    """The request's query string without the pagination cursor."""
+    params = request.GET.copy()
+    for name in CURSOR_PARAMS:
+        params.pop(name, None)
+    return params.urlencode()
+
+
+def ips(request):
+    """IP reputation list, filterable by reputation and country."""
+    try:
+        filters = _ip_filters(request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    ip_list = IPReputation.objects.filter(**filters).only(*IP_FIELDS)
+    page_obj = KeysetPaginator(ip_list, LIST_PER_PAGE, keys=IP_KEYS).get_page(request)
+    
+    context = {
+        'ips': page_obj,
+        'page_obj': page_obj,
+        'query': _filter_query(request),
+    }
+    return render(request, 'threats/ip_list.html', context)
+
+
+def indicators(request):
+    """Threat indicator list, filterable by severity and type."""
+    try:
+        filters = _indicator_filters(request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    indicator_list = ThreatIndicator.objects.filter(**filters)
+    page_obj = KeysetPaginator(indicator_list, LIST_PER_PAGE, keys=INDICATOR_KEYS).get_page(request)
+    
+    context = {
+        'indicators': page_obj,
+        'indicator_types': ThreatIndicator.IOC_TYPES,
+        'page_obj': page_obj,
+        'query': _filter_query(request),
+    }
+    return render(request, 'threats/indicator_list.html', context)
+
+
+def _page_url(request, name, cursor):
+    if cursor is None:
+        return None
+    query = _filter_query(request)
+    if query:
+        query += '&'
+    return request.build_absolute_uri(f'{request.path}?{query}{name}={cursor}')
+
+
+def _api_page(request, queryset, keys, serialize):
+    """One keyset page of ``queryset`` as JSON; ``limit`` sets the page size."""
+    try:
+        limit = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    limit = max(1, min(limit, API_MAX_PAGE_SIZE))
+    page_obj = KeysetPaginator(queryset, limit, keys=keys).get_page(request)
+    return JsonResponse({
+        'next': _page_url(request, 'after', page_obj.next_cursor),
+        'previous': _page_url(request, 'before', page_obj.previous_cursor),
+        'results': [serialize(obj) for obj in page_obj],
+    })
+
+
+def _ip_json(ip):
+    return {name: getattr(ip, name) for name in IP_FIELDS}
+
+
+def _indicator_json(indicator):
+    return {
+        'id': indicator.pk,
+        'indicator_type': indicator.indicator_type,
+        'value': indicator.value,
+        'description': indicator.description,
+        'severity': indicator.severity,
+        'source': indicator.source,
+        'is_active': indicator.is_active,
+        'added_date': indicator.added_date,
+        'updated_date': indicator.updated_date,
+        'related_post': indicator.related_post_id,
+    }
+
+
+@require_GET
+def ip_list_api(request):
+    """API endpoint listing IP reputations, most reported first.
     
-    if current:
-        data = {
-            'status': current.level,
-            'recorded_date': current.recorded_date.isoformat(),
-            'description': current.description,
-        }
+    Filters: ``reputation``, ``country``. Pages are keyset cursors: follow
+    the ``next``/``previous`` URLs; ``limit`` sets the page size.
+    """
+    try:
+        filters = _ip_filters(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    queryset = IPReputation.objects.filter(**filters).only(*IP_FIELDS)
+    return _api_page(request, queryset, IP_KEYS, _ip_json)
+
+
+@require_GET
+def indicator_list_api(request):
+    """API endpoint listing threat indicators, newest first.
+    
+    Filters: ``severity``, ``indicator_type`` and ``is_active`` (default
+    true). Paginated like ``ip_list_api``.
+    """
+    try:
+        filters = _indicator_filters(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    queryset = ThreatIndicator.objects.filter(**filters)
+    return _api_page(request, queryset, INDICATOR_KEYS, _indicator_json)
+
+
+@require_GET
+def export_index(request):
+    """API endpoint listing the export URLs and when each snapshot was built."""
+    manifest = exports.read_manifest()
+    return JsonResponse({
+        'formats': exports.FORMATS,
+        'datasets': {
+            dataset: {
+                'generated_at': manifest['datasets'].get(dataset, {}).get('generated_at'),
+                'urls': {
+                    fmt: request.build_absolute_uri(
+                        reverse('threats:export', args=[dataset, fmt])
+                    )
+                    for fmt in exports.FORMATS
+                },
+            }
+            for dataset in exports.DATASETS
+        },
+    })
+
+
+@require_GET
+def export(request, dataset, fmt):
+    """Bulk export of a dataset as a blocklist, CSV, JSONL or STIX bundle.
+    
+    Full exports are served from the gzip snapshot when the client accepts
+    gzip and one has been built. ``since`` (ISO date or datetime) returns
+    the rows changed since then, streamed from the database; so does an
+    ``indicator_type`` filter. Under ASGI the stream is an async iterator,
+    so it is sent chunk by chunk rather than buffered.
+    """
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404('Unknown export')
+    try:
+        since = exports.parse_moment(request.GET['since']) if request.GET.get('since') else None
+    except ValueError as exc:
+        return JsonResponse({'error': f'Invalid date: {exc}'}, status=400)
+    indicator_type = request.GET.get('indicator_type')
+    if indicator_type and indicator_type not in dict(ThreatIndicator.IOC_TYPES):
+        return JsonResponse({'error': f'Unknown indicator_type: {indicator_type}'}, status=400)
+    
+    name = exports.filename(dataset, fmt)
+    snapshot = None
+    if since is None and not indicator_type and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        snapshot = exports.get_snapshot(dataset, fmt)
+    if snapshot:
+        path, entry = snapshot
+        response = get_conditional_response(request, etag=entry['etag'])
+        if response is None:
+            response = FileResponse(
+                open(path, 'rb'),
+                as_attachment=True,
+                filename=name,
+                content_type=exports.CONTENT_TYPES[fmt],
+            )
+            response['Content-Encoding'] = 'gzip'
+        response['ETag'] = entry['etag']
     else:
-        data = {
-            'status': 'low',
-            'description': 'Normal activity',
-        }
+        stream = exports.aexport if isinstance(request, ASGIRequest) else exports.export
+        response = StreamingHttpResponse(
+            stream(dataset, fmt, since=since, indicator_type=indicator_type),
+            content_type=exports.CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@require_GET
+def port_trends(request):
+    """API endpoint returning the precomputed top trending ports."""
+    return JsonResponse(porttrends.get_trends())
+
+
+@require_GET
+def port_series(request, port):
+    """API endpoint returning one port's hits per time bucket.
     
-    return JsonResponse(data)
+    Query parameters: ``protocol`` (default TCP) and ``hours`` of history
+    (default 24, positive, clamped to the bucket retention).
+    """
+    protocol = request.GET.get('protocol', 'TCP').upper()
+    max_hours = porttrends.get_retention().total_seconds() // 3600
+    try:
+        hours = float(request.GET.get('hours', 24))
+    except ValueError:
+        hours = None
+    # float() also accepts nan, inf and values timedelta cannot hold
+    if hours is None or not math.isfinite(hours) or hours <= 0:
+        return JsonResponse({'error': 'hours must be a positive number'}, status=400)
+    hours = min(hours, max_hours)
+    start = timezone.now() - timedelta(hours=hours)
+    return JsonResponse({
+        'port': port,
+        'protocol': protocol,
+        'bucket_seconds': portlogs.get_bucket_seconds(),
+        'buckets': [
+            {'start': moment.isoformat(), 'hits': hits}
+            for moment, hits in porttrends.series(port, protocol, start)
+        ],
+    })
+
+
+async def infocon_status(request):
+    """API endpoint for current InfoCon status.
+    
+    The body and ETag are precomputed (see threats.infocon); pollers that
+    send If-None-Match get a 304.
+    """
+    status = await infocon.aget_status()
+    response = get_conditional_response(request, etag=status.etag)
+    if response is None:
+        response = HttpResponse(status.body, content_type='application/json')
+    response['ETag'] = status.etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def infocon_stream(request):
+    """Server-Sent Events stream of InfoCon status changes."""
+    last_event_id = request.headers.get('Last-Event-ID')
+    if isinstance(request, ASGIRequest):
+        events = infocon.stream(last_event_id)
+    else:
+        # Sync workers cannot afford to hold the connection open: send the
+        # current status and let the client reconnect after the retry delay.
+        events = [await infocon.snapshot(last_event_id)]
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def threat_level_history(request):
+    """API endpoint returning seconds spent at each level per bucket.
+    
+    Query parameters: ``period`` (hour, day or month; default day) and
+    ISO ``start``/``end`` dates. Served from ThreatLevelRollup.
+    """
+    period = request.GET.get('period', 'day')
+    if period not in rollups.PERIODS:
+        return JsonResponse({'error': f'period must be one of {", ".join(rollups.PERIODS)}'}, status=400)
+    try:
+        end = exports.parse_moment(request.GET['end']) if request.GET.get('end') else timezone.now()
+        start = exports.parse_moment(request.GET['start']) if request.GET.get('start') else end - HISTORY_SPANS[period]
+    except ValueError as exc:
+        return JsonResponse({'error': f'Invalid date: {exc}'}, status=400)
+    if start >= end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+    if (end - start) / BUCKET_LENGTHS[period] > HISTORY_MAX_BUCKETS:
+        return JsonResponse({'error': f'At most {HISTORY_MAX_BUCKETS} buckets per request'}, status=400)
+    
+    # Key on bucket bounds so requests within the same buckets share it.
+    first = rollups.floor(start, period)
+    last = rollups.floor(end - timedelta(microseconds=1), period)
+    key = f'threats:level_history:{period}:{first.isoformat()}:{last.isoformat()}'
+    buckets = cached_for_version(
+        rollups.ROLLUP_CACHE_NAME, key, lambda: rollups.get_buckets(period, first, last)
+    )
+    return JsonResponse({
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'levels': rollups.LEVELS,
+        'buckets': buckets,
+    })
+
+
+def _ip_result(index, ip):
+    entry = index.lookup(ip)
+    if entry is None:
+        return {'ip': ip, 'listed': False}
+    return {'ip': ip, 'listed': True, **entry}
+
+
+@require_GET
+def ip_lookup(request, ip):
+    """API endpoint returning the reputation of a single IP address."""
+    index = get_index()
+    try:
+        result = _ip_result(index, ip)
+    except ValueError:
+        return JsonResponse({'error': f'Invalid IP address: {ip}'}, status=400)
+    result['networks'] = index.covering_networks(ip)
+    return JsonResponse(result)
+
+
+@csrf_exempt
+@require_POST
+def ip_lookup_batch(request):
+    """API endpoint looking up to IP_BATCH_LIMIT addresses at once.
+
+    Accepts a JSON body ``{"ips": [...]}`` or plain text with one address
+    per line.
+    """
+    if request.content_type == 'application/json':
+        try:
+            ips = json.loads(request.body).get('ips', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Expected a JSON object with an "ips" list'}, status=400)
+        if not isinstance(ips, list):
+            return JsonResponse({'error': '"ips" must be a list'}, status=400)
+    else:
+        ips = request.body.decode('utf-8', 'replace').split()
+
+    if len(ips) > IP_BATCH_LIMIT:
+        return JsonResponse({'error': f'At most {IP_BATCH_LIMIT} addresses per request'}, status=400)
+
+    index = get_index()
+    results, invalid = [], []
+    for ip in ips:
+        try:
+            results.append(_ip_result(index, str(ip).strip()))
+        except ValueError:
+            invalid.append(ip)
+    return JsonResponse({
+        'count': len(results),
+        'listed': sum(1 for result in results if result['listed']),
+        'results': results,
+        'invalid': invalid,
+    })